@@ -9,16 +9,677 @@ import sqlite3
 import os
 import shutil
 import hashlib
-from datetime import datetime
+import zlib
+import gzip
+from datetime import datetime, timezone
 import json
+import re
+import glob
+import threading
+import queue
+import time
+import atexit
+import itertools
+import tempfile
+import uuid
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
 from pathlib import Path
 
+# Form codes such as QF-09-01-01 or QF-10-02-06-01
+FORM_CODE_PATTERN = re.compile(r'QF-\d+(?:-\d+)*')
+
+# Instance suffix appended by save_form_instance: _[instance_]YYYYmmdd_HHMMSS
+INSTANCE_SUFFIX_PATTERN = re.compile(r'^(.*?)_((?:.*_)?\d{8}_\d{6})$')
+
+# Payload codec: small payloads are stored as compact JSON text, larger ones
+# as a BLOB whose first byte is the codec version followed by the encoded data
+PAYLOAD_CODEC_ZLIB = 1
+
+# Connection PRAGMAs per performance profile. The active profile and any
+# single-PRAGMA override ('pragma.<name>') are read from system_settings
+PERFORMANCE_PROFILES = {
+    'balanced': {
+        'cache_size': -16000,            # KiB (negative) -> ~16 MB page cache
+        'mmap_size': 134217728,          # 128 MB memory-mapped reads
+        'temp_store': 'MEMORY',
+        'synchronous': 'NORMAL',         # Durable under WAL; FULL otherwise
+        'busy_timeout': 30000,
+        'wal_autocheckpoint': 1000,
+    },
+    'read_heavy': {
+        'cache_size': -65536,
+        'mmap_size': 536870912,
+        'temp_store': 'MEMORY',
+        'synchronous': 'NORMAL',
+        'busy_timeout': 30000,
+        'wal_autocheckpoint': 4000,
+    },
+    'durable': {
+        'cache_size': -4000,
+        'mmap_size': 0,
+        'temp_store': 'DEFAULT',
+        'synchronous': 'FULL',
+        'busy_timeout': 60000,
+        'wal_autocheckpoint': 1000,
+    },
+}
+DEFAULT_PERFORMANCE_PROFILE = 'balanced'
+PRAGMA_VALUE_PATTERN = re.compile(r'^(-?\d+|[A-Za-z]+)$')
+
+# Form fields that query_forms can filter and sort on inside SQLite:
+# form_code -> {field: JSON path into the form payload}. The paths are the
+# keys the form screens save (save_universal_form / save_form_instance). Each
+# field gets a partial expression index (json_extract(...) WHERE form_code =
+# code); payloads of these codes are never compressed so json_extract can read them
+FORM_FIELD_INDEXES = {
+    'QF-10-02-06-03': {
+        'action_number': '$.action_number',
+        'action_date': '$.action_date',
+        'responsible_person': '$.responsible_person',
+        'target_date': '$.target_date',
+        'current_status': '$.current_status',
+        'follow_up_date': '$.follow_up_date',
+    },
+    'QF-10-02-06-04': {
+        'action_number': '$.action_number',
+        'follow_up_date': '$.follow_up_date',
+    },
+    'QF-09-09-01': {
+        'institution_name': '$.institution_name',
+        'record_manager': '$.record_manager',
+        'save_timestamp': '$.save_timestamp',
+    },
+}
+# Fields seeded by migration 9 with label paths that no saved form uses
+SUPERSEDED_FORM_FIELDS = {
+    'QF-10-02-06-03': ('opened_on', 'owner', 'due_date', 'status'),
+    'QF-09-09-01': ('complainant', 'subject'),
+}
+FIELD_NAME_PATTERN = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+QUERY_OPERATORS = {'=', '!=', '<', '<=', '>', '>=', 'like', 'in', 'between', 'is', 'is not'}
+QUERY_META_COLUMNS = ('form_name', 'created_at', 'updated_at')
+
+# Header of export_forms_jsonl files, checked by import_forms_jsonl
+FORMS_EXPORT_FORMAT = 'qb-forms-jsonl'
+FORMS_EXPORT_VERSION = 1
+
+# db_stats counters kept current by triggers: column -> (table, per-row value)
+DB_STATS_COUNTERS = {
+    'active_users': ('users', '{row}.is_active IS 1'),
+    'procedures': ('procedures', '1'),
+    'forms': ('forms', '1'),
+    'uploaded_files': ('uploaded_files', '1'),
+    'total_file_size': ('uploaded_files', 'COALESCE({row}.file_size, 0)'),
+    'certificates': ('certificates', '1'),
+    'form_data': ('form_data', '1'),
+}
+
+# Read size used when streaming an upload into the content store
+INGEST_BUFFER_SIZE = 1024 * 1024
+
+# Largest accepted upload per file category, in bytes; 'upload_limit.<category>'
+# in system_settings overrides one category. Unknown categories use 'general'
+UPLOAD_SIZE_LIMITS = {
+    'general': 50 * 1024 * 1024,
+    'documents': 200 * 1024 * 1024,
+    'procedures': 200 * 1024 * 1024,
+    'forms': 50 * 1024 * 1024,
+    'certificates': 50 * 1024 * 1024,
+    'reports': 200 * 1024 * 1024,
+    'recordings': 4 * 1024 * 1024 * 1024,
+    'archives': 4 * 1024 * 1024 * 1024,
+}
+
+# form_data payload of a tabular form whose rows are stored one per form_rows row
+ROW_STORAGE_MARKER = {'$storage': 'form_rows'}
+
+# Arabic normalisation for the search index: tashkeel and tatweel are
+# dropped, and letter variants users type interchangeably are folded
+ARABIC_DIACRITICS_PATTERN = re.compile(r'[\u0610-\u061A\u064B-\u065F\u0670\u06D6-\u06ED\u0640]')
+ARABIC_LETTER_MAP = str.maketrans({
+    'أ': 'ا', 'إ': 'ا', 'آ': 'ا', 'ٱ': 'ا',
+    'ى': 'ي', 'ئ': 'ي', 'ؤ': 'و', 'ة': 'ه',
+    '٠': '0', '١': '1', '٢': '2', '٣': '3', '٤': '4',
+    '٥': '5', '٦': '6', '٧': '7', '٨': '8', '٩': '9',
+})
+
+ARABIC_WORD_PATTERN = re.compile(r'[\u0621-\u064A]')
+
+
+def normalize_arabic(text):
+    """Fold Arabic spelling variants and strip diacritics for indexing and queries"""
+    return ARABIC_DIACRITICS_PATTERN.sub('', str(text)).translate(ARABIC_LETTER_MAP).lower()
+
+
+def _payload_search_text(value):
+    """Flatten the text values of a decoded payload into one string"""
+    if isinstance(value, dict):
+        return ' '.join(_payload_search_text(item) for item in value.values())
+    if isinstance(value, (list, tuple)):
+        return ' '.join(_payload_search_text(item) for item in value)
+    return '' if value is None else str(value)
+
+
+def _row_digest(row_id, position, row_values):
+    """SHA-256 of one form_rows row as an integer; a row form's payload_hash is their sum mod 2**256"""
+    return int(hashlib.sha256(f"{int(row_id)}:{float(position)}:{row_values}".encode('utf-8')).hexdigest(), 16)
+
+
+def _row_metadata(rows):
+    """(record_count, payload_bytes, payload_hash) of form_rows given as (row_id, position, row_values)
+    
+    payload_bytes is the size of the rows as one compact JSON list.
+    """
+    rows = list(rows)
+    values_bytes = sum(len(row_values.encode('utf-8')) for _, _, row_values in rows)
+    digest = sum(_row_digest(*row) for row in rows) % 2 ** 256
+    return len(rows), values_bytes + 2 + max(len(rows) - 1, 0), f"{digest:064x}"
+
+
+def _copy_payload(value):
+    """Copy the containers of a decoded JSON payload (leaves are immutable)"""
+    if isinstance(value, list):
+        return [_copy_payload(item) for item in value]
+    if isinstance(value, dict):
+        return {key: _copy_payload(item) for key, item in value.items()}
+    return value
+
+
+def _json_pointer(path, key):
+    """Append one escaped reference token to a JSON Pointer"""
+    return f"{path}/{str(key).replace('~', '~0').replace('/', '~1')}"
+
+
+def _json_equal(old, new):
+    """Equality that also requires equal types, so 1, 1.0 and True differ"""
+    if type(old) is not type(new):
+        return False
+    if isinstance(old, dict):
+        return old.keys() == new.keys() and all(_json_equal(value, new[key]) for key, value in old.items())
+    if isinstance(old, list):
+        return len(old) == len(new) and all(map(_json_equal, old, new))
+    return old == new
+
+
+def _json_diff(old, new, path=''):
+    """JSON Patch (RFC 6902 add/remove/replace operations) turning old into new
+    
+    Lists are compared after trimming their common prefix and suffix, so an
+    inserted or removed row produces a single operation.
+    """
+    if isinstance(old, dict) and isinstance(new, dict):
+        ops = []
+        for key in old:
+            if key not in new:
+                ops.append({'op': 'remove', 'path': _json_pointer(path, key)})
+            elif not _json_equal(old[key], new[key]):
+                ops.extend(_json_diff(old[key], new[key], _json_pointer(path, key)))
+        for key in new:
+            if key not in old:
+                ops.append({'op': 'add', 'path': _json_pointer(path, key), 'value': new[key]})
+        return ops
+    if isinstance(old, list) and isinstance(new, list):
+        start = 0
+        while start < len(old) and start < len(new) and _json_equal(old[start], new[start]):
+            start += 1
+        end_old, end_new = len(old), len(new)
+        while end_old > start and end_new > start and _json_equal(old[end_old - 1], new[end_new - 1]):
+            end_old -= 1
+            end_new -= 1
+        paired = min(end_old, end_new) - start
+        ops = []
+        for index in range(start, start + paired):
+            ops.extend(_json_diff(old[index], new[index], f"{path}/{index}"))
+        for _ in range(start + paired, end_old):
+            ops.append({'op': 'remove', 'path': f"{path}/{start + paired}"})
+        for index in range(start + paired, end_new):
+            ops.append({'op': 'add', 'path': f"{path}/{index}", 'value': new[index]})
+        return ops
+    if _json_equal(old, new):
+        return []
+    return [{'op': 'replace', 'path': path, 'value': new}]
+
+
+def _fsync_directory(path):
+    """Persist a rename in a directory; not supported (or needed) on Windows"""
+    if not hasattr(os, 'O_DIRECTORY'):
+        return
+    fd = os.open(path, os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _try_lock_file(f):
+    """Non-blocking exclusive lock on an open file; False while another handle holds it"""
+    try:
+        if os.name == 'nt':
+            import msvcrt
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        return True
+    except OSError:
+        return False
+
+
+def _apply_json_patch(doc, ops):
+    """Apply add/remove/replace operations produced by _json_diff (doc is modified)"""
+    for op in ops:
+        value = _copy_payload(op.get('value'))
+        tokens = [token.replace('~1', '/').replace('~0', '~') for token in op['path'].split('/')[1:]]
+        if not tokens:
+            doc = None if op['op'] == 'remove' else value
+            continue
+        parent = doc
+        for token in tokens[:-1]:
+            parent = parent[int(token)] if isinstance(parent, list) else parent[token]
+        key = tokens[-1]
+        if isinstance(parent, list):
+            index = len(parent) if key == '-' else int(key)
+            if op['op'] == 'add':
+                parent.insert(index, value)
+            elif op['op'] == 'remove':
+                del parent[index]
+            else:
+                parent[index] = value
+        elif op['op'] == 'remove':
+            del parent[key]
+        else:
+            parent[key] = value
+    return doc
+
+
+class PayloadCache:
+    """Bounded LRU of decoded form_data rows keyed by row id
+    
+    Sizes are accounted by the length of each payload's JSON text. Callers
+    always get their own copy of the payload, so in-place edits in the UI
+    never leak into the cache. Every invalidation bumps `generation`; a put
+    that started reading before the latest invalidation is dropped.
+    """
+    
+    def __init__(self, max_entries=256, max_bytes=32 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.generation = 0
+        self._entries = OrderedDict()  # row id -> (row dict, size)
+        self._names = {}  # form_name -> row id
+        self._bytes = 0
+        self._lock = threading.Lock()
+    
+    def get(self, row_id=None, form_name=None, updated_at=None):
+        """Return a copy of the cached row, or None (also None when updated_at differs)"""
+        with self._lock:
+            if row_id is None:
+                row_id = self._names.get(form_name)
+            entry = self._entries.get(row_id)
+            if entry is None or (updated_at is not None and entry[0]['updated_at'] != updated_at):
+                self.misses += 1
+                return None
+            self._entries.move_to_end(row_id)
+            self.hits += 1
+            row = dict(entry[0])
+        row['data'] = _copy_payload(row['data'])
+        return row
+    
+    def put(self, row, size, generation):
+        """Cache a decoded row read while the cache was at `generation`"""
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if generation != self.generation:
+                return
+            self._discard(row['id'])
+            self._entries[row['id']] = (row, size)
+            self._names[row['form_name']] = row['id']
+            self._bytes += size
+            while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                self._discard(next(iter(self._entries)))
+                self.evictions += 1
+    
+    def invalidate(self, row_ids=(), form_names=()):
+        """Drop rows by id and/or form_name"""
+        with self._lock:
+            self.generation += 1
+            for form_name in form_names:
+                self._discard(self._names.get(form_name))
+            for row_id in row_ids:
+                self._discard(row_id)
+    
+    def clear(self):
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+            self._names.clear()
+            self._bytes = 0
+    
+    def _discard(self, row_id):
+        entry = self._entries.pop(row_id, None)
+        if entry is not None:
+            self._bytes -= entry[1]
+            if self._names.get(entry[0]['form_name']) == row_id:
+                del self._names[entry[0]['form_name']]
+    
+    def stats(self):
+        """Counters and current size, for get_database_stats()"""
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+class UploadCancelled(Exception):
+    """Raised by save_file when its cancel_event is set before the file is registered"""
+
+
 class DatabaseManager:
-    def __init__(self, db_path="qb_academy.db"):
+    def __init__(self, db_path="qb_academy.db", max_readers=4):
         self.db_path = db_path
         self.files_dir = "uploaded_files"
+        
+        # Connection pool: one shared writer plus up to max_readers readers,
+        # checked out per read_connection() block and returned afterwards
+        self.max_readers = max_readers
+        self._write_conn = None
+        self._write_lock = threading.RLock()
+        self._write_depth = 0
+        self._write_owner = None
+        self._pending_invalidations = []
+        self._post_commit_actions = []
+        self._local = threading.local()
+        self._readers = []
+        self._idle_readers = []
+        self._reader_generations = {}  # id(conn) -> PRAGMA generation applied to it
+        self._readers_lock = threading.Lock()
+        self._closed = False
+        self._stopping = False  # set by close(); background upgrades stop at the next batch
+        
+        # Connection PRAGMAs; bumping the generation re-applies them on next use
+        self.performance_profile = DEFAULT_PERFORMANCE_PROFILE
+        self._pragmas = dict(PERFORMANCE_PROFILES[DEFAULT_PERFORMANCE_PROFILE])
+        self._pragma_generation = 0
+        self._write_pragma_generation = None
+        
+        # Single writer thread: write jobs are committed in submission order
+        self._write_queue = queue.Queue()
+        self._writer_thread = threading.Thread(target=self._writer_loop, name="qb-db-writer", daemon=True)
+        
+        # Completion callbacks of writes and backups. With queue_callbacks set
+        # (by a UI) they wait in callback_queue until the UI thread calls
+        # run_queued_callbacks(); otherwise they run on the finishing thread
+        self.queue_callbacks = False
+        self.callback_queue = queue.Queue()
+        
+        # Group-commit buffer for activity_log, mirrored to append-only spill files.
+        # Each process writes its own files (<spill path>.<token>.<batch>) and holds
+        # a lock on <spill path>.<token>.lock while it runs, so clients sharing the
+        # database only replay the spills of processes that have exited
+        self.audit_flush_size = 100
+        self.audit_flush_interval = 2.0
+        self.audit_spill_path = f"{db_path}.audit-spill"
+        self._audit_token = uuid.uuid4().hex
+        self._audit_buffer = []
+        self._audit_lock = threading.Lock()
+        self._audit_timer = None
+        self._audit_spill = None
+        self._audit_spill_seq = 0
+        self._audit_owner_lock = None
+        
+        # Payloads at least this large (UTF-8 bytes) are stored zlib-compressed
+        self.payload_compress_threshold = 4096
+        
+        # Registered queryable fields (form_code -> {field: path}), loaded after migrations
+        self.form_field_indexes = {}
+        
+        # Decoded payloads of recently opened forms; invalidated by every write
+        self.payload_cache = PayloadCache()
+        
+        # Every n-th form revision is stored in full, the others as deltas
+        self.revision_snapshot_interval = 20
+        
+        # Differential form backups: a base segment followed by change segments
+        self.forms_backup_dir = "forms_backups"
+        self.forms_backup_max_deltas = 30
+        
+        # Background uploads (save_file_async); the pool is started on first use
+        self.upload_workers = 3
+        
+        # Files above the threshold are copied in resumable segments (upload_sessions)
+        self.chunked_upload_threshold = 50 * 1024 * 1024
+        self.upload_chunk_size = 8 * 1024 * 1024
+        self._upload_pool = None
+        self._upload_pool_lock = threading.Lock()
+        
         self.ensure_files_directory()
         self.init_database()
+        self.load_performance_profile()
+        self._load_form_field_indexes()
+        self._recover_audit_spill()
+        self._writer_thread.start()
+        
+        # Row backfills and legacy payload rewrites, off the UI thread
+        self._upgrade_thread = threading.Thread(target=self._run_background_upgrades,
+                                                name="qb-background-upgrades", daemon=True)
+        self._upgrade_thread.start()
+        atexit.register(self.close)
+    
+    def _open_connection(self):
+        """Open a pooled connection (PRAGMAs are applied by the pool on first use)"""
+        return sqlite3.connect(self.db_path, timeout=30.0, check_same_thread=False)
+    
+    def _apply_pragmas(self, conn):
+        """Apply the active performance profile to one connection; returns its generation"""
+        generation = self._pragma_generation
+        journal_mode = conn.execute('PRAGMA journal_mode=WAL').fetchone()[0]  # Readers never block the writer
+        for name, value in self._pragmas.items():
+            if name == 'synchronous' and str(value).upper() == 'NORMAL' and journal_mode.lower() != 'wal':
+                value = 'FULL'  # NORMAL can lose committed transactions without WAL
+            conn.execute(f'PRAGMA {name} = {value}')
+        return generation
+    
+    @contextmanager
+    def write_connection(self):
+        """Serialized access to the pooled writer connection; commits on success"""
+        with self._write_lock:
+            if self._write_conn is None:
+                self._write_conn = self._open_connection()
+            conn = self._write_conn
+            if self._write_depth == 0 and self._write_pragma_generation != self._pragma_generation:
+                self._write_pragma_generation = self._apply_pragmas(conn)
+            self._write_depth += 1
+            self._write_owner = threading.get_ident()
+            committed = False
+            try:
+                yield conn
+                if self._write_depth == 1:
+                    conn.commit()
+                    committed = True
+            except Exception:
+                if self._write_depth == 1:
+                    conn.rollback()
+                raise
+            finally:
+                self._write_depth -= 1
+                if self._write_depth == 0:
+                    self._write_owner = None
+                    # Only now is the write visible to readers
+                    pending, self._pending_invalidations = self._pending_invalidations, []
+                    for row_ids, form_names in pending:
+                        self.payload_cache.invalidate(row_ids, form_names)
+                    actions, self._post_commit_actions = self._post_commit_actions, []
+                    for action in actions if committed else []:
+                        try:
+                            action()
+                        except Exception as e:
+                            print(f"Error in post-commit action: {e}")
+    
+    def _after_commit(self, action):
+        """Run action() once the enclosing write transaction has committed (dropped on rollback)
+        
+        Only valid inside write_connection(), e.g. from a submit_write job.
+        """
+        self._post_commit_actions.append(action)
+    
+    @contextmanager
+    def read_connection(self):
+        """Reader connection checked out of the pool for this block
+        
+        Nested blocks on one thread reuse the outer connection. When every
+        reader is in use the block runs on the writer connection instead.
+        """
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            yield conn
+            return
+        
+        with self._readers_lock:
+            if self._closed:
+                raise sqlite3.ProgrammingError("Cannot read from a closed DatabaseManager")
+            if self._idle_readers:
+                conn = self._idle_readers.pop()
+            elif len(self._readers) < self.max_readers:
+                conn = self._open_connection()
+                self._readers.append(conn)
+        if conn is None:
+            with self.write_connection() as conn:
+                yield conn
+            return
+        
+        try:
+            if self._reader_generations.get(id(conn)) != self._pragma_generation:
+                self._reader_generations[id(conn)] = self._apply_pragmas(conn)
+            self._local.conn = conn
+            yield conn
+        finally:
+            self._local.conn = None
+            if conn.in_transaction:
+                conn.rollback()
+            with self._readers_lock:
+                if not self._closed:
+                    self._idle_readers.append(conn)
+                else:
+                    # close() only closes idle readers; this one was in use
+                    conn.close()
+    
+    def submit_write(self, func, *args, callback=None):
+        """Queue func(conn, *args) on the writer thread and return a Future
+        
+        Each job runs in its own transaction on the pooled writer connection.
+        Jobs submitted from the writer thread itself, or from a thread already
+        holding the writer connection, run inline to avoid self-deadlock.
+        """
+        future = Future()
+        if callback:
+            future.add_done_callback(callback)
+        
+        current = threading.get_ident()
+        writer_running = self._writer_thread.is_alive() and not self._closed
+        if not writer_running or current in (self._writer_thread.ident, self._write_owner):
+            self._run_write_job(func, args, future)
+        else:
+            self._write_queue.put((func, args, future))
+        return future
+    
+    def _run_write_job(self, func, args, future):
+        """Execute one write job and resolve its Future"""
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            with self.write_connection() as conn:
+                result = func(conn, *args)
+        except BaseException as e:
+            future.set_exception(e)
+        else:
+            future.set_result(result)
+    
+    def _writer_loop(self):
+        """Writer thread: drain the write queue in order until close()"""
+        while True:
+            job = self._write_queue.get()
+            if job is None:
+                break
+            self._run_write_job(*job)
+    
+    def post_callback(self, callback, *args):
+        """Deliver callback(*args) through callback_queue, or call it now when callbacks are not queued"""
+        if self.queue_callbacks:
+            self.callback_queue.put((callback, args))
+        else:
+            callback(*args)
+    
+    def run_queued_callbacks(self, max_items=100):
+        """Run up to max_items queued callbacks; the UI calls this periodically from its own thread"""
+        for _ in range(max_items):
+            try:
+                callback, args = self.callback_queue.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                callback(*args)
+            except Exception as e:
+                print(f"Error in write callback: {e}")
+    
+    def _finish_write(self, future, callback, error_message):
+        """Wait for a write Future (or hand callback(success) to it) and report errors
+        
+        The callback is delivered through post_callback, never run on the
+        writer thread while a UI drains callback_queue.
+        """
+        def _succeeded(done):
+            try:
+                return done.result()
+            except Exception as e:
+                print(f"{error_message}: {e}")
+                return False
+        
+        if callback:
+            future.add_done_callback(lambda done: self.post_callback(callback, _succeeded(done)))
+            return future
+        return _succeeded(future)
+    
+    def close(self):
+        """Drain pending writes and close all pooled connections"""
+        if self._closed:
+            return
+        if self._upload_pool is not None:
+            self._upload_pool.shutdown(wait=True, cancel_futures=True)
+        # Background upgrades stop after their current batch, before the pool closes
+        self._stopping = True
+        if self._upgrade_thread.is_alive() and self._upgrade_thread is not threading.current_thread():
+            self._upgrade_thread.join()
+        self.flush_activity_log(wait=True)
+        self._closed = True
+        if self._writer_thread.is_alive():
+            self._write_queue.put(None)
+            self._writer_thread.join()
+        self._release_audit_spill()
+        with self._readers_lock:
+            # Readers still checked out are closed by read_connection when they come back
+            for conn in self._idle_readers:
+                try:
+                    conn.close()
+                except sqlite3.Error:
+                    pass
+            self._readers = []
+            self._idle_readers = []
+        with self._write_lock:
+            if self._write_conn is not None:
+                self._write_conn.close()
+                self._write_conn = None
     
     def ensure_files_directory(self):
         """إنشاء مجلد الملفات المرفوعة إذا لم يكن موجوداً"""
@@ -30,175 +691,818 @@ class DatabaseManager:
                 os.makedirs(os.path.join(self.files_dir, subdir), exist_ok=True)
     
     def init_database(self):
-        """إنشاء قاعدة البيانات والجداول"""
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            
-            # جدول المستخدمين
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS users (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    username TEXT UNIQUE NOT NULL,
-                    password_hash TEXT NOT NULL,
-                    full_name TEXT NOT NULL,
-                    email TEXT,
-                    role TEXT NOT NULL DEFAULT 'user',
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    last_login TIMESTAMP,
-                    is_active BOOLEAN DEFAULT 1
-                )
-            ''')
-            
-            # جدول الإجراءات
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS procedures (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    code TEXT UNIQUE NOT NULL,
-                    title TEXT NOT NULL,
-                    purpose TEXT,
-                    scope TEXT,
-                    content TEXT,
-                    version TEXT DEFAULT '1.0',
-                    status TEXT DEFAULT 'draft',
-                    created_by INTEGER,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (created_by) REFERENCES users (id)
-                )
-            ''')
-            
-            # جدول النماذج
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS forms (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    code TEXT UNIQUE NOT NULL,
-                    title TEXT NOT NULL,
-                    description TEXT,
-                    fields_structure TEXT,
-                    created_by INTEGER,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (created_by) REFERENCES users (id)
-                )
-            ''')
-            
-            # جدول بيانات النماذج
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS form_data (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    form_name TEXT NOT NULL,
-                    form_data TEXT NOT NULL,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    created_by INTEGER,
-                    FOREIGN KEY (created_by) REFERENCES users (id)
-                )
-            ''')
-            
-            # Check if the form_name column exists before creating index
-            try:
-                cursor.execute("SELECT form_name FROM form_data LIMIT 1")
-                # If no error, create index for faster searches
-                cursor.execute('''
-                    CREATE INDEX IF NOT EXISTS idx_form_name ON form_data(form_name)
-                ''')
-            except sqlite3.OperationalError:
-                # Column doesn't exist, might be old structure - recreate table
-                cursor.execute('DROP TABLE IF EXISTS form_data')
-                cursor.execute('''
-                    CREATE TABLE form_data (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        form_name TEXT NOT NULL,
-                        form_data TEXT NOT NULL,
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        created_by INTEGER,
-                        FOREIGN KEY (created_by) REFERENCES users (id)
-                    )
-                ''')
-                cursor.execute('''
-                    CREATE INDEX IF NOT EXISTS idx_form_name ON form_data(form_name)
-                ''')
-            
-            # جدول الملفات المرفوعة
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS uploaded_files (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    original_name TEXT NOT NULL,
-                    stored_name TEXT NOT NULL,
-                    file_path TEXT NOT NULL,
-                    file_type TEXT,
-                    file_size INTEGER,
-                    file_hash TEXT,
-                    category TEXT DEFAULT 'general',
-                    related_table TEXT,
-                    related_id INTEGER,
-                    uploaded_by INTEGER,
-                    upload_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    description TEXT,
-                    FOREIGN KEY (uploaded_by) REFERENCES users (id)
-                )
-            ''')
-            
-            # جدول الشهادات
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS certificates (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    certificate_number TEXT UNIQUE NOT NULL,
-                    candidate_name TEXT NOT NULL,
-                    certificate_type TEXT NOT NULL,
-                    issue_date DATE NOT NULL,
-                    expiry_date DATE,
-                    status TEXT DEFAULT 'active',
-                    issued_by INTEGER,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (issued_by) REFERENCES users (id)
-                )
-            ''')
-            
-            # جدول التقييمات
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS assessments (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    candidate_name TEXT NOT NULL,
-                    assessment_type TEXT NOT NULL,
-                    assessment_date DATE NOT NULL,
-                    assessor_id INTEGER,
-                    score REAL,
-                    result TEXT,
-                    notes TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (assessor_id) REFERENCES users (id)
-                )
-            ''')
-            
-            # جدول سجل النشاطات
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS activity_log (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    user_id INTEGER,
-                    action TEXT NOT NULL,
-                    table_name TEXT,
-                    record_id INTEGER,
-                    old_values TEXT,
-                    new_values TEXT,
-                    timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    ip_address TEXT,
-                    FOREIGN KEY (user_id) REFERENCES users (id)
-                )
-            ''')
-            
-            # إنشاء مستخدم افتراضي (admin)
-            self.create_default_admin()
-            
-            conn.commit()
+        """إنشاء قاعدة البيانات والجداول عبر خطوات الترحيل"""
+        self.migrate_schema()
+        
+        # إنشاء مستخدم افتراضي (admin)
+        self.create_default_admin()
+    
+    def _schema_migrations(self):
+        """Ordered (version, description, step) list; applied steps must never change"""
+        return [
+            (1, "base tables", self._migrate_base_tables),
+            (2, "form_data derived columns and change tracking", self._upgrade_form_data_table),
+            (3, "full-text search index", self._create_search_index),
+            (4, "Section 8 form tables", self._migrate_section8_tables),
+            (5, "row-level storage for tabular forms", self._migrate_form_rows),
+            (6, "form revision history", self._migrate_form_revisions),
+            (7, "system settings", self._migrate_system_settings),
+            (8, "trigger-maintained statistics", self._migrate_db_stats),
+            (9, "form field expression indexes", self._migrate_form_field_indexes),
+            (10, "content-addressed file store", self._migrate_file_blobs),
+            (11, "resumable upload sessions", self._migrate_upload_sessions),
+            (12, "uploaded file listing indexes", self._migrate_file_list_indexes),
+            (13, "form field indexes on saved payload keys", self._migrate_form_field_keys),
+            (14, "pausable form_data change tracking", self._migrate_change_tracking_pause),
+            (15, "incremental metadata of row-stored forms", self._migrate_row_form_metadata),
+        ]
+    
+    def migrate_schema(self):
+        """Apply pending schema migrations and return the resulting user_version
+        
+        Each step runs in its own transaction together with the user_version
+        bump, so an interrupted upgrade resumes at the failed step. Steps only
+        create objects or add columns, which SQLite does without rewriting
+        tables; row backfills run afterwards in small batches
+        (backfill_form_data_columns) while the database stays in use.
+        """
+        version = 0
+        for step_version, description, step in self._schema_migrations():
+            with self.write_connection() as conn:
+                # DDL does not open a transaction implicitly; take the write lock up front
+                if not conn.in_transaction:
+                    conn.execute('BEGIN IMMEDIATE')
+                version = conn.execute('PRAGMA user_version').fetchone()[0]
+                if step_version <= version:
+                    continue
+                step(conn)
+                conn.execute(f'PRAGMA user_version = {step_version}')
+            version = step_version
+            print(f"Schema migration {step_version} applied: {description}")
+        return version
+    
+    def _migrate_base_tables(self, conn):
+        """Migration 1: core tables"""
+        cursor = conn.cursor()
+        
+        # جدول المستخدمين
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS users (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                username TEXT UNIQUE NOT NULL,
+                password_hash TEXT NOT NULL,
+                full_name TEXT NOT NULL,
+                email TEXT,
+                role TEXT NOT NULL DEFAULT 'user',
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                last_login TIMESTAMP,
+                is_active BOOLEAN DEFAULT 1
+            )
+        ''')
+        
+        # جدول الإجراءات
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS procedures (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                code TEXT UNIQUE NOT NULL,
+                title TEXT NOT NULL,
+                purpose TEXT,
+                scope TEXT,
+                content TEXT,
+                version TEXT DEFAULT '1.0',
+                status TEXT DEFAULT 'draft',
+                created_by INTEGER,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (created_by) REFERENCES users (id)
+            )
+        ''')
+        
+        # جدول النماذج
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS forms (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                code TEXT UNIQUE NOT NULL,
+                title TEXT NOT NULL,
+                description TEXT,
+                fields_structure TEXT,
+                created_by INTEGER,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (created_by) REFERENCES users (id)
+            )
+        ''')
+        
+        # جدول بيانات النماذج (النسخ القديمة بدون form_name تُحفظ باسم form_data_legacy)
+        columns = {row[1] for row in cursor.execute("PRAGMA table_info(form_data)")}
+        if columns and 'form_name' not in columns:
+            cursor.execute('ALTER TABLE form_data RENAME TO form_data_legacy')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS form_data (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                form_name TEXT NOT NULL,
+                form_data TEXT NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                created_by INTEGER,
+                form_code TEXT,
+                instance_key TEXT,
+                record_count INTEGER,
+                payload_bytes INTEGER,
+                payload_hash TEXT,
+                change_seq INTEGER,
+                FOREIGN KEY (created_by) REFERENCES users (id)
+            )
+        ''')
+        
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_form_name ON form_data(form_name)
+        ''')
+        
+        # جدول الملفات المرفوعة
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS uploaded_files (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                original_name TEXT NOT NULL,
+                stored_name TEXT NOT NULL,
+                file_path TEXT NOT NULL,
+                file_type TEXT,
+                file_size INTEGER,
+                file_hash TEXT,
+                category TEXT DEFAULT 'general',
+                related_table TEXT,
+                related_id INTEGER,
+                uploaded_by INTEGER,
+                upload_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                description TEXT,
+                FOREIGN KEY (uploaded_by) REFERENCES users (id)
+            )
+        ''')
+        
+        # جدول الشهادات
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS certificates (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                certificate_number TEXT UNIQUE NOT NULL,
+                candidate_name TEXT NOT NULL,
+                certificate_type TEXT NOT NULL,
+                issue_date DATE NOT NULL,
+                expiry_date DATE,
+                status TEXT DEFAULT 'active',
+                issued_by INTEGER,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (issued_by) REFERENCES users (id)
+            )
+        ''')
+        
+        # جدول التقييمات
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS assessments (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                candidate_name TEXT NOT NULL,
+                assessment_type TEXT NOT NULL,
+                assessment_date DATE NOT NULL,
+                assessor_id INTEGER,
+                score REAL,
+                result TEXT,
+                notes TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (assessor_id) REFERENCES users (id)
+            )
+        ''')
+        
+        # جدول سجل النشاطات
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS activity_log (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER,
+                action TEXT NOT NULL,
+                table_name TEXT,
+                record_id INTEGER,
+                old_values TEXT,
+                new_values TEXT,
+                timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                ip_address TEXT,
+                FOREIGN KEY (user_id) REFERENCES users (id)
+            )
+        ''')
+
+    def _migrate_form_rows(self, conn):
+        """Migration 5: one row per table record of a tabular form"""
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS form_rows (
+                row_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                form_name TEXT NOT NULL,
+                form_code TEXT,
+                position REAL NOT NULL,
+                row_values TEXT NOT NULL,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                updated_by INTEGER,
+                FOREIGN KEY (updated_by) REFERENCES users (id)
+            )
+        ''')
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_form_rows_form ON form_rows(form_name, position)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_form_rows_code ON form_rows(form_code)")
+    
+    def _migrate_form_revisions(self, conn):
+        """Migration 6: per-form revision chain of snapshots and JSON-patch deltas"""
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS form_revisions (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                form_name TEXT NOT NULL,
+                revision INTEGER NOT NULL,
+                kind TEXT NOT NULL CHECK (kind IN ('snapshot', 'delta', 'delete')),
+                payload BLOB,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                created_by INTEGER,
+                UNIQUE (form_name, revision),
+                FOREIGN KEY (created_by) REFERENCES users (id)
+            )
+        ''')
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_form_revisions_time ON form_revisions(form_name, created_at)")
+    
+    def _migrate_system_settings(self, conn):
+        """Migration 7: key/value application settings"""
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS system_settings (
+                key TEXT PRIMARY KEY,
+                value TEXT,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                updated_by INTEGER,
+                FOREIGN KEY (updated_by) REFERENCES users (id)
+            )
+        ''')
+        conn.execute("INSERT OR IGNORE INTO system_settings (key, value) VALUES ('performance_profile', ?)",
+                     (DEFAULT_PERFORMANCE_PROFILE,))
+    
+    def _migrate_db_stats(self, conn):
+        """Migration 8: single-row db_stats table kept current by insert/update/delete triggers"""
+        columns = ",\n".join(f"                {column} INTEGER NOT NULL DEFAULT 0" for column in DB_STATS_COUNTERS)
+        conn.execute(f'''
+            CREATE TABLE IF NOT EXISTS db_stats (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+{columns}
+            )
+        ''')
+        
+        tables = {}
+        for column, (table, value) in DB_STATS_COUNTERS.items():
+            tables.setdefault(table, []).append((column, value))
+        for table, counters in tables.items():
+            added = ", ".join(f"{column} = {column} + ({value.format(row='NEW')})" for column, value in counters)
+            removed = ", ".join(f"{column} = {column} - ({value.format(row='OLD')})" for column, value in counters)
+            conn.execute(f'''CREATE TRIGGER IF NOT EXISTS trg_db_stats_{table}_insert AFTER INSERT ON {table}
+                BEGIN UPDATE db_stats SET {added} WHERE id = 1; END''')
+            conn.execute(f'''CREATE TRIGGER IF NOT EXISTS trg_db_stats_{table}_delete AFTER DELETE ON {table}
+                BEGIN UPDATE db_stats SET {removed} WHERE id = 1; END''')
+            changed = [(column, value) for column, value in counters if '{row}' in value]
+            if changed:
+                updated = ", ".join(f"{column} = {column} - ({value.format(row='OLD')}) + ({value.format(row='NEW')})"
+                                    for column, value in changed)
+                conn.execute(f'''CREATE TRIGGER IF NOT EXISTS trg_db_stats_{table}_update AFTER UPDATE ON {table}
+                    BEGIN UPDATE db_stats SET {updated} WHERE id = 1; END''')
+        self._recompute_stats(conn)
+    
+    def _recompute_stats(self, conn):
+        """Rewrite the db_stats row from full counts"""
+        counts = ", ".join(f"(SELECT COALESCE(SUM({value.format(row=table)}), 0) FROM {table})"
+                           for table, value in DB_STATS_COUNTERS.values())
+        conn.execute(f"INSERT OR REPLACE INTO db_stats (id, {', '.join(DB_STATS_COUNTERS)}) SELECT 1, {counts}")
+    
+    def _migrate_form_field_indexes(self, conn):
+        """Migration 9: field-index registry seeded from FORM_FIELD_INDEXES"""
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS form_field_indexes (
+                form_code TEXT NOT NULL,
+                field TEXT NOT NULL,
+                json_path TEXT NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (form_code, field)
+            )
+        ''')
+        for form_code, fields in FORM_FIELD_INDEXES.items():
+            for field, path in fields.items():
+                self._create_field_index(conn, form_code, field, path)
+    
+    def _migrate_file_blobs(self, conn):
+        """Migration 10: uploaded file contents stored once per SHA-256, reference counted by trigger"""
+        self._add_missing_columns(conn, 'uploaded_files', [('content_hash', 'TEXT')])
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_uploaded_files_content_hash ON uploaded_files(content_hash)")
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS file_blobs (
+                content_hash TEXT PRIMARY KEY,
+                blob_path TEXT NOT NULL,
+                size INTEGER,
+                ref_count INTEGER NOT NULL DEFAULT 0,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        for trigger in (
+            '''CREATE TRIGGER IF NOT EXISTS trg_file_blobs_insert AFTER INSERT ON uploaded_files
+            WHEN NEW.content_hash IS NOT NULL
+            BEGIN
+                INSERT INTO file_blobs (content_hash, blob_path, size, ref_count)
+                VALUES (NEW.content_hash, NEW.file_path, NEW.file_size, 1)
+                ON CONFLICT(content_hash) DO UPDATE SET ref_count = ref_count + 1;
+            END''',
+            '''CREATE TRIGGER IF NOT EXISTS trg_file_blobs_delete AFTER DELETE ON uploaded_files
+            WHEN OLD.content_hash IS NOT NULL
+            BEGIN
+                UPDATE file_blobs SET ref_count = ref_count - 1 WHERE content_hash = OLD.content_hash;
+            END''',
+            '''CREATE TRIGGER IF NOT EXISTS trg_file_blobs_update AFTER UPDATE OF content_hash ON uploaded_files
+            WHEN OLD.content_hash IS NOT NEW.content_hash
+            BEGIN
+                UPDATE file_blobs SET ref_count = ref_count - 1 WHERE content_hash = OLD.content_hash;
+                INSERT INTO file_blobs (content_hash, blob_path, size, ref_count)
+                SELECT NEW.content_hash, NEW.file_path, NEW.file_size, 1 WHERE NEW.content_hash IS NOT NULL
+                ON CONFLICT(content_hash) DO UPDATE SET ref_count = ref_count + 1;
+            END''',
+        ):
+            conn.execute(trigger)
+    
+    def _migrate_upload_sessions(self, conn):
+        """Migration 11: progress of chunked uploads, so they can resume after a crash or cancel"""
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS upload_sessions (
+                id TEXT PRIMARY KEY,
+                source_path TEXT NOT NULL,
+                original_name TEXT NOT NULL,
+                file_size INTEGER NOT NULL,
+                source_mtime INTEGER,
+                category TEXT,
+                related_table TEXT,
+                related_id INTEGER,
+                uploaded_by INTEGER,
+                description TEXT,
+                expected_hash TEXT,
+                temp_path TEXT NOT NULL,
+                chunk_size INTEGER NOT NULL,
+                bytes_done INTEGER NOT NULL DEFAULT 0,
+                status TEXT NOT NULL DEFAULT 'active'
+                    CHECK (status IN ('active', 'paused', 'completed', 'failed', 'cancelled')),
+                error TEXT,
+                file_id INTEGER,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (uploaded_by) REFERENCES users (id)
+            )
+        ''')
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_upload_sessions_status ON upload_sessions(status, uploaded_by)")
+    
+    def _migrate_file_list_indexes(self, conn):
+        """Migration 12: indexes matching the list_files filters, each ending in upload_date for the sort"""
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_uploaded_files_upload_date ON uploaded_files(upload_date)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_uploaded_files_category_date ON uploaded_files(category, upload_date)")
+        conn.execute('''
+            CREATE INDEX IF NOT EXISTS idx_uploaded_files_related
+            ON uploaded_files(related_table, related_id, upload_date)
+        ''')
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_uploaded_files_uploaded_by ON uploaded_files(uploaded_by, upload_date)")
+    
+    def _migrate_form_field_keys(self, conn):
+        """Migration 13: replace the label-path field indexes with the keys forms are saved under"""
+        for form_code, fields in SUPERSEDED_FORM_FIELDS.items():
+            for field in fields:
+                conn.execute(f"DROP INDEX IF EXISTS idx_form_field_{form_code.replace('-', '_')}_{field}")
+                conn.execute('DELETE FROM form_field_indexes WHERE form_code = ? AND field = ?', (form_code, field))
+        for form_code, fields in FORM_FIELD_INDEXES.items():
+            for field, path in fields.items():
+                self._create_field_index(conn, form_code, field, path)
+    
+    def _migrate_change_tracking_pause(self, conn):
+        """Migration 14: updates made while change_tracking_pause has its row do not bump change_seq"""
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS change_tracking_pause (
+                id INTEGER PRIMARY KEY CHECK (id = 1)
+            )
+        ''')
+        conn.execute("DROP TRIGGER IF EXISTS trg_form_data_update_seq")
+        conn.execute('''
+            CREATE TRIGGER trg_form_data_update_seq AFTER UPDATE OF form_name, form_data ON form_data
+            WHEN NOT EXISTS (SELECT 1 FROM change_tracking_pause)
+            BEGIN
+                UPDATE change_sequence SET value = value + 1 WHERE id = 1;
+                INSERT INTO form_data_deletions (change_seq, form_name)
+                SELECT value, OLD.form_name FROM change_sequence
+                WHERE id = 1 AND OLD.form_name IS NOT NEW.form_name;
+                UPDATE change_sequence SET value = value + 1 WHERE id = 1 AND OLD.form_name IS NOT NEW.form_name;
+                UPDATE form_data SET change_seq = (SELECT value FROM change_sequence WHERE id = 1)
+                WHERE id = NEW.id;
+            END
+        ''')
+    
+    def _migrate_row_form_metadata(self, conn):
+        """Migration 15: recompute row-stored form metadata as kept incrementally by _touch_form_rows"""
+        marker, _ = self._encode_payload(ROW_STORAGE_MARKER)
+        for form_id, form_name in conn.execute(
+                'SELECT id, form_name FROM form_data WHERE form_data = ?', (marker,)).fetchall():
+            rows = conn.execute('SELECT row_id, position, row_values FROM form_rows WHERE form_name = ?',
+                                (form_name,)).fetchall()
+            conn.execute('UPDATE form_data SET record_count = ?, payload_bytes = ?, payload_hash = ? WHERE id = ?',
+                         (*_row_metadata(rows), form_id))
+    
+    @contextmanager
+    def _change_tracking_paused(self, conn):
+        """Inside a writer job: form_data rewrites in the block keep their change_seq
+        
+        Used for re-encoding that leaves the content unchanged. The pause row
+        is deleted again before the job commits, so other writes still bump it.
+        """
+        if not conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'change_tracking_pause'").fetchone():
+            yield  # migrations before 14 run without the pause
+            return
+        conn.execute("INSERT OR IGNORE INTO change_tracking_pause (id) VALUES (1)")
+        try:
+            yield
+        finally:
+            conn.execute("DELETE FROM change_tracking_pause")
+    
+    def _migrate_section8_tables(self, conn):
+        """Migration 4: tables written by the Section 8 (QP-08) form handlers"""
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS evaluator_applications (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                form_name TEXT,
+                full_name TEXT,
+                national_id TEXT,
+                birth_date TEXT,
+                nationality TEXT,
+                phone TEXT,
+                email TEXT,
+                address TEXT,
+                qualification TEXT,
+                specialization TEXT,
+                experience_years TEXT,
+                current_job TEXT,
+                employer TEXT,
+                previous_evaluation_experience TEXT,
+                professional_qualifications TEXT,
+                evaluation_type TEXT,
+                required_specializations TEXT,
+                accreditation_level TEXT,
+                justification TEXT,
+                attached_documents TEXT,
+                declarations TEXT,
+                applicant_signature TEXT,
+                signature_date TEXT,
+                created_date TEXT
+            )
+        ''')
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS evaluator_assessments (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                form_name TEXT,
+                evaluator_name TEXT,
+                application_number TEXT,
+                specialization TEXT,
+                assessment_date TEXT,
+                theoretical_score TEXT,
+                practical_score TEXT,
+                personality_score TEXT,
+                total_score TEXT,
+                recommendation TEXT,
+                proposed_scope TEXT,
+                notes TEXT,
+                chief_evaluator_name TEXT,
+                chief_evaluator_signature TEXT,
+                reviewer_name TEXT,
+                reviewer_signature TEXT,
+                assessment_date_final TEXT,
+                created_date TEXT
+            )
+        ''')
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS evaluator_status (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                form_name TEXT,
+                accreditation_number TEXT,
+                evaluator_name TEXT,
+                specialization TEXT,
+                accreditation_scope TEXT,
+                initial_accreditation_date TEXT,
+                expiry_date TEXT,
+                current_status TEXT,
+                assessments_completed TEXT,
+                last_assessment TEXT,
+                performance_rating TEXT,
+                complaints TEXT,
+                corrective_actions TEXT,
+                last_training TEXT,
+                training_date TEXT,
+                required_training TEXT,
+                development_plan TEXT,
+                last_update_date TEXT,
+                update_reason TEXT,
+                new_status TEXT,
+                update_notes TEXT,
+                responsible_officer TEXT,
+                officer_position TEXT,
+                officer_signature TEXT,
+                officer_date TEXT,
+                created_date TEXT
+            )
+        ''')
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS center_applications (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                form_name TEXT,
+                center_name TEXT,
+                institution_type TEXT,
+                commercial_register TEXT,
+                tax_number TEXT,
+                full_address TEXT,
+                phone_number TEXT,
+                email TEXT,
+                website TEXT,
+                manager_name TEXT,
+                manager_position TEXT,
+                establishment_year TEXT,
+                services_offered TEXT,
+                required_specializations TEXT,
+                assessment_levels TEXT,
+                target_groups TEXT,
+                capacity TEXT,
+                total_area TEXT,
+                halls_count TEXT,
+                halls_specifications TEXT,
+                technical_equipment TEXT,
+                library_resources TEXT,
+                assessment_tools TEXT,
+                safety_equipment TEXT,
+                admin_staff_count TEXT,
+                certified_evaluators_count TEXT,
+                trainee_evaluators_count TEXT,
+                evaluators_qualifications TEXT,
+                training_programs TEXT,
+                hr_management_system TEXT,
+                quality_certificate TEXT,
+                quality_manual TEXT,
+                assessment_procedures TEXT,
+                documentation_system TEXT,
+                internal_audit_program TEXT,
+                complaints_procedures TEXT,
+                continuous_improvement_system TEXT,
+                supporting_documents TEXT,
+                declarations TEXT,
+                manager_signature TEXT,
+                signature_date TEXT,
+                created_date TEXT
+            )
+        ''')
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS center_assessments (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                form_name TEXT,
+                center_name TEXT,
+                application_number TEXT,
+                assessment_date TEXT,
+                assessment_team TEXT,
+                assessment_duration TEXT,
+                assessment_type TEXT,
+                assessment_scope TEXT,
+                total_points TEXT,
+                percentage TEXT,
+                overall_rating TEXT,
+                recommendation TEXT,
+                strengths TEXT,
+                weaknesses TEXT,
+                opportunities TEXT,
+                challenges TEXT,
+                corrective_actions TEXT,
+                implementation_timeline TEXT,
+                responsibilities TEXT,
+                follow_up_indicators TEXT,
+                team_leader_name TEXT,
+                team_leader_signature TEXT,
+                team_member_name TEXT,
+                team_member_signature TEXT,
+                reviewer_name TEXT,
+                reviewer_signature TEXT,
+                report_date TEXT,
+                created_date TEXT
+            )
+        ''')
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS competency_determinations (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                form_name TEXT,
+                full_name TEXT,
+                national_id TEXT,
+                position TEXT,
+                employer TEXT,
+                specialization TEXT,
+                experience_years TEXT,
+                qualification TEXT,
+                assessment_date TEXT,
+                overall_competency_level TEXT,
+                recommendation TEXT,
+                development_areas TEXT,
+                proposed_training TEXT,
+                development_timeline TEXT,
+                progress_indicators TEXT,
+                general_notes TEXT,
+                evaluator_name TEXT,
+                evaluator_signature TEXT,
+                evaluator_date TEXT,
+                reviewer_name TEXT,
+                reviewer_signature TEXT,
+                reviewer_date TEXT,
+                created_date TEXT
+            )
+        ''')
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS additional_requirements (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                form_name TEXT,
+                program_name TEXT,
+                program_code TEXT,
+                issuing_entity TEXT,
+                form_date TEXT,
+                responsible_person TEXT,
+                req_type_legal BOOLEAN,
+                req_type_sector BOOLEAN,
+                req_type_national BOOLEAN,
+                req_type_beneficiary BOOLEAN,
+                req_type_other TEXT,
+                req1_description TEXT,
+                req1_source TEXT,
+                req1_mandatory TEXT,
+                req1_notes TEXT,
+                req2_description TEXT,
+                req2_source TEXT,
+                req2_mandatory TEXT,
+                req2_notes TEXT,
+                req3_description TEXT,
+                req3_source TEXT,
+                req3_mandatory TEXT,
+                req3_notes TEXT,
+                integration_scientific_content TEXT,
+                integration_evaluation_methods TEXT,
+                integration_learning_outcomes TEXT,
+                integration_accreditation_procedures TEXT,
+                verification_program_reviewed BOOLEAN,
+                verification_committee_approval BOOLEAN,
+                verification_documents_updated BOOLEAN,
+                verification_parties_notified BOOLEAN,
+                approval1_name TEXT,
+                approval1_position TEXT,
+                approval1_signature TEXT,
+                approval1_date TEXT,
+                approval2_name TEXT,
+                approval2_position TEXT,
+                approval2_signature TEXT,
+                approval2_date TEXT,
+                created_date TEXT
+            )
+        ''')
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS evaluator_renewals (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                form_name TEXT,
+                accreditation_number TEXT,
+                evaluator_name TEXT,
+                specialization TEXT,
+                current_scope TEXT,
+                original_accreditation_date TEXT,
+                current_expiry_date TEXT,
+                current_status TEXT,
+                action_type TEXT,
+                request_date TEXT,
+                justification TEXT,
+                supporting_documents TEXT,
+                updated_performance_assessment TEXT,
+                decision_made TEXT,
+                effective_date TEXT,
+                action_expiry_date TEXT,
+                new_conditions TEXT,
+                follow_up_procedures TEXT,
+                accreditation_manager_name TEXT,
+                accreditation_manager_signature TEXT,
+                accreditation_manager_date TEXT,
+                executive_manager_name TEXT,
+                executive_manager_signature TEXT,
+                executive_manager_date TEXT,
+                board_name TEXT,
+                board_signature TEXT,
+                board_date TEXT,
+                additional_notes TEXT,
+                created_date TEXT
+            )
+        ''')
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS center_renewals (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                form_name TEXT,
+                accreditation_number TEXT,
+                center_name TEXT,
+                institution_type TEXT,
+                current_scope TEXT,
+                original_accreditation_date TEXT,
+                expiry_date TEXT,
+                current_status TEXT,
+                requested_action TEXT,
+                request_date TEXT,
+                request_justification TEXT,
+                scope_changes TEXT,
+                updated_documents TEXT,
+                performance_assessment TEXT,
+                assessment_start_date TEXT,
+                assessment_team TEXT,
+                assessment_results TEXT,
+                recommendations TEXT,
+                additional_requirements TEXT,
+                corrective_actions TEXT,
+                final_decision TEXT,
+                decision_effective_date TEXT,
+                new_accreditation_period TEXT,
+                new_scope TEXT,
+                conditions_limitations TEXT,
+                follow_up_requirements TEXT,
+                additional_notes TEXT,
+                created_date TEXT
+            )
+        ''')
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS competency_assessment_records (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                form_name TEXT,
+                record_number TEXT,
+                assessment_date TEXT,
+                assessed_person_name TEXT,
+                position TEXT,
+                employer TEXT,
+                assessment_purpose TEXT,
+                responsible_assessor TEXT,
+                total_points TEXT,
+                percentage TEXT,
+                overall_competency_level TEXT,
+                strengths TEXT,
+                weaknesses TEXT,
+                required_development_areas TEXT,
+                proposed_training_programs TEXT,
+                development_timeline TEXT,
+                progress_indicators TEXT,
+                required_resources TEXT,
+                follow_up_responsible TEXT,
+                chief_assessor_name TEXT,
+                chief_assessor_signature TEXT,
+                chief_assessor_date TEXT,
+                assessment_reviewer_name TEXT,
+                assessment_reviewer_signature TEXT,
+                assessment_reviewer_date TEXT,
+                hr_manager_name TEXT,
+                hr_manager_signature TEXT,
+                hr_manager_date TEXT,
+                created_date TEXT
+            )
+        ''')
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS additional_requirements_reviews (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                form_name TEXT,
+                review_record_number TEXT,
+                review_date TEXT,
+                review_type TEXT,
+                responsible_reviewer TEXT,
+                review_scope TEXT,
+                review_reason TEXT,
+                reference_standards TEXT,
+                proposed_new_requirements TEXT,
+                deleted_requirements TEXT,
+                modified_requirements TEXT,
+                change_justifications TEXT,
+                system_impact TEXT,
+                implementation_priorities TEXT,
+                timeline TEXT,
+                required_resources TEXT,
+                responsibilities TEXT,
+                expected_risks TEXT,
+                success_indicators TEXT,
+                next_review_date TEXT,
+                review_frequency TEXT,
+                follow_up_mechanisms TEXT,
+                required_progress_reports TEXT,
+                management_system_manager_name TEXT,
+                management_system_manager_signature TEXT,
+                management_system_manager_date TEXT,
+                internal_auditor_name TEXT,
+                internal_auditor_signature TEXT,
+                internal_auditor_date TEXT,
+                executive_manager_name TEXT,
+                executive_manager_signature TEXT,
+                executive_manager_date TEXT,
+                final_notes TEXT,
+                created_date TEXT
+            )
+        ''')
     
     def create_default_admin(self):
         """إنشاء مستخدم admin افتراضي"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self.write_connection() as conn:
                 cursor = conn.cursor()
-                
+
                 # التحقق من وجود مستخدم admin
                 cursor.execute("SELECT id FROM users WHERE username = 'admin'")
                 if not cursor.fetchone():
@@ -209,8 +1513,7 @@ class DatabaseManager:
                         INSERT INTO users (username, password_hash, full_name, email, role)
                         VALUES (?, ?, ?, ?, ?)
                     ''', ("admin", password_hash, "مدير النظام", "admin@qbacademy.com", "admin"))
-                    
-                    conn.commit()
+
                     print("تم إنشاء المستخدم الافتراضي: admin / admin123")
                 else:
                     print("المستخدم الافتراضي موجود مسبقاً")
@@ -219,14 +1522,13 @@ class DatabaseManager:
             print(f"خطأ في إنشاء المستخدم الافتراضي: {str(e)}")
             # محاولة إنشاؤه مرة أخرى بطريقة مختلفة
             try:
-                with sqlite3.connect(self.db_path) as conn:
+                with self.write_connection() as conn:
                     cursor = conn.cursor()
                     password_hash = hashlib.sha256("admin123".encode()).hexdigest()
                     cursor.execute('''
                         INSERT OR IGNORE INTO users (username, password_hash, full_name, email, role)
                         VALUES (?, ?, ?, ?, ?)
                     ''', ("admin", password_hash, "مدير النظام", "admin@qbacademy.com", "admin"))
-                    conn.commit()
                     print("تم إنشاء المستخدم الافتراضي بالطريقة البديلة")
             except Exception as e2:
                 print(f"فشل في إنشاء المستخدم الافتراضي: {str(e2)}")
@@ -238,9 +1540,9 @@ class DatabaseManager:
         print(f"محاولة مصادقة المستخدم: '{username}'")
         print(f"Hash كلمة المرور: {password_hash[:10]}...")
         
-        with sqlite3.connect(self.db_path) as conn:
+        with self.read_connection() as conn:
             cursor = conn.cursor()
-            
+
             # التحقق من وجود المستخدم أولاً
             cursor.execute("SELECT username FROM users WHERE username = ?", (username,))
             user_exists = cursor.fetchone()
@@ -254,65 +1556,63 @@ class DatabaseManager:
             
             user = cursor.fetchone()
             print(f"نتيجة المصادقة: {user is not None}")
-            
-            if user:
-                # تحديث آخر تسجيل دخول
-                cursor.execute('''
+
+        if user:
+            # تحديث آخر تسجيل دخول
+            with self.write_connection() as conn:
+                conn.execute('''
                     UPDATE users SET last_login = CURRENT_TIMESTAMP WHERE id = ?
                 ''', (user[0],))
-                conn.commit()
-                
-                return {
-                    'id': user[0],
-                    'username': user[1],
-                    'full_name': user[2],
-                    'role': user[3],
-                    'is_active': user[4]
-                }
-            return None
+
+            return {
+                'id': user[0],
+                'username': user[1],
+                'full_name': user[2],
+                'role': user[3],
+                'is_active': user[4]
+            }
+        return None
     
-    def save_file(self, file_path, category='general', related_table=None, related_id=None, user_id=None, description=None):
-        """حفظ ملف وتسجيله في قاعدة البيانات"""
+    def save_file(self, file_path, category='general', related_table=None, related_id=None, user_id=None, description=None,
+                  progress=None, cancel_event=None):
+        """حفظ ملف وتسجيله في قاعدة البيانات
+        
+        progress(copied_bytes, total_bytes) is called while the file is copied.
+        Setting cancel_event (a threading.Event) stops the copy, removes the
+        partial file and raises UploadCancelled.
+        """
         if not os.path.exists(file_path):
             raise FileNotFoundError(f"الملف غير موجود: {file_path}")
+        self._check_upload_size(category, os.path.getsize(file_path))
         
         # الحصول على معلومات الملف
         original_name = os.path.basename(file_path)
-        file_size = os.path.getsize(file_path)
         file_type = os.path.splitext(original_name)[1].lower()
         
-        # إنشاء hash للملف
-        file_hash = self.calculate_file_hash(file_path)
-        
-        # إنشاء اسم فريد للملف
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        stored_name = f"{timestamp}_{file_hash[:8]}_{original_name}"
-        
-        # تحديد المجلد الفرعي حسب الفئة
-        category_dir = os.path.join(self.files_dir, category)
-        if not os.path.exists(category_dir):
-            os.makedirs(category_dir)
-        
-        # المسار النهائي للملف
-        final_path = os.path.join(category_dir, stored_name)
+        # قراءة واحدة للملف: نسخه إلى المخزن مع حساب SHA-256 (عنوان المحتوى)
+        # و MD5 (للتوافق). الملف المكرر يشير إلى النسخة الموجودة
+        final_path, created, content_hash, file_hash, file_size = self._ingest_file(file_path, progress, cancel_event)
+        stored_name = content_hash
         
         try:
-            # نسخ الملف
-            shutil.copy2(file_path, final_path)
-            
             # تسجيل الملف في قاعدة البيانات
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                cursor.execute('''
-                    INSERT INTO uploaded_files 
-                    (original_name, stored_name, file_path, file_type, file_size, file_hash, 
-                     category, related_table, related_id, uploaded_by, description)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                ''', (original_name, stored_name, final_path, file_type, file_size, file_hash,
-                      category, related_table, related_id, user_id, description))
+            with self.write_connection() as conn:
+                if cancel_event is not None and cancel_event.is_set():
+                    raise UploadCancelled(f"تم إلغاء رفع الملف: {original_name}")
+                
+                # قد تكون النسخة حُذفت مع آخر مرجع لها قبل هذه المعاملة
+                if not os.path.exists(final_path):
+                    blob_path, recreated, recopied_hash, _, _ = self._ingest_file(file_path)
+                    if recopied_hash != content_hash:
+                        # The source changed since it was hashed: do not store it under the old address
+                        if recreated:
+                            self._discard_orphan_blob(recopied_hash, blob_path)
+                        raise ValueError(f"تغير الملف المصدر أثناء الرفع: {original_name}")
+                    created = created or recreated
                 
-                file_id = cursor.lastrowid
-                conn.commit()
+                file_id = self._insert_uploaded_file(conn, original_name, final_path, file_size, file_hash,
+                                                     content_hash, category, related_table, related_id,
+                                                     user_id, description)
                 
                 return {
                     'file_id': file_id,
@@ -320,18 +1620,448 @@ class DatabaseManager:
                     'stored_name': stored_name,
                     'file_path': final_path,
                     'file_size': file_size,
-                    'file_type': file_type
+                    'file_type': file_type,
+                    'content_hash': content_hash,
+                    'deduplicated': not created
                 }
                 
         except Exception as e:
-            # حذف الملف إذا فشل الحفظ في قاعدة البيانات
-            if os.path.exists(final_path):
-                os.remove(final_path)
+            # حذف النسخة إذا أُنشئت لهذا الرفع ولم يُسجل أي مرجع لها
+            if created:
+                self._discard_orphan_blob(content_hash, final_path)
             raise e
     
+    def _insert_uploaded_file(self, conn, original_name, file_path, file_size, file_hash, content_hash,
+                              category, related_table, related_id, user_id, description):
+        """Insert one uploaded_files row for stored content and index it for search; returns its id"""
+        cursor = conn.cursor()
+        cursor.execute('''
+            INSERT INTO uploaded_files 
+            (original_name, stored_name, file_path, file_type, file_size, file_hash, 
+             category, related_table, related_id, uploaded_by, description, content_hash)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (original_name, content_hash, file_path, os.path.splitext(original_name)[1].lower(), file_size,
+              file_hash, category, related_table, related_id, user_id, description, content_hash))
+        
+        file_id = cursor.lastrowid
+        self._index_document(conn, 'file', file_id, original_name, description or '')
+        return file_id
+    
+    def get_upload_size_limit(self, category):
+        """Largest file size in bytes accepted for a category"""
+        default = UPLOAD_SIZE_LIMITS.get(category, UPLOAD_SIZE_LIMITS['general'])
+        value = self.get_setting(f"upload_limit.{category}")
+        if value is None:
+            return default
+        try:
+            return int(value)
+        except ValueError:
+            print(f"Invalid upload limit for {category}: {value}")
+            return default
+    
+    def set_upload_size_limit(self, category, max_bytes, user_id=None):
+        """Override the upload size limit of one category"""
+        return self.set_setting(f"upload_limit.{category}", int(max_bytes), user_id)
+    
+    def _check_upload_size(self, category, file_size):
+        """Reject a file larger than its category allows"""
+        limit = self.get_upload_size_limit(category)
+        if file_size > limit:
+            raise ValueError(f"حجم الملف كبير جداً. الحد الأقصى لفئة {category} هو {limit // (1024 * 1024)} ميجابايت")
+    
+    def _submit_upload(self, func, *args, callback=None):
+        """Run func(*args) on the upload pool; callback receives the Future on the upload thread"""
+        with self._upload_pool_lock:
+            if self._upload_pool is None:
+                self._upload_pool = ThreadPoolExecutor(max_workers=self.upload_workers,
+                                                       thread_name_prefix="qb-upload")
+            future = self._upload_pool.submit(func, *args)
+        if callback:
+            future.add_done_callback(callback)
+        return future
+    
+    def save_file_async(self, file_path, category='general', related_table=None, related_id=None, user_id=None,
+                        description=None, progress=None, cancel_event=None, callback=None):
+        """Run save_file on the upload pool and return its Future
+        
+        Up to upload_workers files are copied at once. Files larger than
+        chunked_upload_threshold go through upload_file_chunked instead, so a
+        cancelled or interrupted copy can be resumed. progress and
+        cancel_event are passed through; callback receives the Future and
+        runs on the upload thread.
+        """
+        func = self.save_file
+        if os.path.exists(file_path) and os.path.getsize(file_path) > self.chunked_upload_threshold:
+            func = self.upload_file_chunked
+        return self._submit_upload(func, file_path, category, related_table, related_id, user_id, description,
+                                   progress, cancel_event, callback=callback)
+    
+    def start_upload_session(self, file_path, category='general', related_table=None, related_id=None,
+                             user_id=None, description=None, expected_hash=None):
+        """Open a resumable chunked upload for a file and return its session id
+        
+        expected_hash, when given, is the SHA-256 the finished copy must match.
+        """
+        if not os.path.exists(file_path):
+            raise FileNotFoundError(f"الملف غير موجود: {file_path}")
+        stat = os.stat(file_path)
+        self._check_upload_size(category, stat.st_size)
+        
+        session_id = uuid.uuid4().hex
+        temp_path = os.path.join(self.files_dir, "blobs", "incoming", f"session_{session_id}.partial")
+        with self.write_connection() as conn:
+            conn.execute('''
+                INSERT INTO upload_sessions
+                (id, source_path, original_name, file_size, source_mtime, category, related_table, related_id,
+                 uploaded_by, description, expected_hash, temp_path, chunk_size)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (session_id, os.path.abspath(file_path), os.path.basename(file_path), stat.st_size,
+                  stat.st_mtime_ns, category, related_table, related_id, user_id, description,
+                  expected_hash.lower() if expected_hash else None, temp_path, self.upload_chunk_size))
+        return session_id
+    
+    def upload_file_chunked(self, file_path, category='general', related_table=None, related_id=None,
+                            user_id=None, description=None, progress=None, cancel_event=None):
+        """Upload a file in resumable segments; returns the same dict as save_file plus session_id"""
+        session_id = self.start_upload_session(file_path, category, related_table, related_id, user_id, description)
+        return self.resume_upload_session(session_id, progress, cancel_event)
+    
+    def resume_upload_async(self, session_id, progress=None, cancel_event=None, callback=None):
+        """Run resume_upload_session on the upload pool and return its Future"""
+        return self._submit_upload(self.resume_upload_session, session_id, progress, cancel_event,
+                                   callback=callback)
+    
+    def resume_upload_session(self, session_id, progress=None, cancel_event=None):
+        """Copy the remaining segments of an upload session and register the file
+        
+        Each segment is fsynced before bytes_done is recorded, so after a crash
+        the copy restarts at the last recorded segment. A set cancel_event
+        pauses the session and raises UploadCancelled. The file is registered
+        only after the assembled copy hashes to the digest read from the
+        source (and to expected_hash, if one was given); a source that changed
+        since the session started fails the session.
+        """
+        with self.read_connection() as conn:
+            row = conn.execute('''
+                SELECT source_path, original_name, file_size, source_mtime, category, related_table, related_id,
+                       uploaded_by, description, expected_hash, temp_path, chunk_size, bytes_done, status
+                FROM upload_sessions WHERE id = ?
+            ''', (session_id,)).fetchone()
+        if not row:
+            raise ValueError(f"جلسة الرفع غير موجودة: {session_id}")
+        (source_path, original_name, file_size, source_mtime, category, related_table, related_id,
+         user_id, description, expected_hash, temp_path, chunk_size, bytes_done, status) = row
+        if status not in ('active', 'paused'):
+            raise ValueError(f"لا يمكن استئناف جلسة رفع حالتها {status}")
+        
+        def _source_changed():
+            if not os.path.exists(source_path):
+                return True
+            stat = os.stat(source_path)
+            return (stat.st_size, stat.st_mtime_ns) != (file_size, source_mtime)
+        
+        if _source_changed():
+            self._fail_upload_session(session_id, temp_path, "source changed")
+            raise ValueError(f"تغير الملف المصدر أو حُذف منذ بدء الرفع: {original_name}")
+        
+        os.makedirs(os.path.dirname(temp_path), exist_ok=True)
+        hash_sha256, hash_md5 = hashlib.sha256(), hashlib.md5()
+        buffer = bytearray(INGEST_BUFFER_SIZE)
+        view = memoryview(buffer)
+        with open(temp_path, "r+b" if os.path.exists(temp_path) else "w+b") as target:
+            # Bytes past the last recorded segment may be torn by a crash; copy them again
+            if os.fstat(target.fileno()).st_size < bytes_done:
+                bytes_done = 0
+            target.truncate(bytes_done)
+            
+            # hashlib state cannot be saved, so the copied prefix is hashed again from the temp file
+            done = 0
+            while done < bytes_done:
+                read = target.readinto(view[:min(INGEST_BUFFER_SIZE, bytes_done - done)])
+                hash_sha256.update(view[:read])
+                hash_md5.update(view[:read])
+                done += read
+            
+            with open(source_path, "rb") as source:
+                source.seek(done)
+                while done < file_size:
+                    segment_end = min(done + chunk_size, file_size)
+                    cancelled = False
+                    while done < segment_end:
+                        if cancel_event is not None and cancel_event.is_set():
+                            cancelled = True
+                            break
+                        read = source.readinto(view[:min(INGEST_BUFFER_SIZE, segment_end - done)])
+                        if not read:
+                            break
+                        hash_sha256.update(view[:read])
+                        hash_md5.update(view[:read])
+                        target.write(view[:read])
+                        done += read
+                        if progress:
+                            progress(done, file_size)
+                    target.flush()
+                    os.fsync(target.fileno())
+                    self._record_upload_progress(session_id, done, 'paused' if cancelled else 'active')
+                    if cancelled:
+                        raise UploadCancelled(f"تم إيقاف رفع الملف مؤقتاً ويمكن استئنافه: {original_name}")
+                    if done < segment_end:
+                        break
+        
+        content_hash = hash_sha256.hexdigest()
+        if done != file_size or _source_changed() or self._file_sha256(temp_path) != content_hash:
+            self._fail_upload_session(session_id, temp_path, "digest mismatch")
+            raise ValueError(f"فشل التحقق من الملف المرفوع: {original_name}")
+        if expected_hash and expected_hash != content_hash:
+            self._fail_upload_session(session_id, temp_path, "expected hash mismatch")
+            raise ValueError(f"بصمة الملف لا تطابق البصمة المتوقعة: {original_name}")
+        
+        blob_path = self._blob_path(content_hash)
+        created = False
+        try:
+            with self.write_connection() as conn:
+                # The content is placed inside the transaction so _release_blob cannot remove it meanwhile
+                if os.path.exists(blob_path):
+                    os.remove(temp_path)
+                else:
+                    os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+                    os.replace(temp_path, blob_path)
+                    _fsync_directory(os.path.dirname(blob_path))
+                    created = True
+                
+                file_id = self._insert_uploaded_file(conn, original_name, blob_path, file_size, hash_md5.hexdigest(),
+                                                     content_hash, category, related_table, related_id,
+                                                     user_id, description)
+                conn.execute('''
+                    UPDATE upload_sessions
+                    SET status = 'completed', bytes_done = ?, file_id = ?, updated_at = CURRENT_TIMESTAMP
+                    WHERE id = ?
+                ''', (file_size, file_id, session_id))
+        except Exception:
+            if created:
+                self._discard_orphan_blob(content_hash, blob_path)
+            raise
+        
+        return {
+            'file_id': file_id,
+            'original_name': original_name,
+            'stored_name': content_hash,
+            'file_path': blob_path,
+            'file_size': file_size,
+            'file_type': os.path.splitext(original_name)[1].lower(),
+            'content_hash': content_hash,
+            'deduplicated': not created,
+            'session_id': session_id
+        }
+    
+    def _file_sha256(self, path):
+        """SHA-256 of a file on disk, read in INGEST_BUFFER_SIZE blocks"""
+        hash_sha256 = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(INGEST_BUFFER_SIZE), b""):
+                hash_sha256.update(chunk)
+        return hash_sha256.hexdigest()
+    
+    def _record_upload_progress(self, session_id, bytes_done, status):
+        """Store how much of an upload session has reached the disk"""
+        with self.write_connection() as conn:
+            conn.execute('''
+                UPDATE upload_sessions SET bytes_done = ?, status = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?
+            ''', (bytes_done, status, session_id))
+    
+    def _fail_upload_session(self, session_id, temp_path, error, status='failed'):
+        """End an upload session that cannot complete and remove its partial copy"""
+        try:
+            with self.write_connection() as conn:
+                conn.execute('''
+                    UPDATE upload_sessions SET status = ?, error = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?
+                ''', (status, error, session_id))
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            return True
+        except Exception as e:
+            print(f"Error closing upload session {session_id}: {e}")
+            return False
+    
+    def cancel_upload_session(self, session_id):
+        """Abandon an unfinished upload session and delete its partial copy"""
+        with self.read_connection() as conn:
+            row = conn.execute('''
+                SELECT temp_path FROM upload_sessions WHERE id = ? AND status IN ('active', 'paused')
+            ''', (session_id,)).fetchone()
+        if not row:
+            return False
+        return self._fail_upload_session(session_id, row[0], None, status='cancelled')
+    
+    def list_upload_sessions(self, user_id=None):
+        """Unfinished (active or paused) upload sessions, newest first"""
+        try:
+            with self.read_connection() as conn:
+                rows = conn.execute('''
+                    SELECT id, original_name, source_path, file_size, bytes_done, category, status, updated_at
+                    FROM upload_sessions
+                    WHERE status IN ('active', 'paused') AND (? IS NULL OR uploaded_by = ?)
+                    ORDER BY updated_at DESC
+                ''', (user_id, user_id)).fetchall()
+        except Exception as e:
+            print(f"Error listing upload sessions: {e}")
+            return []
+        return [{
+            'id': row[0],
+            'original_name': row[1],
+            'source_path': row[2],
+            'file_size': row[3],
+            'bytes_done': row[4],
+            'category': row[5],
+            'status': row[6],
+            'updated_at': row[7]
+        } for row in rows]
+    
+    def _blob_path(self, content_hash):
+        """مسار نسخة المحتوى: uploaded_files/blobs/<أول حرفين>/<sha256>"""
+        return os.path.join(self.files_dir, "blobs", content_hash[:2], content_hash)
+    
+    def _ingest_file(self, source_path, progress=None, cancel_event=None):
+        """Copy a file into the content store in a single read
+        
+        The source is streamed into a temp file under blobs/incoming while
+        SHA-256 (the content key) and MD5 (the legacy file_hash) are computed.
+        The copy is fsynced and renamed onto its content path, or dropped when
+        that content is already stored. progress(copied, total) is called
+        after every buffer; a set cancel_event raises UploadCancelled.
+        Returns (blob_path, created, content_hash, md5, size).
+        """
+        incoming_dir = os.path.join(self.files_dir, "blobs", "incoming")
+        os.makedirs(incoming_dir, exist_ok=True)
+        hash_sha256, hash_md5, size = hashlib.sha256(), hashlib.md5(), 0
+        fd, temp_path = tempfile.mkstemp(suffix=".partial", dir=incoming_dir)
+        try:
+            buffer = bytearray(INGEST_BUFFER_SIZE)
+            view = memoryview(buffer)
+            with os.fdopen(fd, "wb") as target, open(source_path, "rb") as source:
+                total = os.fstat(source.fileno()).st_size
+                while True:
+                    if cancel_event is not None and cancel_event.is_set():
+                        raise UploadCancelled(f"تم إلغاء رفع الملف: {os.path.basename(source_path)}")
+                    read = source.readinto(buffer)
+                    if not read:
+                        break
+                    hash_sha256.update(view[:read])
+                    hash_md5.update(view[:read])
+                    target.write(view[:read])
+                    size += read
+                    if progress:
+                        progress(size, total)
+                target.flush()
+                os.fsync(target.fileno())
+            shutil.copystat(source_path, temp_path)
+            
+            content_hash = hash_sha256.hexdigest()
+            blob_path = self._blob_path(content_hash)
+            created = not os.path.exists(blob_path)
+            if created:
+                os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+                os.replace(temp_path, blob_path)
+                _fsync_directory(os.path.dirname(blob_path))
+            else:
+                os.remove(temp_path)
+            return blob_path, created, content_hash, hash_md5.hexdigest(), size
+        except Exception:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+    
+    def _release_blob(self, conn, content_hash):
+        """Delete a stored content file once no uploaded_files row references it
+        
+        The file is unlinked after the enclosing transaction commits, so a
+        rollback keeps both the row and the content.
+        """
+        row = conn.execute('SELECT blob_path, ref_count FROM file_blobs WHERE content_hash = ?',
+                           (content_hash,)).fetchone()
+        if row and row[1] <= 0:
+            conn.execute('DELETE FROM file_blobs WHERE content_hash = ?', (content_hash,))
+            
+            def _unlink(blob_path=row[0]):
+                # Still under the writer lock; skip content registered again in the same transaction
+                if conn.execute('SELECT 1 FROM file_blobs WHERE content_hash = ?', (content_hash,)).fetchone():
+                    return
+                if os.path.exists(blob_path):
+                    os.remove(blob_path)
+            
+            self._after_commit(_unlink)
+    
+    def _discard_orphan_blob(self, content_hash, blob_path):
+        """Remove a content file written for an upload whose registration failed"""
+        try:
+            with self.write_connection() as conn:
+                referenced = conn.execute('SELECT ref_count FROM file_blobs WHERE content_hash = ?',
+                                          (content_hash,)).fetchone()
+                if not referenced and os.path.exists(blob_path):
+                    os.remove(blob_path)
+        except Exception as e:
+            print(f"Warning: Could not remove unreferenced file {blob_path}: {e}")
+    
+    def migrate_files_to_blob_store(self, batch_size=100):
+        """Move files uploaded before migration 10 into the content-addressed store
+        
+        Files are copied into the store outside the writer and their rows
+        repointed in one transaction per batch; legacy copies are removed only
+        after that commit. Returns the number of moved rows.
+        """
+        def _move_batch(conn, ingested):
+            moved = set()
+            for row_id, path, content_hash, blob_path, _ in ingested:
+                current = conn.execute('SELECT file_path FROM uploaded_files WHERE id = ? AND content_hash IS NULL',
+                                       (row_id,)).fetchone()
+                if not current or current[0] != path:
+                    continue
+                if not os.path.exists(blob_path):
+                    self._ingest_file(path)
+                conn.execute('''
+                    UPDATE uploaded_files SET content_hash = ?, file_path = ?, stored_name = ? WHERE id = ?
+                ''', (content_hash, blob_path, content_hash, row_id))
+                moved.add(row_id)
+            return moved
+        
+        after_id, count = 0, 0
+        try:
+            while not self._stopping:
+                with self.read_connection() as conn:
+                    rows = conn.execute('''
+                        SELECT id, file_path FROM uploaded_files
+                        WHERE id > ? AND content_hash IS NULL
+                        ORDER BY id
+                        LIMIT ?
+                    ''', (after_id, batch_size)).fetchall()
+                if not rows:
+                    break
+                after_id = rows[-1][0]
+                ingested = []
+                for row_id, path in rows:
+                    if path and os.path.exists(path):
+                        blob_path, created, content_hash, _, _ = self._ingest_file(path)
+                        ingested.append((row_id, path, content_hash, blob_path, created))
+                moved = set()
+                try:
+                    moved = self.submit_write(_move_batch, ingested).result()
+                finally:
+                    # contents copied for rows that were not repointed have no reference
+                    for row_id, _, content_hash, blob_path, created in ingested:
+                        if created and row_id not in moved:
+                            self._discard_orphan_blob(content_hash, blob_path)
+                for row_id, path, _, _, _ in ingested:
+                    if row_id in moved:
+                        if os.path.exists(path):
+                            os.remove(path)
+                        count += 1
+        except Exception as e:
+            print(f"Error moving files to the content store: {e}")
+        return count
+    
     def get_file_info(self, file_id):
         """الحصول على معلومات ملف من قاعدة البيانات"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self.read_connection() as conn:
             cursor = conn.cursor()
             cursor.execute('''
                 SELECT id, original_name, stored_name, file_path, file_type, file_size,
@@ -357,7 +2087,7 @@ class DatabaseManager:
     
     def get_files_by_category(self, category):
         """الحصول على جميع الملفات في فئة معينة"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self.read_connection() as conn:
             cursor = conn.cursor()
             cursor.execute('''
                 SELECT id, original_name, stored_name, file_path, file_size, upload_date, description
@@ -379,6 +2109,54 @@ class DatabaseManager:
                 })
             return files
     
+    def list_files(self, category=None, related_table=None, related_id=None, uploaded_by=None, after=None, limit=100):
+        """One page of uploaded files, newest first, using keyset pagination
+        
+        Filters that are None are ignored. Pass the returned cursor as after
+        to get the next page; it is None once the last page has been read.
+        Returns (files, cursor).
+        """
+        conditions, params = [], []
+        for column, value in (('category', category), ('related_table', related_table),
+                              ('related_id', related_id), ('uploaded_by', uploaded_by)):
+            if value is not None:
+                conditions.append(f"{column} = ?")
+                params.append(value)
+        if after is not None:
+            # A row value comparison keeps the index range scan (an OR of the two cases does not)
+            conditions.append("(upload_date, id) < (?, ?)")
+            params.extend(after)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        
+        try:
+            with self.read_connection() as conn:
+                rows = conn.execute(f'''
+                    SELECT id, original_name, category, file_type, file_size, upload_date, description,
+                           related_table, related_id, uploaded_by
+                    FROM uploaded_files
+                    {where}
+                    ORDER BY upload_date DESC, id DESC
+                    LIMIT ?
+                ''', (*params, limit + 1)).fetchall()
+        except Exception as e:
+            print(f"Error listing files: {e}")
+            return [], None
+        
+        files = [{
+            'id': row[0],
+            'original_name': row[1],
+            'category': row[2],
+            'file_type': row[3],
+            'file_size': row[4],
+            'upload_date': row[5],
+            'description': row[6],
+            'related_table': row[7],
+            'related_id': row[8],
+            'uploaded_by': row[9]
+        } for row in rows[:limit]]
+        cursor = (files[-1]['upload_date'], files[-1]['id']) if len(rows) > limit else None
+        return files, cursor
+    
     def calculate_file_hash(self, file_path):
         """حساب hash للملف"""
         hash_md5 = hashlib.md5()
@@ -388,28 +2166,230 @@ class DatabaseManager:
         return hash_md5.hexdigest()
     
     def log_activity(self, user_id, action, table_name=None, record_id=None, old_values=None, new_values=None, details=None, **kwargs):
-        """تسجيل نشاط في سجل النشاطات"""
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            cursor.execute('''
-                INSERT INTO activity_log (user_id, action, table_name, record_id, old_values, new_values)
-                VALUES (?, ?, ?, ?, ?, ?)
-            ''', (user_id, action, table_name, record_id, 
-                  json.dumps(old_values, ensure_ascii=False) if old_values else None,
-                  json.dumps(new_values, ensure_ascii=False) if new_values else None))
-            conn.commit()
-    
-    def backup_database(self, backup_path=None):
-        """إنشاء نسخة احتياطية من قاعدة البيانات"""
+        """تسجيل نشاط في سجل النشاطات (يُجمع في دفعات ويُكتب في معاملة واحدة)
+        
+        Called from inside a write job, the entry is only logged once that
+        job commits, so rolled-back changes never reach the activity log.
+        """
+        entry = (user_id, action, table_name, record_id,
+                 json.dumps(old_values, ensure_ascii=False) if old_values else None,
+                 json.dumps(new_values, ensure_ascii=False) if new_values else None,
+                 datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S"))  # same format as CURRENT_TIMESTAMP
+        
+        if self._write_owner == threading.get_ident():
+            self._after_commit(lambda: self._buffer_activity(entry))
+        else:
+            self._buffer_activity(entry)
+    
+    def _buffer_activity(self, entry):
+        """Add one activity_log row to the group-commit buffer and its spill file"""
+        with self._audit_lock:
+            if self._audit_spill is None:
+                self._audit_spill_seq += 1
+                self._audit_spill = open(self._audit_spill_file(self._audit_token, self._audit_spill_seq),
+                                         'a', encoding='utf-8')
+            # Handed to the OS so a crashed process leaves it behind; a failed flush fsyncs the batch
+            self._audit_spill.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            self._audit_spill.flush()
+            self._audit_buffer.append(entry)
+            
+            flush_now = len(self._audit_buffer) >= self.audit_flush_size
+            if not flush_now and self._audit_timer is None:
+                self._audit_timer = threading.Timer(self.audit_flush_interval, self.flush_activity_log)
+                self._audit_timer.daemon = True
+                self._audit_timer.start()
+        
+        if flush_now:
+            self.flush_activity_log()
+    
+    def _audit_spill_file(self, token, seq):
+        """Path of one batch spill file of the process identified by token"""
+        return f"{self.audit_spill_path}.{token}.{seq}"
+    
+    def flush_activity_log(self, wait=False):
+        """Write all buffered activity_log rows with one executemany in one transaction"""
+        with self._audit_lock:
+            if self._audit_timer is not None:
+                self._audit_timer.cancel()
+                self._audit_timer = None
+            if not self._audit_buffer:
+                return None
+            entries, self._audit_buffer = self._audit_buffer, []
+            
+            # Entries logged during the flush go to the next batch file
+            self._audit_spill.close()
+            self._audit_spill = None
+            pending_path = self._audit_spill_file(self._audit_token, self._audit_spill_seq)
+        
+        def _remove_spill():
+            if os.path.exists(pending_path):
+                os.remove(pending_path)
+        
+        def _insert(conn):
+            self._insert_activity_rows(conn, entries)
+            # A flush run inline inside another write job commits with that job
+            self._after_commit(_remove_spill)
+            return len(entries)
+        
+        def _done(future):
+            if future.exception():
+                # The pending spill file is kept and replayed on next start
+                print(f"Warning: Could not log activity: {future.exception()}")
+                try:
+                    with open(pending_path, 'ab') as f:
+                        os.fsync(f.fileno())
+                except OSError as e:
+                    print(f"Warning: Could not sync activity log spill: {e}")
+        
+        future = self.submit_write(_insert, callback=_done)
+        if wait:
+            future.exception()
+        return future
+    
+    def _insert_activity_rows(self, conn, entries):
+        """Insert activity_log rows in bulk"""
+        conn.executemany('''
+            INSERT INTO activity_log (user_id, action, table_name, record_id, old_values, new_values, timestamp)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', entries)
+    
+    def _recover_audit_spill(self):
+        """Take this process's spill lock and replay spill files left by processes that have exited"""
+        self._audit_owner_lock = open(f"{self.audit_spill_path}.{self._audit_token}.lock", 'a+')
+        _try_lock_file(self._audit_owner_lock)
+        
+        prefix = glob.escape(self.audit_spill_path)
+        for lock_path in sorted(glob.glob(prefix + ".*.lock")):
+            token = os.path.basename(lock_path)[len(os.path.basename(self.audit_spill_path)) + 1:-len(".lock")]
+            if token == self._audit_token:
+                continue
+            lock_file = open(lock_path, 'a+')
+            try:
+                if not _try_lock_file(lock_file):
+                    continue  # that client is still running and flushes its own spill
+                spill_files = sorted((path for path in glob.glob(glob.escape(f"{self.audit_spill_path}.{token}") + ".*")
+                                      if not path.endswith(".lock")),
+                                     key=lambda path: int(path.rsplit(".", 1)[1]))
+                entries = []
+                for path in spill_files:
+                    with open(path, encoding='utf-8') as f:
+                        for line in f:
+                            try:
+                                entries.append(tuple(json.loads(line)))
+                            except json.JSONDecodeError:
+                                pass  # torn last line from an interrupted write
+                
+                try:
+                    if entries:
+                        with self.write_connection() as conn:
+                            self._insert_activity_rows(conn, entries)
+                        print(f"تم استرجاع {len(entries)} من سجلات النشاط غير المحفوظة")
+                    for path in spill_files:
+                        os.remove(path)
+                except Exception as e:
+                    print(f"Warning: Could not recover activity log spill: {e}")
+                    continue
+            finally:
+                lock_file.close()
+            try:
+                os.remove(lock_path)
+            except OSError:
+                pass  # another client is recovering the same spill
+    
+    def _release_audit_spill(self):
+        """Drop this process's spill lock; the lock file stays while unflushed spill files remain"""
+        if self._audit_owner_lock is None:
+            return
+        self._audit_owner_lock.close()
+        self._audit_owner_lock = None
+        if not glob.glob(glob.escape(f"{self.audit_spill_path}.{self._audit_token}") + ".[0-9]*"):
+            try:
+                os.remove(f"{self.audit_spill_path}.{self._audit_token}.lock")
+            except OSError:
+                pass
+    
+    def backup_database(self, backup_path=None, compact=False, verify=True, progress=None, callback=None,
+                        pages_per_step=256):
+        """إنشاء نسخة احتياطية من قاعدة البيانات (آمنة أثناء العمل مع WAL)
+        
+        The copy is taken with the SQLite backup API in steps of
+        pages_per_step pages, or with VACUUM INTO when compact is True, written
+        to a temporary file, checked with PRAGMA integrity_check and then
+        renamed into place. progress(done_pages, total_pages) is called after
+        each step. Without a callback this returns the backup path; with one
+        it runs on a background thread and returns a Future whose result is
+        the path (callback receives the Future through post_callback).
+        """
         if not backup_path:
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
             backup_path = f"backup_qb_academy_{timestamp}.db"
         
+        def _backup():
+            try:
+                return self._write_backup(backup_path, compact, verify, progress, pages_per_step)
+            except Exception as e:
+                raise Exception(f"فشل في إنشاء النسخة الاحتياطية: {str(e)}")
+        
+        if not callback:
+            return _backup()
+        return self._submit_backup(_backup, callback)
+    
+    def _submit_backup(self, func, callback):
+        """Run func() on a background backup thread; callback receives its Future through post_callback"""
+        future = Future()
+        future.add_done_callback(lambda done: self.post_callback(callback, done))
+        
+        def _run():
+            try:
+                future.set_result(func())
+            except Exception as e:
+                future.set_exception(e)
+        
+        threading.Thread(target=_run, name="qb-backup", daemon=True).start()
+        return future
+    
+    def _write_backup(self, backup_path, compact, verify, progress, pages_per_step):
+        """Copy the live database to backup_path through a private connection"""
+        partial_path = f"{backup_path}.partial"
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+        
+        # A separate connection: the pooled writer stays free while pages are copied
+        source = sqlite3.connect(self.db_path, timeout=30.0)
         try:
-            shutil.copy2(self.db_path, backup_path)
-            return backup_path
-        except Exception as e:
-            raise Exception(f"فشل في إنشاء النسخة الاحتياطية: {str(e)}")
+            if compact:
+                source.execute('VACUUM INTO ?', (partial_path,))
+                if progress:
+                    total = os.path.getsize(partial_path) // source.execute('PRAGMA page_size').fetchone()[0]
+                    progress(total, total)
+            else:
+                target = sqlite3.connect(partial_path)
+                try:
+                    step = (lambda status, remaining, total: progress(total - remaining, total)) if progress else None
+                    source.backup(target, pages=pages_per_step, progress=step)
+                    # A standalone file: no -wal/-shm sidecars next to the backup
+                    target.execute('PRAGMA journal_mode=DELETE')
+                finally:
+                    target.close()
+        except Exception:
+            if os.path.exists(partial_path):
+                os.remove(partial_path)
+            raise
+        finally:
+            source.close()
+        
+        if verify:
+            check = sqlite3.connect(partial_path)
+            try:
+                problems = [row[0] for row in check.execute('PRAGMA integrity_check')]
+            finally:
+                check.close()
+            if problems != ['ok']:
+                os.remove(partial_path)
+                raise sqlite3.DatabaseError(f"integrity_check failed: {'; '.join(problems[:5])}")
+        
+        os.replace(partial_path, backup_path)
+        return backup_path
     
     def delete_file(self, file_id):
         """حذف ملف من النظام وقاعدة البيانات"""
@@ -418,15 +2398,18 @@ class DatabaseManager:
             return False
         
         try:
-            # حذف الملف من النظام
-            if os.path.exists(file_info['file_path']):
-                os.remove(file_info['file_path'])
-            
             # حذف السجل من قاعدة البيانات
-            with sqlite3.connect(self.db_path) as conn:
+            with self.write_connection() as conn:
                 cursor = conn.cursor()
+                row = cursor.execute("SELECT content_hash FROM uploaded_files WHERE id = ?", (file_id,)).fetchone()
                 cursor.execute("DELETE FROM uploaded_files WHERE id = ?", (file_id,))
-                conn.commit()
+                self._unindex_document(conn, 'file', file_id)
+                
+                # حذف الملف من النظام بعد نجاح المعاملة: المحتوى المشترك يُحذف مع آخر مرجع فقط
+                if row and row[0]:
+                    self._release_blob(conn, row[0])
+                elif os.path.exists(file_info['file_path']):
+                    self._after_commit(lambda path=file_info['file_path']: os.remove(path))
             
             return True
         except Exception as e:
@@ -435,172 +2418,480 @@ class DatabaseManager:
     
     def get_database_stats(self):
         """إحصائيات قاعدة البيانات"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self.read_connection() as conn:
             cursor = conn.cursor()
             
-            stats = {}
-            
-            # عدد المستخدمين
-            cursor.execute("SELECT COUNT(*) FROM users WHERE is_active = 1")
-            stats['active_users'] = cursor.fetchone()[0]
+            # العدادات (المستخدمون النشطون، الإجراءات، النماذج، الملفات وحجمها، الشهادات)
+            # محفوظة في صف واحد تحدّثه المشغلات (triggers)
+            cursor.execute(f"SELECT {', '.join(DB_STATS_COUNTERS)} FROM db_stats WHERE id = 1")
+            row = cursor.fetchone()
+            stats = dict(zip(DB_STATS_COUNTERS, row)) if row else self.recompute_stats()
             
-            # عدد الإجراءات
-            cursor.execute("SELECT COUNT(*) FROM procedures")
-            stats['procedures'] = cursor.fetchone()[0]
+            # ذاكرة التخزين المؤقت للنماذج
+            stats['payload_cache'] = self.payload_cache.stats()
             
-            # عدد النماذج
-            cursor.execute("SELECT COUNT(*) FROM forms")
-            stats['forms'] = cursor.fetchone()[0]
-            
-            # عدد الملفات المرفوعة
-            cursor.execute("SELECT COUNT(*) FROM uploaded_files")
-            stats['uploaded_files'] = cursor.fetchone()[0]
-            
-            # حجم الملفات الإجمالي
-            cursor.execute("SELECT SUM(file_size) FROM uploaded_files")
-            total_size = cursor.fetchone()[0]
-            stats['total_file_size'] = total_size if total_size else 0
-            
-            # عدد الشهادات
-            cursor.execute("SELECT COUNT(*) FROM certificates")
-            stats['certificates'] = cursor.fetchone()[0]
+            # إعدادات الأداء الفعلية على هذا الاتصال
+            pragmas = {'journal_mode': cursor.execute('PRAGMA journal_mode').fetchone()[0]}
+            for name in self._pragmas:
+                pragmas[name] = cursor.execute(f'PRAGMA {name}').fetchone()[0]
+            stats['performance_profile'] = {'name': self.performance_profile, 'pragmas': pragmas}
             
             return stats
     
+    def recompute_stats(self):
+        """إعادة حساب جدول db_stats من الجداول مباشرة (مسار الإصلاح)"""
+        def _recompute(conn):
+            self._recompute_stats(conn)
+            row = conn.execute(f"SELECT {', '.join(DB_STATS_COUNTERS)} FROM db_stats WHERE id = 1").fetchone()
+            return dict(zip(DB_STATS_COUNTERS, row))
+        
+        return self._finish_write(self.submit_write(_recompute), None, "Error recomputing statistics") or {}
+    
+    def insert_record(self, table, values, callback=None):
+        """Insert one row ({column: value}) into table on the writer thread
+
+        Returns the new row id, or False on error. With a callback, returns
+        at once and callback(row id or False) is delivered via post_callback.
+        """
+        names = [table, *values]
+        if not all(re.fullmatch(r'[A-Za-z_][A-Za-z0-9_]*', name) for name in names):
+            raise ValueError(f"Invalid table or column name in {names}")
+
+        def _insert(conn):
+            return conn.execute(f'''
+                INSERT INTO {table} ({', '.join(values)}) VALUES ({', '.join('?' * len(values))})
+            ''', tuple(values.values())).lastrowid
+
+        return self._finish_write(self.submit_write(_insert), callback, f"Error inserting into {table}")
+
+    def get_setting(self, key, default=None):
+        """Read a value from system_settings"""
+        try:
+            with self.read_connection() as conn:
+                row = conn.execute('SELECT value FROM system_settings WHERE key = ?', (key,)).fetchone()
+                return row[0] if row else default
+        except Exception as e:
+            print(f"Error reading setting {key}: {e}")
+            return default
+    
+    def set_setting(self, key, value, user_id=None):
+        """Store a value in system_settings; performance settings take effect immediately"""
+        def _set(conn):
+            conn.execute('''
+                INSERT INTO system_settings (key, value, updated_at, updated_by)
+                VALUES (?, ?, CURRENT_TIMESTAMP, ?)
+                ON CONFLICT(key) DO UPDATE SET
+                    value = excluded.value, updated_at = excluded.updated_at, updated_by = excluded.updated_by
+            ''', (key, None if value is None else str(value), user_id))
+            self._log_activity_async(user_id, f"تعديل إعداد النظام {key}", "system_settings", None)
+            return True
+        
+        if not self._finish_write(self.submit_write(_set), None, f"Error saving setting {key}"):
+            return False
+        if key == 'performance_profile' or key.startswith('pragma.'):
+            return self.load_performance_profile()
+        return True
+    
+    def load_performance_profile(self):
+        """Read the performance profile from system_settings and re-apply it to pooled connections"""
+        try:
+            with self.read_connection() as conn:
+                settings = dict(conn.execute('''
+                    SELECT key, value FROM system_settings
+                    WHERE key = 'performance_profile' OR key LIKE 'pragma.%'
+                ''').fetchall())
+        except Exception as e:
+            print(f"Error loading performance profile: {e}")
+            return False
+        
+        name = settings.pop('performance_profile', None) or DEFAULT_PERFORMANCE_PROFILE
+        if name not in PERFORMANCE_PROFILES:
+            print(f"Unknown performance profile {name}, using {DEFAULT_PERFORMANCE_PROFILE}")
+            name = DEFAULT_PERFORMANCE_PROFILE
+        pragmas = dict(PERFORMANCE_PROFILES[name])
+        for key, value in settings.items():
+            pragma = key[len('pragma.'):]
+            if value is None:
+                continue
+            if pragma not in pragmas or not PRAGMA_VALUE_PATTERN.match(value):
+                print(f"Ignoring invalid setting {key} = {value}")
+                continue
+            pragmas[pragma] = value
+        
+        self.performance_profile = name
+        self._pragmas = pragmas
+        self._pragma_generation += 1
+        return True
+    
     def create_forms_table(self):
-        """Ensure forms table exists - this method ensures the table structure is correct"""
+        """Ensure forms table exists - the schema is brought up to date by the migration runner"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                
-                # Check if table exists with correct structure
-                cursor.execute('''
-                    SELECT sql FROM sqlite_master 
-                    WHERE type='table' AND name='form_data'
-                ''')
-                result = cursor.fetchone()
-                
-                if result and 'form_name' not in result[0]:
-                    # Drop old table with wrong structure and recreate
-                    cursor.execute('DROP TABLE IF EXISTS form_data')
-                    
-                    cursor.execute('''
-                        CREATE TABLE form_data (
-                            id INTEGER PRIMARY KEY AUTOINCREMENT,
-                            form_name TEXT NOT NULL,
-                            form_data TEXT NOT NULL,
-                            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                            created_by INTEGER,
-                            FOREIGN KEY (created_by) REFERENCES users (id)
-                        )
-                    ''')
-                    
-                    # Create index for faster searches
-                    cursor.execute('''
-                        CREATE INDEX IF NOT EXISTS idx_form_name ON form_data(form_name)
-                    ''')
-                
-                conn.commit()
-                print("Forms table structure verified/updated successfully")
-                
+            self.migrate_schema()
+            print("Forms table structure verified/updated successfully")
+            
         except Exception as e:
             print(f"Error creating forms table: {e}")
 
-    def save_form_data(self, form_name=None, data=None, user_id=None):
-        """Save form data to database"""
+    @staticmethod
+    def extract_form_code(form_name):
+        """Return the QF code in a form name (the name itself when it has none)"""
+        match = FORM_CODE_PATTERN.search(form_name or '')
+        return match.group(0) if match else form_name
+
+    def split_form_name(self, stored_name):
+        """Split a stored form_name into (form_code, instance_key)"""
+        match = INSTANCE_SUFFIX_PATTERN.match(stored_name or '')
+        if match:
+            return self.extract_form_code(match.group(1)), match.group(2)
+        return self.extract_form_code(stored_name), None
+
+    def _add_missing_columns(self, conn, table, columns):
+        """Add columns that an older database file does not have yet"""
+        existing = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+        for name, declaration in columns:
+            if name not in existing:
+                conn.execute(f"ALTER TABLE {table} ADD COLUMN {name} {declaration}")
+
+    def _upgrade_form_data_table(self, conn):
+        """Migration 2: derived form_data columns, their indexes and change tracking"""
+        self._add_missing_columns(conn, 'form_data', [
+            ('form_code', 'TEXT'),
+            ('instance_key', 'TEXT'),
+            ('record_count', 'INTEGER'),
+            ('payload_bytes', 'INTEGER'),
+            ('payload_hash', 'TEXT'),
+            ('change_seq', 'INTEGER'),
+        ])
+        
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_form_data_code_created ON form_data(form_code, created_at DESC)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_form_data_code_updated ON form_data(form_code, updated_at)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_form_data_created_by ON form_data(created_by)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_form_data_change_seq ON form_data(change_seq)")
+        
+        # Change tracking: every insert/update/delete takes the next value of a
+        # single counter, so readers can pull only what changed since a watermark
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS change_sequence (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                value INTEGER NOT NULL
+            )
+        ''')
+        conn.execute("INSERT OR IGNORE INTO change_sequence (id, value) VALUES (1, 0)")
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS form_data_deletions (
+                change_seq INTEGER PRIMARY KEY,
+                form_name TEXT NOT NULL
+            )
+        ''')
+        for trigger in (
+            '''CREATE TRIGGER IF NOT EXISTS trg_form_data_insert_seq AFTER INSERT ON form_data
+            BEGIN
+                UPDATE change_sequence SET value = value + 1 WHERE id = 1;
+                UPDATE form_data SET change_seq = (SELECT value FROM change_sequence WHERE id = 1)
+                WHERE id = NEW.id;
+            END''',
+            '''CREATE TRIGGER IF NOT EXISTS trg_form_data_update_seq AFTER UPDATE OF form_name, form_data ON form_data
+            BEGIN
+                UPDATE change_sequence SET value = value + 1 WHERE id = 1;
+                INSERT INTO form_data_deletions (change_seq, form_name)
+                SELECT value, OLD.form_name FROM change_sequence
+                WHERE id = 1 AND OLD.form_name IS NOT NEW.form_name;
+                UPDATE change_sequence SET value = value + 1 WHERE id = 1 AND OLD.form_name IS NOT NEW.form_name;
+                UPDATE form_data SET change_seq = (SELECT value FROM change_sequence WHERE id = 1)
+                WHERE id = NEW.id;
+            END''',
+            '''CREATE TRIGGER IF NOT EXISTS trg_form_data_delete_seq AFTER DELETE ON form_data
+            BEGIN
+                UPDATE change_sequence SET value = value + 1 WHERE id = 1;
+                INSERT INTO form_data_deletions (change_seq, form_name)
+                SELECT value, OLD.form_name FROM change_sequence WHERE id = 1;
+            END''',
+        ):
+            conn.execute(trigger)
+
+    def backfill_form_data_columns(self, batch_size=500):
+        """Fill form_code/instance_key and payload metadata of rows written before migration 2
+        
+        Runs in id-ordered batches, each in its own writer transaction, and
+        returns the number of updated rows.
+        """
+        def _backfill_batch(conn, after_id):
+            rows = conn.execute('''
+                SELECT id, form_name, form_code, form_data FROM form_data
+                WHERE id > ? AND (form_code IS NULL OR payload_hash IS NULL)
+                ORDER BY id
+                LIMIT ?
+            ''', (after_id, batch_size)).fetchall()
+            with self._change_tracking_paused(conn):
+                for row_id, form_name, form_code, payload in rows:
+                    if form_code is None:
+                        conn.execute("UPDATE form_data SET form_code = ?, instance_key = ? WHERE id = ?",
+                                     (*self.split_form_name(form_name), row_id))
+                    stored, metadata = self._encode_payload(self._decode_payload(payload), form_name)
+                    conn.execute('''
+                        UPDATE form_data SET form_data = ?, record_count = ?, payload_bytes = ?, payload_hash = ?
+                        WHERE id = ?
+                    ''', (stored, *metadata, row_id))
+            self._invalidate_payloads(row_ids=[row[0] for row in rows])
+            return (rows[-1][0] if rows else None), len(rows)
+        
+        after_id, updated = 0, 0
         try:
-            import json
-            import time
-            
-            # Convert data to JSON string
-            if isinstance(data, (list, dict)):
-                data_json = json.dumps(data, ensure_ascii=False, indent=2)
-            else:
-                data_json = str(data)
-            
-            # Small delay to avoid database lock issues
-            time.sleep(0.1)
-            
-            conn = None
-            try:
-                conn = sqlite3.connect(self.db_path, timeout=30.0)
-                conn.execute('PRAGMA journal_mode=WAL')  # Use WAL mode for better concurrency
-                cursor = conn.cursor()
-                
-                # Check if form already exists
-                cursor.execute('SELECT id FROM form_data WHERE form_name = ?', (form_name,))
-                existing = cursor.fetchone()
-                
-                if existing:
-                    # Update existing form
-                    cursor.execute('''
-                        UPDATE form_data 
-                        SET form_data = ?, updated_at = CURRENT_TIMESTAMP 
-                        WHERE form_name = ?
-                    ''', (data_json, form_name))
-                    record_id = existing[0]
-                    action = "تحديث بيانات النموذج"
-                    
-                else:
-                    # Insert new form
-                    cursor.execute('''
-                        INSERT INTO form_data (form_name, form_data, created_by)
-                        VALUES (?, ?, ?)
-                    ''', (form_name, data_json, user_id))
-                    record_id = cursor.lastrowid
-                    action = "إضافة بيانات نموذج جديد"
-                
-                conn.commit()
-                
-                # Log activity in a separate connection to avoid locks
-                self._log_activity_async(user_id, action, "form_data", record_id)
-                
-                return True
-                
-            finally:
-                if conn:
-                    conn.close()
-                
+            while after_id is not None and not self._stopping:
+                after_id, count = self.submit_write(_backfill_batch, after_id).result()
+                updated += count
         except Exception as e:
-            print(f"Error saving form data: {e}")
+            print(f"Error backfilling form_data columns: {e}")
+        return updated
+
+    def _run_background_upgrades(self):
+        """Chunked data backfills that follow schema migrations, off the UI thread
+        
+        Stops between steps (and the batched steps between batches) once
+        close() has started.
+        """
+        for step in (self.backfill_form_data_columns, self.migrate_payload_encoding,
+                     self._backfill_search_index, self.migrate_files_to_blob_store):
+            if self._stopping:
+                return
+            step()
+
+    def _encode_payload(self, data, form_name=None):
+        """Encode a payload for storage
+        
+        Returns (stored_value, (record_count, payload_bytes, payload_hash)).
+        The hash is taken over the compact JSON text, so it does not depend on
+        whether the row ended up compressed. Forms with indexed fields stay
+        plain JSON text.
+        """
+        if isinstance(data, (list, dict)):
+            data_json = json.dumps(data, ensure_ascii=False, separators=(',', ':'))
+        else:
+            data_json = str(data)
+        encoded = data_json.encode('utf-8')
+        
+        stored = data_json
+        indexed = form_name is not None and self.extract_form_code(form_name) in self.form_field_indexes
+        if len(encoded) >= self.payload_compress_threshold and not indexed:
+            compressed = bytes([PAYLOAD_CODEC_ZLIB]) + zlib.compress(encoded, 6)
+            if len(compressed) < len(encoded):
+                stored = compressed
+        
+        stored_size = len(stored) if isinstance(stored, bytes) else len(encoded)
+        record_count = len(data) if isinstance(data, list) else 1
+        return stored, (record_count, stored_size, hashlib.sha256(encoded).hexdigest())
+
+    @staticmethod
+    def _payload_text(stored):
+        """Return the JSON text of a stored form_data payload"""
+        if isinstance(stored, (bytes, memoryview)):
+            stored = bytes(stored)
+            if stored[:1] == bytes([PAYLOAD_CODEC_ZLIB]):
+                stored = zlib.decompress(stored[1:])
+            stored = stored.decode('utf-8')
+        return stored
+
+    @staticmethod
+    def _decode_payload(stored):
+        """Decode a stored form_data payload (plain strings are returned as-is)"""
+        stored = DatabaseManager._payload_text(stored)
+        try:
+            return json.loads(stored)
+        except (json.JSONDecodeError, TypeError):
+            return stored
+
+    def _invalidate_payloads(self, row_ids=(), form_names=()):
+        """Drop cached payloads, deferred to commit when called inside a write transaction"""
+        if self._write_owner == threading.get_ident():
+            self._pending_invalidations.append((tuple(row_ids), tuple(form_names)))
+        else:
+            self.payload_cache.invalidate(row_ids, form_names)
+
+    def _cache_form_row(self, conn, row, generation):
+        """Decode a (id, form_name, form_data, created_at, updated_at, created_by) row and cache it"""
+        form_id, form_name, stored, created_at, updated_at, created_by = row
+        text = self._payload_text(stored)
+        data = self._decode_payload(text)
+        if data == ROW_STORAGE_MARKER:
+            data = self._load_form_rows(conn, form_name)
+            text = json.dumps(data, ensure_ascii=False, separators=(',', ':'))
+        decoded = {
+            'id': form_id,
+            'form_name': form_name,
+            'data': data,
+            'created_at': created_at,
+            'updated_at': updated_at,
+            'created_by': created_by
+        }
+        self.payload_cache.put(decoded, len(text), generation)
+        return dict(decoded, data=_copy_payload(decoded['data']))
+
+    def migrate_payload_encoding(self, batch_size=500):
+        """Rewrite legacy pretty-printed or oversized text payloads with the current codec
+        
+        Runs in id-ordered batches, each in its own writer transaction, and
+        returns the number of rewritten rows.
+        """
+        def _migrate_batch(conn, after_id):
+            rows = conn.execute('''
+                SELECT id, form_data, form_name FROM form_data
+                WHERE id > ? AND typeof(form_data) = 'text'
+                  AND (instr(form_data, char(10)) > 0 OR length(CAST(form_data AS BLOB)) >= ?)
+                ORDER BY id
+                LIMIT ?
+            ''', (after_id, self.payload_compress_threshold, batch_size)).fetchall()
+            updates = []
+            for row_id, payload, form_name in rows:
+                stored, metadata = self._encode_payload(self._decode_payload(payload), form_name)
+                if stored != payload:
+                    updates.append((stored, *metadata, row_id))
+            with self._change_tracking_paused(conn):
+                conn.executemany('''
+                    UPDATE form_data SET form_data = ?, record_count = ?, payload_bytes = ?, payload_hash = ?
+                    WHERE id = ?
+                ''', updates)
+            self._invalidate_payloads(row_ids=[update[-1] for update in updates])
+            return (rows[-1][0] if rows else None), len(updates)
+        
+        after_id, rewritten = 0, 0
+        try:
+            while after_id is not None and not self._stopping:
+                after_id, count = self.submit_write(_migrate_batch, after_id).result()
+                rewritten += count
+        except Exception as e:
+            print(f"Error migrating form payloads: {e}")
+        return rewritten
+
+    def list_forms_summary(self):
+        """List stored forms with their metadata columns only (payloads are not read)"""
+        try:
+            with self.read_connection() as conn:
+                cursor = conn.execute('''
+                    SELECT id, form_name, form_code, instance_key, record_count,
+                           payload_bytes, payload_hash, created_at, updated_at, created_by
+                    FROM form_data
+                    ORDER BY form_name
+                ''')
+                columns = [column[0] for column in cursor.description]
+                return [dict(zip(columns, row)) for row in cursor]
+        except Exception as e:
+            print(f"Error listing forms summary: {e}")
+            return []
+
+    def save_form_data(self, form_name=None, data=None, user_id=None, callback=None):
+        """Save form data to database (queued on the writer thread)
+        
+        Without a callback this waits for the commit and returns True/False.
+        With a callback it returns a Future immediately and callback(success)
+        is delivered through post_callback once the save is committed.
+        """
+        return self._finish_write(self._submit_form_write(form_name, data, user_id, True),
+                                  callback, "Error saving form data")
+
+    def _submit_form_write(self, form_name, data, user_id, insert_missing):
+        """Encode a payload on the calling thread and queue its _write_form_data job
+        
+        A payload that cannot be encoded yields a failed Future, so it is
+        reported like any other write error.
+        """
+        try:
+            stored, metadata = self._encode_payload(data, form_name)
+            search_text = _payload_search_text(data)
+        except (TypeError, ValueError) as e:
+            future = Future()
+            future.set_exception(e)
+            return future
+        return self.submit_write(self._write_form_data, form_name, stored, metadata, user_id, insert_missing,
+                                 search_text)
+
+    def _write_form_data(self, conn, form_name, stored, metadata, user_id, insert_missing, search_text=''):
+        """Writer job: insert or update a form_data row, its search entry and its log in one transaction"""
+        cursor = conn.cursor()
+        
+        # Check if form already exists
+        cursor.execute('SELECT id, form_data FROM form_data WHERE form_name = ?', (form_name,))
+        existing = cursor.fetchone()
+        old_data = self._decode_payload(existing[1]) if existing else None
+        row_stored = old_data == ROW_STORAGE_MARKER
+        old_content = self._expand_payload(conn, form_name, old_data) if existing else None
+        if existing or insert_missing:
+            self._begin_revision(conn, form_name)
+        new_content = self._decode_payload(stored)
+        
+        if row_stored and isinstance(new_content, list):
+            # A row-stored table keeps its rows: only rows that differ at their position are written
+            record_id = existing[0]
+            row_ids = [row_id for row_id, _ in self._form_row_items(conn, form_name)]
+            self._sync_form_rows(conn, record_id, form_name, [
+                (row_ids[position] if position < len(row_ids) else None, values,
+                 json.dumps(values, ensure_ascii=False, separators=(',', ':')))
+                for position, values in enumerate(new_content)], user_id)
+            self._record_revision(conn, form_name, user_id, _json_diff(old_content, new_content),
+                                  lambda: new_content)
+            self._log_activity_async(user_id, "تحديث بيانات النموذج", "form_data", record_id)
+            return True
+        
+        if existing:
+            # Update existing form
+            cursor.execute('''
+                UPDATE form_data 
+                SET form_data = ?, updated_at = CURRENT_TIMESTAMP,
+                    record_count = ?, payload_bytes = ?, payload_hash = ?
+                WHERE form_name = ?
+            ''', (stored, *metadata, form_name))
+            record_id = existing[0]
+            action = "تحديث بيانات النموذج"
+            
+        elif insert_missing:
+            # Insert new form
+            cursor.execute('''
+                INSERT INTO form_data (form_name, form_data, created_by, form_code, instance_key,
+                                       record_count, payload_bytes, payload_hash)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (form_name, stored, user_id, *self.split_form_name(form_name), *metadata))
+            record_id = cursor.lastrowid
+            action = "إضافة بيانات نموذج جديد"
+            
+        else:
+            print(f"Form {form_name} not found for update")
             return False
+        
+        self._invalidate_payloads(row_ids=[record_id], form_names=[form_name])
+        if row_stored:
+            self._drop_form_rows(conn, form_name)  # no longer a table: back to one payload
+        self._index_document(conn, 'form', record_id, form_name, search_text)
+        self._record_revision(conn, form_name, user_id,
+                              _json_diff(old_content, new_content) if existing else None,
+                              lambda: new_content)
+        self._log_activity_async(user_id, action, "form_data", record_id)
+        return True
 
     def _log_activity_async(self, user_id, action, table_name, record_id):
-        """Log activity in a separate connection to avoid locks"""
+        """Log activity through the group-commit buffer without waiting for it"""
         try:
-            import time
-            time.sleep(0.05)  # Small delay
-            conn = sqlite3.connect(self.db_path, timeout=30.0)
-            conn.execute('PRAGMA journal_mode=WAL')
-            cursor = conn.cursor()
-            cursor.execute('''
-                INSERT INTO activity_log (user_id, action, table_name, record_id)
-                VALUES (?, ?, ?, ?)
-            ''', (user_id, action, table_name, record_id))
-            conn.commit()
-            conn.close()
+            self.log_activity(user_id, action, table_name, record_id)
         except Exception as e:
             print(f"Warning: Could not log activity: {e}")
             # Don't fail the main operation if logging fails
 
     def load_form_data(self, form_name):
-        """Load form data from database"""
+        """Load form data from database (served from the payload cache when possible)"""
         try:
-            import json
+            cached = self.payload_cache.get(form_name=form_name)
+            if cached is not None:
+                return cached['data']
             
-            with sqlite3.connect(self.db_path) as conn:
+            generation = self.payload_cache.generation
+            with self.read_connection() as conn:
                 cursor = conn.cursor()
                 cursor.execute('''
-                    SELECT form_data FROM form_data WHERE form_name = ?
+                    SELECT id, form_name, form_data, created_at, updated_at, created_by
+                    FROM form_data WHERE form_name = ?
                 ''', (form_name,))
                 
                 result = cursor.fetchone()
                 if result:
-                    try:
-                        return json.loads(result[0])
-                    except json.JSONDecodeError:
-                        return result[0]  # Return as string if not JSON
+                    return self._cache_form_row(conn, result, generation)['data']  # Plain strings are returned as-is
                 return None
                 
         except Exception as e:
@@ -608,54 +2899,142 @@ class DatabaseManager:
             return None
 
     def get_all_forms_data(self):
-        """Get all forms data from database"""
+        """Get all forms data from database
+        
+        This materializes every payload; prefer iter_forms() or get_forms().
+        """
         try:
-            import json
-            import time
-            
-            # Small delay to avoid database lock issues
-            time.sleep(0.1)
-            
-            conn = None
-            try:
-                conn = sqlite3.connect(self.db_path, timeout=10.0)
-                cursor = conn.cursor()
-                cursor.execute('''
-                    SELECT form_name, form_data, created_at, updated_at 
-                    FROM form_data 
-                    ORDER BY form_name
-                ''')
-                
-                results = cursor.fetchall()
-                forms_data = {}
-                
-                for row in results:
-                    form_name, data_str, created_at, updated_at = row
-                    try:
-                        data = json.loads(data_str)
-                    except json.JSONDecodeError:
-                        data = data_str
-                        
-                    forms_data[form_name] = {
-                        'data': data,
-                        'created_at': created_at,
-                        'updated_at': updated_at
-                    }
-                
-                return forms_data
-                
-            finally:
-                if conn:
-                    conn.close()
+            forms_data = {}
+            for form in self.iter_forms():
+                forms_data[form['form_name']] = {
+                    'data': form['data'],
+                    'created_at': form['created_at'],
+                    'updated_at': form['updated_at']
+                }
+            return dict(sorted(forms_data.items()))
                 
         except Exception as e:
             print(f"Error getting all forms data: {e}")
             return {}
 
+    def iter_forms(self, batch_size=200, after_id=0, codes=None):
+        """Stream decoded form_data rows in id order using keyset pagination
+        
+        Only one batch of rows is held in memory at a time. Pass the last
+        seen id as after_id to resume, and codes to restrict to form codes.
+        """
+        code_filter = ""
+        code_params = ()
+        if codes:
+            code_params = tuple(self.extract_form_code(code) for code in codes)
+            code_filter = f"AND form_code IN ({','.join('?' * len(code_params))})"
+        
+        while True:
+            with self.read_connection() as conn:
+                rows = conn.execute(f'''
+                    SELECT id, form_name, form_code, instance_key, form_data, created_at, updated_at, created_by
+                    FROM form_data
+                    WHERE id > ? {code_filter}
+                    ORDER BY id
+                    LIMIT ?
+                ''', (after_id, *code_params, batch_size)).fetchall()
+                
+                forms = [{
+                    'id': form_id,
+                    'form_name': form_name,
+                    'form_code': form_code,
+                    'instance_key': instance_key,
+                    'data': self._expand_payload(conn, form_name, self._decode_payload(data_str)),
+                    'created_at': created_at,
+                    'updated_at': updated_at,
+                    'created_by': created_by
+                } for form_id, form_name, form_code, instance_key, data_str, created_at, updated_at, created_by in rows]
+            
+            yield from forms
+            
+            if len(rows) < batch_size:
+                return
+            after_id = rows[-1][0]
+
+    def get_change_watermark(self):
+        """Current form_data change sequence value (0 when nothing has changed yet)"""
+        with self.read_connection() as conn:
+            row = conn.execute("SELECT value FROM change_sequence WHERE id = 1").fetchone()
+            return row[0] if row else 0
+
+    def get_form_changes(self, since, form_names=None):
+        """Return (changed, deleted, watermark) for form_data changes after `since`
+        
+        changed has the get_forms() shape, deleted lists removed form names
+        (apply them before changed), and watermark is the value to pass next
+        time. Restrict to form_names to ignore rows the caller does not show.
+        """
+        wanted = set(form_names) if form_names is not None else None
+        try:
+            # Read the watermark first: anything committed after it is picked up next time
+            watermark = self.get_change_watermark()
+            with self.read_connection() as conn:
+                deleted = [name for (name,) in conn.execute('''
+                    SELECT form_name FROM form_data_deletions
+                    WHERE change_seq > ?
+                    ORDER BY change_seq
+                ''', (since,)) if wanted is None or name in wanted]
+                
+                changed = {}
+                for form_name, data_str, created_at, updated_at in conn.execute('''
+                    SELECT form_name, form_data, created_at, updated_at
+                    FROM form_data
+                    WHERE change_seq > ?
+                    ORDER BY change_seq
+                ''', (since,)).fetchall():
+                    if wanted is None or form_name in wanted:
+                        changed[form_name] = {
+                            'data': self._expand_payload(conn, form_name, self._decode_payload(data_str)),
+                            'created_at': created_at,
+                            'updated_at': updated_at
+                        }
+            return changed, deleted, watermark
+            
+        except Exception as e:
+            print(f"Error getting form changes: {e}")
+            return {}, [], since
+
+    def get_forms(self, form_names=None, codes=None):
+        """Bulk fetch selected forms by exact form name and/or form code
+        
+        Returns the same {form_name: {'data', 'created_at', 'updated_at'}}
+        shape as get_all_forms_data(), limited to the requested forms.
+        """
+        forms_data = {}
+        try:
+            lookups = [('form_name', list(form_names or [])),
+                       ('form_code', [self.extract_form_code(code) for code in codes or []])]
+            with self.read_connection() as conn:
+                for column, values in lookups:
+                    # Stay well below SQLite's bound-parameter limit
+                    for start in range(0, len(values), 500):
+                        chunk = values[start:start + 500]
+                        rows = conn.execute(f'''
+                            SELECT form_name, form_data, created_at, updated_at
+                            FROM form_data
+                            WHERE {column} IN ({','.join('?' * len(chunk))})
+                        ''', chunk).fetchall()
+                        for form_name, data_str, created_at, updated_at in rows:
+                            forms_data[form_name] = {
+                                'data': self._expand_payload(conn, form_name, self._decode_payload(data_str)),
+                                'created_at': created_at,
+                                'updated_at': updated_at
+                            }
+            return forms_data
+            
+        except Exception as e:
+            print(f"Error getting forms data: {e}")
+            return forms_data
+
     def delete_form_data(self, form_name=None, user_id=None):
         """Delete form data from database"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self.write_connection() as conn:
                 cursor = conn.cursor()
                 
                 # Get form ID for logging
@@ -664,10 +3043,14 @@ class DatabaseManager:
                 
                 if result:
                     form_id = result[0]
+                    self._begin_revision(conn, form_name)
                     
                     # Delete the form
                     cursor.execute('DELETE FROM form_data WHERE form_name = ?', (form_name,))
-                    conn.commit()
+                    self._invalidate_payloads(row_ids=[form_id], form_names=[form_name])
+                    self._unindex_document(conn, 'form', form_id)
+                    self._drop_form_rows(conn, form_name)
+                    self._record_revision(conn, form_name, user_id, deleted=True)
                     
                     # Log the activity
                     self.log_activity(user_id, "حذف بيانات النموذج", "form_data", form_id)
@@ -679,125 +3062,338 @@ class DatabaseManager:
             print(f"Error deleting form data: {e}")
             return False
 
-    def update_form_data(self, form_name=None, data=None, user_id=None):
-        """Update existing form data in database"""
+    def update_form_data(self, form_name=None, data=None, user_id=None, callback=None):
+        """Update existing form data in database (queued on the writer thread)"""
+        return self._finish_write(self._submit_form_write(form_name, data, user_id, False),
+                                  callback, "Error updating form data")
+
+    def backup_forms_data(self, full=False, backup_dir=None, callback=None):
+        """Create a differential backup of forms data
+        
+        Writes a gzip-compressed JSON-lines segment to backup_dir and records
+        it in manifest.json. The first backup (or full=True, or after
+        forms_backup_max_deltas changes segments) is a base with every form;
+        later ones only hold forms changed or deleted since the previous
+        segment's change watermark. Returns the segment path (the latest one
+        when nothing changed), or None on error. With a callback it runs on a
+        background backup thread like backup_database and returns its Future.
+        """
+        if callback:
+            return self._submit_backup(lambda: self.backup_forms_data(full, backup_dir), callback)
+        backup_dir = backup_dir or self.forms_backup_dir
         try:
-            import json
-            import time
+            os.makedirs(backup_dir, exist_ok=True)
+            manifest = self._read_backup_manifest(backup_dir)
+            segments = manifest['segments']
+            deltas = 0
+            for segment in reversed(segments):
+                if segment['kind'] == 'base':
+                    break
+                deltas += 1
+            base = full or not segments or deltas >= self.forms_backup_max_deltas
+            since = 0 if base else segments[-1]['watermark']
             
-            # Convert data to JSON string
-            if isinstance(data, (list, dict)):
-                data_json = json.dumps(data, ensure_ascii=False, indent=2)
-            else:
-                data_json = str(data)
+            # Read the watermark first: later changes are picked up by the next segment
+            watermark = self.get_change_watermark()
+            if not base and watermark == since:
+                return os.path.join(backup_dir, segments[-1]['file'])
             
-            # Small delay to avoid database lock issues
-            time.sleep(0.1)
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            kind = 'base' if base else 'delta'
+            filename = f"forms_{kind}_{timestamp}_{watermark}.jsonl.gz"
+            path = os.path.join(backup_dir, filename)
+            counts = {'forms': 0, 'deleted': 0}
             
-            conn = None
-            try:
-                conn = sqlite3.connect(self.db_path, timeout=30.0)
-                conn.execute('PRAGMA journal_mode=WAL')
-                cursor = conn.cursor()
-                
-                # Check if form exists
-                cursor.execute('SELECT id FROM form_data WHERE form_name = ?', (form_name,))
-                existing = cursor.fetchone()
-                
-                if existing:
-                    # Update existing form
-                    cursor.execute('''
-                        UPDATE form_data 
-                        SET form_data = ?, updated_at = CURRENT_TIMESTAMP 
-                        WHERE form_name = ?
-                    ''', (data_json, form_name))
-                    record_id = existing[0]
-                    action = "تحديث بيانات النموذج"
-                    
-                    conn.commit()
-                    
-                    # Log activity
-                    self._log_activity_async(user_id, action, "form_data", record_id)
-                    
-                    return True
+            with gzip.open(f"{path}.partial", 'wt', encoding='utf-8') as f:
+                if base:
+                    entries = self.iter_forms()
                 else:
-                    print(f"Form {form_name} not found for update")
-                    return False
-                
-            finally:
-                if conn:
-                    conn.close()
-                
+                    with self.read_connection() as conn:
+                        for (form_name,) in conn.execute('''
+                            SELECT form_name FROM form_data_deletions WHERE change_seq > ? ORDER BY change_seq
+                        ''', (since,)):
+                            f.write(json.dumps({'form_name': form_name, 'deleted': True}, ensure_ascii=False) + "\n")
+                            counts['deleted'] += 1
+                    entries = self._iter_changed_forms(since)
+                for form in entries:
+                    entry = {'form_name': form['form_name'], 'data': form['data'],
+                             'created_at': form['created_at'], 'updated_at': form['updated_at']}
+                    f.write(json.dumps(entry, ensure_ascii=False, separators=(',', ':')) + "\n")
+                    counts['forms'] += 1
+            os.replace(f"{path}.partial", path)
+            
+            segments.append({'file': filename, 'kind': kind, 'since': since, 'watermark': watermark,
+                             'created_at': datetime.now().strftime("%Y-%m-%d %H:%M:%S"), **counts})
+            self._write_backup_manifest(backup_dir, manifest)
+            return path
+            
         except Exception as e:
-            print(f"Error updating form data: {e}")
-            return False
+            print(f"Error creating forms backup: {e}")
+            return None
 
-    def backup_forms_data(self):
-        """Create backup of all forms data"""
-        try:
-            import json
-            from datetime import datetime
+    def _iter_changed_forms(self, since, batch_size=200):
+        """Stream forms whose change sequence is above since, in change order"""
+        while True:
+            with self.read_connection() as conn:
+                rows = conn.execute('''
+                    SELECT change_seq, form_name, form_data, created_at, updated_at
+                    FROM form_data
+                    WHERE change_seq > ?
+                    ORDER BY change_seq
+                    LIMIT ?
+                ''', (since, batch_size)).fetchall()
+                forms = [{
+                    'form_name': form_name,
+                    'data': self._expand_payload(conn, form_name, self._decode_payload(data_str)),
+                    'created_at': created_at,
+                    'updated_at': updated_at
+                } for _, form_name, data_str, created_at, updated_at in rows]
             
-            backup_data = self.get_all_forms_data()
+            yield from forms
             
-            # Create backup file
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            backup_filename = f"forms_backup_{timestamp}.json"
+            if len(rows) < batch_size:
+                return
+            since = rows[-1][0]
+
+    def export_forms_jsonl(self, path, codes=None, progress=None):
+        """Stream forms to a JSON-lines file (gzip-compressed when path ends in .gz)
+        
+        The first line is a header with the format, its version and the
+        schema version; each following line holds one form as
+        {form_name, data, created_at, updated_at}. Only one batch of forms is
+        in memory at a time. Returns {'path', 'forms', 'bytes', 'seconds'},
+        or None on error.
+        """
+        started = time.perf_counter()
+        opener = gzip.open if str(path).endswith('.gz') else open
+        try:
+            with self.read_connection() as conn:
+                schema_version = conn.execute('PRAGMA user_version').fetchone()[0]
+            forms = 0
+            with opener(f"{path}.partial", 'wt', encoding='utf-8') as f:
+                header = {'format': FORMS_EXPORT_FORMAT, 'version': FORMS_EXPORT_VERSION,
+                          'schema_version': schema_version,
+                          'exported_at': datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S"),
+                          'source': os.path.basename(self.db_path)}
+                f.write(json.dumps(header, ensure_ascii=False) + "\n")
+                for form in self.iter_forms(codes=codes):
+                    entry = {'form_name': form['form_name'], 'data': form['data'],
+                             'created_at': form['created_at'], 'updated_at': form['updated_at']}
+                    f.write(json.dumps(entry, ensure_ascii=False, separators=(',', ':')) + "\n")
+                    forms += 1
+                    if progress and forms % 500 == 0:
+                        progress(forms)
+            os.replace(f"{path}.partial", path)
+            return {'path': str(path), 'forms': forms, 'bytes': os.path.getsize(path),
+                    'seconds': round(time.perf_counter() - started, 3)}
+        except Exception as e:
+            print(f"Error exporting forms: {e}")
+            return None
+
+    def import_forms_jsonl(self, path, user_id=None, skip_existing=False, chunk_size=500, progress=None):
+        """Validate and bulk-import a JSON-lines forms file written by export_forms_jsonl
+        
+        Lines are read and written one chunk at a time. Invalid lines are
+        skipped and reported as errors with their line numbers. Existing forms
+        are overwritten unless skip_existing is True. Forms backup segments
+        (no header line) are accepted as well. Returns the _run_bulk report
+        with 'invalid' and 'errors' added, or None when the file is unusable.
+        """
+        opener = gzip.open if str(path).endswith('.gz') else open
+        errors = []
+        invalid = 0
+        
+        def _invalid(line_number, message):
+            nonlocal invalid
+            invalid += 1
+            if len(errors) < 50:
+                errors.append(f"line {line_number}: {message}")
+        
+        def _records(f):
+            for line_number, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    entry = json.loads(line)
+                except ValueError as e:
+                    _invalid(line_number, f"invalid JSON ({e})")
+                    continue
+                if line_number == 1 and isinstance(entry, dict) and 'format' in entry:
+                    if entry['format'] != FORMS_EXPORT_FORMAT or entry.get('version', 0) > FORMS_EXPORT_VERSION:
+                        raise ValueError(f"Unsupported export format {entry['format']} v{entry.get('version')}")
+                    continue
+                if not isinstance(entry, dict) or entry.get('deleted'):
+                    _invalid(line_number, "not a form record")
+                    continue
+                name = entry.get('form_name')
+                if not isinstance(name, str) or not name.strip():
+                    _invalid(line_number, "missing form_name")
+                    continue
+                if 'data' not in entry:
+                    _invalid(line_number, f"{name}: missing data")
+                    continue
+                yield name, entry['data'], entry.get('created_at'), entry.get('updated_at')
+        
+        try:
+            with opener(path, 'rt', encoding='utf-8') as f:
+                report = self._run_bulk(f"Import {os.path.basename(str(path))}", _records(f), chunk_size,
+                                        lambda conn, chunk: self._save_forms_chunk(conn, chunk, user_id, skip_existing),
+                                        self._prepare_form_items, progress)
+        except Exception as e:
+            print(f"Error importing forms: {e}")
+            return None
+        report['invalid'] = invalid
+        report['errors'] = errors
+        return report
+
+    def _read_backup_manifest(self, backup_dir):
+        """Load manifest.json of a forms backup directory"""
+        path = os.path.join(backup_dir, "manifest.json")
+        if not os.path.exists(path):
+            return {'format': 1, 'segments': []}
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def _write_backup_manifest(self, backup_dir, manifest):
+        """Atomically replace manifest.json of a forms backup directory"""
+        path = os.path.join(backup_dir, "manifest.json")
+        with open(f"{path}.partial", 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+        os.replace(f"{path}.partial", path)
+
+    def restore_forms_backup(self, backup_dir=None, until=None, user_id=None, prune=False):
+        """Restore forms from a differential backup
+        
+        Replays the latest base segment and the change segments after it,
+        stopping after the segment named until when given. With prune=True,
+        forms that are not in the restored backup are deleted. Returns
+        {'segments', 'saved', 'deleted', 'pruned'}, or None on error.
+        """
+        backup_dir = backup_dir or self.forms_backup_dir
+        try:
+            segments = self._read_backup_manifest(backup_dir)['segments']
+            if until is not None:
+                names = [segment['file'] for segment in segments]
+                if until not in names:
+                    raise ValueError(f"Segment {until} is not in the manifest")
+                segments = segments[:names.index(until) + 1]
+            bases = [index for index, segment in enumerate(segments) if segment['kind'] == 'base']
+            if not bases:
+                raise ValueError("No base segment to restore from")
+            chain = segments[bases[-1]:]
             
-            with open(backup_filename, 'w', encoding='utf-8') as f:
-                json.dump(backup_data, f, ensure_ascii=False, indent=2)
+            report = {'segments': len(chain), 'saved': 0, 'deleted': 0, 'pruned': 0}
+            restored = set()
+            for segment in chain:
+                saved, deleted, timestamps = {}, [], {}
+                with gzip.open(os.path.join(backup_dir, segment['file']), 'rt', encoding='utf-8') as f:
+                    for line in f:
+                        entry = json.loads(line)
+                        if entry.get('deleted'):
+                            saved.pop(entry['form_name'], None)
+                            deleted.append(entry['form_name'])
+                        else:
+                            saved[entry['form_name']] = entry['data']
+                            timestamps[entry['form_name']] = (entry['created_at'], entry['updated_at'])
+                
+                for form_name in deleted:
+                    restored.discard(form_name)
+                    if self.delete_form_data(form_name, user_id):
+                        report['deleted'] += 1
+                if saved:
+                    result = self._run_bulk(f"Restore {segment['file']}",
+                                            [(name, data, *timestamps[name]) for name, data in saved.items()], 500,
+                                            lambda conn, chunk: self._save_forms_chunk(conn, chunk, user_id),
+                                            self._prepare_form_items)
+                    if result['failed']:
+                        raise RuntimeError(f"Could not restore {segment['file']}")
+                    report['saved'] += result['items']
+                    restored.update(saved)
             
-            return backup_filename
+            if prune:
+                for form in self.list_forms_summary():
+                    if form['form_name'] not in restored and self.delete_form_data(form['form_name'], user_id):
+                        report['pruned'] += 1
+            return report
             
         except Exception as e:
-            print(f"Error creating forms backup: {e}")
+            print(f"Error restoring forms backup: {e}")
             return None
 
     def get_form_instances(self, form_base_name):
-        """Get all instances of a specific form type (e.g., all QF-09-01-01 forms)"""
+        """Get all instances of a specific form type (e.g., all QF-09-01-01 forms)
+        
+        Only payloads missing from the cache (or changed since they were
+        cached) are read and decoded.
+        """
         try:
-            import json
-            
-            with sqlite3.connect(self.db_path) as conn:
+            generation = self.payload_cache.generation
+            with self.read_connection() as conn:
                 cursor = conn.cursor()
                 cursor.execute('''
-                    SELECT id, form_name, form_data, created_at, updated_at, created_by
+                    SELECT id, updated_at
                     FROM form_data 
-                    WHERE form_name LIKE ?
+                    WHERE form_code = ?
                     ORDER BY created_at DESC
-                ''', (f"{form_base_name}%",))
+                ''', (self.extract_form_code(form_base_name),))
                 
                 results = cursor.fetchall()
-                instances = []
+                instances = [self.payload_cache.get(row_id=form_id, updated_at=updated_at)
+                             for form_id, updated_at in results]
                 
-                for row in results:
-                    form_id, form_name, data_str, created_at, updated_at, created_by = row
-                    try:
-                        data = json.loads(data_str)
-                    except json.JSONDecodeError:
-                        data = data_str
-                        
-                    instances.append({
-                        'id': form_id,
-                        'form_name': form_name,
-                        'data': data,
-                        'created_at': created_at,
-                        'updated_at': updated_at,
-                        'created_by': created_by
-                    })
+                missing = [form_id for (form_id, _), cached in zip(results, instances) if cached is None]
+                loaded = {}
+                for start in range(0, len(missing), 500):
+                    chunk = missing[start:start + 500]
+                    placeholders = ','.join('?' * len(chunk))
+                    for row in conn.execute(f'''
+                        SELECT id, form_name, form_data, created_at, updated_at, created_by
+                        FROM form_data WHERE id IN ({placeholders})
+                    ''', chunk):
+                        loaded[row[0]] = self._cache_form_row(conn, row, generation)
                 
-                return instances
+                return [cached if cached is not None else loaded[form_id]
+                        for (form_id, _), cached in zip(results, instances)
+                        if cached is not None or form_id in loaded]
                 
         except Exception as e:
             print(f"Error getting form instances: {e}")
             return []
 
+    def count_form_instances(self, form_base_name):
+        """Count saved instances of a form type without reading their payloads"""
+        try:
+            with self.read_connection() as conn:
+                return conn.execute('SELECT COUNT(*) FROM form_data WHERE form_code = ?',
+                                    (self.extract_form_code(form_base_name),)).fetchone()[0]
+        except Exception as e:
+            print(f"Error counting form instances: {e}")
+            return 0
+
+    def get_latest_form_instance(self, form_base_name):
+        """Get the most recently created instance of a form type"""
+        try:
+            with self.read_connection() as conn:
+                row = conn.execute('''
+                    SELECT id FROM form_data
+                    WHERE form_code = ?
+                    ORDER BY created_at DESC
+                    LIMIT 1
+                ''', (self.extract_form_code(form_base_name),)).fetchone()
+            return self.get_form_instance_by_id(row[0]) if row else None
+        except Exception as e:
+            print(f"Error getting latest form instance: {e}")
+            return None
+
     def get_form_instance_by_id(self, form_id):
-        """Get a specific form instance by ID"""
+        """Get a specific form instance by ID (served from the payload cache when possible)"""
         try:
-            import json
+            cached = self.payload_cache.get(row_id=form_id)
+            if cached is not None:
+                return cached
             
-            with sqlite3.connect(self.db_path) as conn:
+            generation = self.payload_cache.generation
+            with self.read_connection() as conn:
                 cursor = conn.cursor()
                 cursor.execute('''
                     SELECT id, form_name, form_data, created_at, updated_at, created_by
@@ -807,20 +3403,7 @@ class DatabaseManager:
                 
                 result = cursor.fetchone()
                 if result:
-                    form_id, form_name, data_str, created_at, updated_at, created_by = result
-                    try:
-                        data = json.loads(data_str)
-                    except json.JSONDecodeError:
-                        data = data_str
-                        
-                    return {
-                        'id': form_id,
-                        'form_name': form_name,
-                        'data': data,
-                        'created_at': created_at,
-                        'updated_at': updated_at,
-                        'created_by': created_by
-                    }
+                    return self._cache_form_row(conn, result, generation)
                 return None
                 
         except Exception as e:
@@ -830,7 +3413,7 @@ class DatabaseManager:
     def delete_form_instance_by_id(self, form_id, user_id=None):
         """Delete a specific form instance by ID"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self.write_connection() as conn:
                 cursor = conn.cursor()
                 
                 # Check if form exists
@@ -839,10 +3422,14 @@ class DatabaseManager:
                 
                 if result:
                     form_name = result[0]
+                    self._begin_revision(conn, form_name)
                     
                     # Delete the form
                     cursor.execute('DELETE FROM form_data WHERE id = ?', (form_id,))
-                    conn.commit()
+                    self._invalidate_payloads(row_ids=[form_id], form_names=[form_name])
+                    self._unindex_document(conn, 'form', form_id)
+                    self._drop_form_rows(conn, form_name)
+                    self._record_revision(conn, form_name, user_id, deleted=True)
                     
                     # Log the activity
                     self.log_activity(user_id, f"حذف نسخة من النموذج {form_name}", "form_data", form_id)
@@ -854,45 +3441,958 @@ class DatabaseManager:
             print(f"Error deleting form instance: {e}")
             return False
 
-    def save_form_instance(self, form_name, data, user_id=None, instance_name=None):
-        """Save a new instance of a form with unique identifier"""
-        try:
-            import json
-            from datetime import datetime
+    def save_form_instance(self, form_name, data, user_id=None, instance_name=None, callback=None):
+        """Save a new instance of a form with unique identifier
+        
+        Returns the new record id, or None on failure. With a callback the
+        save is queued on the writer thread and callback receives the id
+        (False on failure).
+        """
+        from datetime import datetime
+        
+        # Create unique form name if instance_name provided
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        instance_key = f"{instance_name}_{timestamp}" if instance_name else timestamp
+        unique_form_name = f"{form_name}_{instance_key}"
+        
+        def _insert(conn):
+            stored, metadata = self._encode_payload(data, unique_form_name)
+            cursor = conn.cursor()
             
-            # Create unique form name if instance_name provided
-            if instance_name:
-                unique_form_name = f"{form_name}_{instance_name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
-            else:
-                unique_form_name = f"{form_name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+            # Insert new form instance
+            cursor.execute('''
+                INSERT INTO form_data (form_name, form_data, created_by, form_code, instance_key,
+                                       record_count, payload_bytes, payload_hash)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (unique_form_name, stored, user_id, self.extract_form_code(form_name), instance_key,
+                  *metadata))
             
-            # Convert data to JSON string
-            if isinstance(data, (list, dict)):
-                data_json = json.dumps(data, ensure_ascii=False, indent=2)
-            else:
-                data_json = str(data)
+            record_id = cursor.lastrowid
+            self._invalidate_payloads(row_ids=[record_id], form_names=[unique_form_name])
+            self._index_document(conn, 'form', record_id, unique_form_name, _payload_search_text(data))
+            self._record_revision(conn, unique_form_name, user_id, None, lambda: self._decode_payload(stored))
             
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                
-                # Insert new form instance
-                cursor.execute('''
-                    INSERT INTO form_data (form_name, form_data, created_by)
-                    VALUES (?, ?, ?)
-                ''', (unique_form_name, data_json, user_id))
-                
-                record_id = cursor.lastrowid
-                conn.commit()
-                
-                # Log activity
-                self.log_activity(user_id, f"إضافة نسخة جديدة من النموذج {form_name}", "form_data", record_id)
-                
-                return record_id
-                
+            # Log activity
+            self._log_activity_async(user_id, f"إضافة نسخة جديدة من النموذج {form_name}", "form_data", record_id)
+            return record_id
+        
+        result = self._finish_write(self.submit_write(_insert), callback, "Error saving form instance")
+        return result if callback else (result or None)
+
+    def _load_form_rows(self, conn, form_name):
+        """Row values of a row-stored form in display order"""
+        return [json.loads(values) for (values,) in conn.execute('''
+            SELECT row_values FROM form_rows WHERE form_name = ? ORDER BY position, row_id
+        ''', (form_name,))]
+
+    def _expand_payload(self, conn, form_name, data):
+        """Replace the row-storage marker with the form's rows"""
+        if data == ROW_STORAGE_MARKER:
+            return self._load_form_rows(conn, form_name)
+        return data
+
+    def _drop_form_rows(self, conn, form_name):
+        """Discard row storage after the whole form was written as one payload"""
+        conn.execute('''
+            DELETE FROM search_index WHERE rowid IN (
+                SELECT d.id FROM search_docs d JOIN form_rows r ON d.ref = CAST(r.row_id AS TEXT)
+                WHERE d.scope = 'form_row' AND r.form_name = ?)
+        ''', (form_name,))
+        conn.execute('''
+            DELETE FROM search_docs WHERE scope = 'form_row' AND ref IN (
+                SELECT CAST(row_id AS TEXT) FROM form_rows WHERE form_name = ?)
+        ''', (form_name,))
+        conn.execute('DELETE FROM form_rows WHERE form_name = ?', (form_name,))
+
+    def _row_storage_form(self, conn, form_name, user_id, convert=True):
+        """Return the form_data id of form_name, switching it to row storage if needed
+        
+        A missing form is created empty; a stored list of rows is split into
+        form_rows (or discarded when convert is False because the caller
+        rewrites every row). Raises ValueError for payloads that are not tables.
+        """
+        row = conn.execute('SELECT id, form_data FROM form_data WHERE form_name = ?', (form_name,)).fetchone()
+        marker, _ = self._encode_payload(ROW_STORAGE_MARKER)
+        if row is None:
+            return conn.execute('''
+                INSERT INTO form_data (form_name, form_data, created_by, form_code, instance_key,
+                                       record_count, payload_bytes, payload_hash)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (form_name, marker, user_id, *self.split_form_name(form_name), *_row_metadata([]))).lastrowid
+        
+        form_id, stored = row
+        data = self._decode_payload(stored)
+        if data == ROW_STORAGE_MARKER:
+            return form_id
+        if convert and not isinstance(data, list):
+            raise ValueError(f"Form {form_name} is not stored as a table")
+        
+        form_code = self.extract_form_code(form_name)
+        rows = []
+        for position, values in enumerate(data if convert else []):
+            row_values = json.dumps(values, ensure_ascii=False, separators=(',', ':'))
+            row_id = conn.execute('''
+                INSERT INTO form_rows (form_name, form_code, position, row_values, updated_by)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (form_name, form_code, position, row_values, user_id)).lastrowid
+            rows.append((row_id, position, row_values))
+            self._index_document(conn, 'form_row', row_id, form_name, _payload_search_text(values))
+        conn.execute('UPDATE form_data SET form_data = ?, record_count = ?, payload_bytes = ?, payload_hash = ? WHERE id = ?',
+                     (marker, *_row_metadata(rows), form_id))
+        self._unindex_document(conn, 'form', form_id)
+        self._invalidate_payloads(row_ids=[form_id], form_names=[form_name])
+        return form_id
+
+    def _touch_form_rows(self, conn, form_id, form_name, added=(), removed=()):
+        """Bump the change sequence and metadata of a form after a row-level write
+        
+        added and removed are the (row_id, position, row_values) rows written
+        and deleted; an update removes the old row and adds the new one. The
+        metadata (see _row_metadata) is adjusted by these rows only, so the
+        cost does not grow with the size of the form.
+        """
+        count, size, digest = conn.execute(
+            'SELECT record_count, payload_bytes, payload_hash FROM form_data WHERE id = ?', (form_id,)).fetchone()
+        values_bytes = size - 2 - max(count - 1, 0)
+        digest = int(digest, 16)
+        for sign, rows in ((1, added), (-1, removed)):
+            for row in rows:
+                count += sign
+                values_bytes += sign * len(row[2].encode('utf-8'))
+                digest += sign * _row_digest(*row)
+        conn.execute("UPDATE change_sequence SET value = value + 1 WHERE id = 1")
+        conn.execute('''
+            UPDATE form_data
+            SET change_seq = (SELECT value FROM change_sequence WHERE id = 1),
+                updated_at = CURRENT_TIMESTAMP,
+                record_count = ?, payload_bytes = ?, payload_hash = ?
+            WHERE id = ?
+        ''', (count, values_bytes + 2 + max(count - 1, 0), f"{digest % 2 ** 256:064x}", form_id))
+        self._invalidate_payloads(row_ids=[form_id], form_names=[form_name])
+
+    @staticmethod
+    def _form_row_items(conn, form_name):
+        """[(row_id, values)] of a row-stored form in display order"""
+        return [(str(row_id), json.loads(values)) for row_id, values in conn.execute('''
+            SELECT row_id, row_values FROM form_rows WHERE form_name = ? ORDER BY position, row_id
+        ''', (form_name,))]
+
+    def get_form_rows(self, form_name, user_id=None, callback=None):
+        """Rows of a tabular form as [(row_id, values)], moving it to row storage on first use
+        
+        Row ids are strings so they can be used directly as Treeview item ids.
+        Returns None when the form is not a table or cannot be read. With a
+        callback the whole read runs on the writer thread and callback receives
+        the rows (False on failure); the pending Future is returned.
+        """
+        def _rows(conn):
+            if conn.execute('SELECT 1 FROM form_data WHERE form_name = ?', (form_name,)).fetchone() is None:
+                return []
+            self._row_storage_form(conn, form_name, user_id)
+            return self._form_row_items(conn, form_name)
+        
+        if callback:
+            return self._finish_write(self.submit_write(_rows), callback, "Error getting form rows")
+        try:
+            with self.read_connection() as conn:
+                row = conn.execute('SELECT form_data FROM form_data WHERE form_name = ?', (form_name,)).fetchone()
+                if row is None:
+                    return []
+                if self._decode_payload(row[0]) == ROW_STORAGE_MARKER:
+                    return self._form_row_items(conn, form_name)
+            rows = self._finish_write(self.submit_write(_rows), None, "Error converting form rows")
+            return rows if rows is not False else None
+        except Exception as e:
+            print(f"Error getting form rows: {e}")
+            return None
+
+    def upsert_form_row(self, form_name, row_id, values, user_id=None, callback=None):
+        """Insert (row_id=None) or update one row of a tabular form
+        
+        Only that row is written. Returns the row id as a string, or False;
+        with a callback, callback receives that result instead.
+        """
+        row_values = json.dumps(values, ensure_ascii=False, separators=(',', ':'))
+        
+        def _upsert(conn):
+            form_id = self._row_storage_form(conn, form_name, user_id)
+            self._begin_revision(conn, form_name)
+            if row_id:
+                old = conn.execute('SELECT position, row_values FROM form_rows WHERE row_id = ? AND form_name = ?',
+                                   (int(row_id), form_name)).fetchone()
+                if old is None:
+                    raise ValueError(f"Row {row_id} not found in {form_name}")
+                saved_id, position = int(row_id), old[0]
+                conn.execute('''
+                    UPDATE form_rows SET row_values = ?, updated_at = CURRENT_TIMESTAMP, updated_by = ?
+                    WHERE row_id = ?
+                ''', (row_values, user_id, saved_id))
+                removed = [(saved_id, position, old[1])]
+                action = "تحديث سجل في النموذج"
+            else:
+                position = conn.execute('SELECT COALESCE(MAX(position), -1) + 1 FROM form_rows WHERE form_name = ?',
+                                        (form_name,)).fetchone()[0]
+                saved_id = conn.execute('''
+                    INSERT INTO form_rows (form_name, form_code, position, row_values, updated_by)
+                    VALUES (?, ?, ?, ?, ?)
+                ''', (form_name, self.extract_form_code(form_name), position, row_values, user_id)).lastrowid
+                removed = []
+                action = "إضافة سجل إلى النموذج"
+            op = 'replace' if row_id else 'add'
+            self._index_document(conn, 'form_row', saved_id, form_name, _payload_search_text(values))
+            self._touch_form_rows(conn, form_id, form_name, [(saved_id, position, row_values)], removed)
+            self._record_revision(conn, form_name, user_id,
+                                  [{'op': op, 'path': f"/{self._form_row_index(conn, saved_id)}",
+                                    'value': json.loads(row_values)}],
+                                  lambda: self._load_form_rows(conn, form_name))
+            self._log_activity_async(user_id, action, "form_rows", saved_id)
+            return str(saved_id)
+        
+        return self._finish_write(self.submit_write(_upsert), callback, "Error saving form row")
+
+    def delete_form_rows(self, form_name, row_ids, user_id=None, callback=None):
+        """Delete rows of a tabular form by row id (same callback contract as save_form_data)"""
+        ids = [int(row_id) for row_id in row_ids]
+        
+        def _delete(conn):
+            form_id = self._row_storage_form(conn, form_name, user_id)
+            self._begin_revision(conn, form_name)
+            ops, removed = [], []
+            for row_id in ids:
+                old = conn.execute('SELECT position, row_values FROM form_rows WHERE row_id = ? AND form_name = ?',
+                                   (row_id, form_name)).fetchone()
+                if old is None:
+                    continue
+                ops.append({'op': 'remove', 'path': f"/{self._form_row_index(conn, row_id)}"})
+                conn.execute('DELETE FROM form_rows WHERE row_id = ?', (row_id,))
+                removed.append((row_id, *old))
+                self._unindex_document(conn, 'form_row', row_id)
+                self._log_activity_async(user_id, "حذف سجل من النموذج", "form_rows", row_id)
+            self._touch_form_rows(conn, form_id, form_name, removed=removed)
+            self._record_revision(conn, form_name, user_id, ops, lambda: self._load_form_rows(conn, form_name))
+            return True
+        
+        return self._finish_write(self.submit_write(_delete), callback, "Error deleting form rows")
+
+    def replace_form_rows(self, form_name, rows, user_id=None, callback=None):
+        """Save a whole table given as [(row_id or None, values)] in display order
+        
+        Rows whose values and position are unchanged are not written; rows
+        missing from `rows` are deleted. Same callback contract as save_form_data.
+        """
+        encoded = [(row_id, values, json.dumps(values, ensure_ascii=False, separators=(',', ':')))
+                   for row_id, values in rows]
+        
+        def _replace(conn):
+            self._begin_revision(conn, form_name)
+            old_content = self._current_form_content(conn, form_name)
+            form_id = self._row_storage_form(conn, form_name, user_id, convert=False)
+            self._sync_form_rows(conn, form_id, form_name, encoded, user_id)
+            new_content = self._load_form_rows(conn, form_name)
+            self._record_revision(conn, form_name, user_id,
+                                  _json_diff(old_content, new_content) if old_content is not None else None,
+                                  lambda: new_content)
+            self._log_activity_async(user_id, "تحديث بيانات النموذج", "form_data", form_id)
+            return True
+        
+        return self._finish_write(self.submit_write(_replace), callback, "Error saving form rows")
+
+    def _sync_form_rows(self, conn, form_id, form_name, encoded, user_id):
+        """Make the rows of a row-stored form equal to encoded, [(row_id or None, values, row_values)]
+        
+        Rows whose values and position are unchanged are not written; rows
+        not listed are deleted.
+        """
+        existing = {row_id: (position, values) for row_id, position, values in conn.execute(
+            'SELECT row_id, position, row_values FROM form_rows WHERE form_name = ?', (form_name,))}
+        kept, added, removed = set(), [], []
+        form_code = self.extract_form_code(form_name)
+        for position, (row_id, values, row_values) in enumerate(encoded):
+            key = int(row_id) if row_id and str(row_id).isdigit() else None
+            if key in existing and key not in kept:
+                kept.add(key)
+                if existing[key] == (position, row_values):
+                    continue
+                conn.execute('''
+                    UPDATE form_rows SET position = ?, row_values = ?, updated_at = CURRENT_TIMESTAMP,
+                                         updated_by = ?
+                    WHERE row_id = ?
+                ''', (position, row_values, user_id, key))
+                removed.append((key, *existing[key]))
+            else:
+                key = conn.execute('''
+                    INSERT INTO form_rows (form_name, form_code, position, row_values, updated_by)
+                    VALUES (?, ?, ?, ?, ?)
+                ''', (form_name, form_code, position, row_values, user_id)).lastrowid
+                kept.add(key)
+            added.append((key, position, row_values))
+            self._index_document(conn, 'form_row', key, form_name, _payload_search_text(values))
+        for row_id in set(existing) - kept:
+            conn.execute('DELETE FROM form_rows WHERE row_id = ?', (row_id,))
+            removed.append((row_id, *existing[row_id]))
+            self._unindex_document(conn, 'form_row', row_id)
+        self._touch_form_rows(conn, form_id, form_name, added, removed)
+
+    def _form_row_index(self, conn, row_id):
+        """Display index of a form_rows row within its form (None if it does not exist)"""
+        row = conn.execute('''
+            SELECT (SELECT COUNT(*) FROM form_rows other
+                    WHERE other.form_name = r.form_name
+                      AND (other.position < r.position OR (other.position = r.position AND other.row_id < r.row_id)))
+            FROM form_rows r WHERE r.row_id = ?
+        ''', (row_id,)).fetchone()
+        return row[0] if row else None
+
+    def _current_form_content(self, conn, form_name):
+        """Decoded (and row-expanded) content of a stored form, or None"""
+        row = conn.execute('SELECT form_data FROM form_data WHERE form_name = ?', (form_name,)).fetchone()
+        if row is None:
+            return None
+        return self._expand_payload(conn, form_name, self._decode_payload(row[0]))
+
+    def _begin_revision(self, conn, form_name):
+        """Before the first tracked change of a form, snapshot its current content as revision 1"""
+        if conn.execute('SELECT 1 FROM form_revisions WHERE form_name = ? LIMIT 1', (form_name,)).fetchone():
+            return
+        row = conn.execute('SELECT updated_at FROM form_data WHERE form_name = ?', (form_name,)).fetchone()
+        if row is None:
+            return
+        stored, _ = self._encode_payload(self._current_form_content(conn, form_name))
+        conn.execute('''
+            INSERT INTO form_revisions (form_name, revision, kind, payload, created_at)
+            VALUES (?, 1, 'snapshot', ?, ?)
+        ''', (form_name, stored, row[0]))
+
+    def _record_revision(self, conn, form_name, user_id, ops=None, load_content=None, deleted=False):
+        """Append the next revision of a form after a change
+        
+        ops is the JSON patch from the previous revision ([] means nothing
+        changed, None means unknown); load_content returns the new content and
+        is only called when a snapshot is stored: for the first revision,
+        after a deletion, every revision_snapshot_interval revisions, or when
+        the delta would be larger than the content itself.
+        """
+        last = conn.execute('''
+            SELECT revision, kind FROM form_revisions WHERE form_name = ? ORDER BY revision DESC LIMIT 1
+        ''', (form_name,)).fetchone()
+        revision = last[0] + 1 if last else 1
+        
+        if deleted:
+            kind, payload = 'delete', None
+        else:
+            if ops == []:
+                return
+            delta = json.dumps(ops, ensure_ascii=False, separators=(',', ':')) if ops is not None else None
+            snapshot = (delta is None or last is None or last[1] == 'delete'
+                        or (revision - 1) % self.revision_snapshot_interval == 0)
+            content = None
+            if not snapshot and len(delta) > self.payload_compress_threshold:
+                content = load_content()
+                snapshot = len(json.dumps(content, ensure_ascii=False, separators=(',', ':'))) <= len(delta)
+            if snapshot:
+                kind = 'snapshot'
+                payload, _ = self._encode_payload(content if content is not None else load_content())
+            else:
+                kind, payload = 'delta', delta
+        
+        conn.execute('''
+            INSERT INTO form_revisions (form_name, revision, kind, payload, created_by)
+            VALUES (?, ?, ?, ?, ?)
+        ''', (form_name, revision, kind, payload, user_id))
+
+    def _form_state(self, conn, form_name, revision):
+        """Rebuild a form's content at a revision from the nearest snapshot before it"""
+        state = None
+        for kind, payload in conn.execute('''
+            SELECT kind, payload FROM form_revisions
+            WHERE form_name = ? AND revision <= ?
+              AND revision >= COALESCE((SELECT MAX(revision) FROM form_revisions
+                                        WHERE form_name = ? AND revision <= ? AND kind != 'delta'), 0)
+            ORDER BY revision
+        ''', (form_name, revision, form_name, revision)):
+            if kind == 'snapshot':
+                state = self._decode_payload(payload)
+            elif kind == 'delete':
+                state = None
+            else:
+                state = _apply_json_patch(state, json.loads(payload))
+        return state
+
+    def list_form_revisions(self, form_name):
+        """List a form's revisions (newest first) without their content"""
+        try:
+            with self.read_connection() as conn:
+                cursor = conn.execute('''
+                    SELECT revision, kind, created_at, created_by, length(payload) AS size
+                    FROM form_revisions
+                    WHERE form_name = ?
+                    ORDER BY revision DESC
+                ''', (form_name,))
+                columns = [column[0] for column in cursor.description]
+                return [dict(zip(columns, row)) for row in cursor]
+        except Exception as e:
+            print(f"Error listing form revisions: {e}")
+            return []
+
+    def get_form_revision(self, form_name, revision):
+        """Content of a form at a given revision (None if it was deleted or does not exist)"""
+        try:
+            with self.read_connection() as conn:
+                return self._form_state(conn, form_name, revision)
+        except Exception as e:
+            print(f"Error getting form revision: {e}")
+            return None
+
+    def get_form_state_at(self, form_name, as_of):
+        """Content of a form as it was at as_of (UTC datetime or 'YYYY-MM-DD HH:MM:SS')"""
+        if isinstance(as_of, datetime):
+            as_of = as_of.strftime('%Y-%m-%d %H:%M:%S')
+        try:
+            with self.read_connection() as conn:
+                row = conn.execute('''
+                    SELECT MAX(revision) FROM form_revisions WHERE form_name = ? AND created_at <= ?
+                ''', (form_name, as_of)).fetchone()
+                if row[0] is None:
+                    return None
+                return self._form_state(conn, form_name, row[0])
         except Exception as e:
-            print(f"Error saving form instance: {e}")
+            print(f"Error getting form state: {e}")
             return None
 
+    def diff_form_revisions(self, form_name, from_revision, to_revision):
+        """JSON patch turning the content at from_revision into the content at to_revision"""
+        try:
+            with self.read_connection() as conn:
+                return _json_diff(self._form_state(conn, form_name, from_revision),
+                                  self._form_state(conn, form_name, to_revision))
+        except Exception as e:
+            print(f"Error diffing form revisions: {e}")
+            return []
+
+    @staticmethod
+    def _field_expression(path):
+        """SQL expression of a registered field; must match its index expression exactly"""
+        return f"json_extract(CASE WHEN json_valid(form_data) THEN form_data END, '{path.replace(chr(39), chr(39) * 2)}')"
+
+    def _create_field_index(self, conn, form_code, field, path):
+        """Register a field and create its partial expression index"""
+        if not FORM_CODE_PATTERN.fullmatch(form_code) or not FIELD_NAME_PATTERN.match(field) or not path.startswith('$'):
+            raise ValueError(f"Invalid field index {form_code}.{field} -> {path}")
+        conn.execute('''
+            INSERT INTO form_field_indexes (form_code, field, json_path) VALUES (?, ?, ?)
+            ON CONFLICT(form_code, field) DO UPDATE SET json_path = excluded.json_path
+        ''', (form_code, field, path))
+        
+        # The code is a literal so the planner can match the index to query_forms' WHERE clause
+        index_name = f"idx_form_field_{form_code.replace('-', '_')}_{field}"
+        conn.execute(f"DROP INDEX IF EXISTS {index_name}")
+        conn.execute(f"""
+            CREATE INDEX {index_name} ON form_data({self._field_expression(path)})
+            WHERE form_code = '{form_code}'
+        """)
+        
+        # json_extract cannot read compressed payloads: store this code's forms as text
+        compressed = conn.execute('''
+            SELECT id, form_data FROM form_data WHERE form_code = ? AND typeof(form_data) = 'blob'
+        ''', (form_code,)).fetchall()
+        with self._change_tracking_paused(conn):
+            for row_id, stored in compressed:
+                text = self._payload_text(stored)
+                conn.execute('UPDATE form_data SET form_data = ?, payload_bytes = ? WHERE id = ?',
+                             (text, len(text.encode('utf-8')), row_id))
+                self._invalidate_payloads(row_ids=[row_id])
+
+    def _load_form_field_indexes(self):
+        """Read the field-index registry into form_field_indexes"""
+        try:
+            with self.read_connection() as conn:
+                registry = {}
+                for form_code, field, path in conn.execute(
+                        'SELECT form_code, field, json_path FROM form_field_indexes ORDER BY form_code, field'):
+                    registry.setdefault(form_code, {})[field] = path
+            self.form_field_indexes = registry
+        except Exception as e:
+            print(f"Error loading form field indexes: {e}")
+
+    def register_form_field(self, form_code, field, path):
+        """Make a form field queryable through query_forms (creates its index if needed)"""
+        form_code = self.extract_form_code(form_code)
+        
+        def _register(conn):
+            self._create_field_index(conn, form_code, field, path)
+            return True
+        
+        if not self._finish_write(self.submit_write(_register), None, "Error registering form field"):
+            return False
+        self._load_form_field_indexes()
+        return True
+
+    def query_forms(self, form_code, where=None, order_by=None, limit=None, offset=0, include_data=False):
+        """Filter and sort forms of one code on their registered fields inside SQLite
+        
+        where maps a field (or form_name/created_at/updated_at) to a value
+        (equality) or to (operator, value) with operator one of =, !=, <, <=,
+        >, >=, like, in (value is a list), between (value is a pair), is and
+        is not. As in SQL, != never matches a missing (NULL) field; use
+        is not to keep those rows.
+        order_by is a field name or a list of them, '-' prefixed for
+        descending. Returns [{'id', 'form_name', 'created_at', 'updated_at',
+        'fields'[, 'data']}]; an unknown field or operator returns [].
+        """
+        form_code = self.extract_form_code(form_code)
+        fields = self.form_field_indexes.get(form_code, {})
+        if not FORM_CODE_PATTERN.fullmatch(form_code):
+            print(f"Error querying forms: invalid form code {form_code}")
+            return []
+        
+        def _column(name):
+            if name in fields:
+                return self._field_expression(fields[name])
+            if name in QUERY_META_COLUMNS:
+                return name
+            raise ValueError(f"{name} is not a registered field of {form_code}")
+        
+        try:
+            conditions, params = [f"form_code = '{form_code}'"], []
+            indexed_by = None
+            for name, condition in (where or {}).items():
+                operator, value = condition if isinstance(condition, tuple) else ('=', condition)
+                operator = operator.lower()
+                if operator not in QUERY_OPERATORS:
+                    raise ValueError(f"Unsupported operator {operator}")
+                column = _column(name)
+                if indexed_by is None and name in fields and operator not in ('!=', 'like', 'is not'):
+                    indexed_by = name
+                if operator == 'in':
+                    values = list(value)
+                    conditions.append(f"{column} IN ({','.join('?' * len(values))})" if values else "0")
+                    params.extend(values)
+                elif operator == 'between':
+                    conditions.append(f"{column} BETWEEN ? AND ?")
+                    params.extend(value)
+                else:
+                    conditions.append(f"{column} {operator.upper()} ?")
+                    params.append(value)
+            
+            orders = [order_by] if isinstance(order_by, str) else list(order_by or [])
+            order_sql = ", ".join(f"{_column(name.lstrip('-'))} {'DESC' if name.startswith('-') else 'ASC'}"
+                                  for name in orders) or "id"
+            if indexed_by is None and orders and orders[0].lstrip('-') in fields:
+                indexed_by = orders[0].lstrip('-')
+            
+            # Without ANALYZE statistics the planner prefers the plain form_code index
+            index_hint = (f"INDEXED BY idx_form_field_{form_code.replace('-', '_')}_{indexed_by}"
+                          if indexed_by else "")
+            selected = "".join(f", {self._field_expression(path)}" for path in fields.values())
+            sql = f'''
+                SELECT id, form_name, created_at, updated_at, form_data{selected}
+                FROM form_data {index_hint}
+                WHERE {" AND ".join(conditions)}
+                ORDER BY {order_sql}
+            '''
+            if limit is not None:
+                sql += " LIMIT ? OFFSET ?"
+                params.extend([limit, offset])
+            
+            with self.read_connection() as conn:
+                results = []
+                for row in conn.execute(sql, params):
+                    form_id, form_name, created_at, updated_at, stored = row[:5]
+                    result = {'id': form_id, 'form_name': form_name, 'created_at': created_at,
+                              'updated_at': updated_at, 'fields': dict(zip(fields, row[5:]))}
+                    if include_data:
+                        result['data'] = self._expand_payload(conn, form_name, self._decode_payload(stored))
+                    results.append(result)
+                return results
+        except Exception as e:
+            print(f"Error querying forms: {e}")
+            return []
+
+    def _create_search_index(self, conn):
+        """Create the FTS5 search index and its document table
+        
+        search_docs maps each indexed item (scope, ref) to the rowid of its
+        search_index entry and keeps the display title. The FTS columns hold
+        normalize_arabic() text, so queries must be normalised the same way.
+        """
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS search_docs (
+                id INTEGER PRIMARY KEY,
+                scope TEXT NOT NULL,
+                ref TEXT NOT NULL,
+                title TEXT NOT NULL,
+                UNIQUE (scope, ref)
+            )
+        ''')
+        conn.execute('''
+            CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5(
+                title_terms, body_terms,
+                tokenize = 'unicode61 remove_diacritics 2'
+            )
+        ''')
+
+    def _index_document(self, conn, scope, ref, title, text):
+        """Insert or replace the search entry of one item"""
+        ref = str(ref)
+        row = conn.execute('SELECT id FROM search_docs WHERE scope = ? AND ref = ?', (scope, ref)).fetchone()
+        if row:
+            doc_id = row[0]
+            conn.execute('UPDATE search_docs SET title = ? WHERE id = ?', (title, doc_id))
+            conn.execute('DELETE FROM search_index WHERE rowid = ?', (doc_id,))
+        else:
+            doc_id = conn.execute('INSERT INTO search_docs (scope, ref, title) VALUES (?, ?, ?)',
+                                  (scope, ref, title)).lastrowid
+        conn.execute('INSERT INTO search_index (rowid, title_terms, body_terms) VALUES (?, ?, ?)',
+                     (doc_id, normalize_arabic(title), normalize_arabic(text)))
+
+    def _unindex_document(self, conn, scope, ref):
+        """Remove the search entry of one item"""
+        row = conn.execute('SELECT id FROM search_docs WHERE scope = ? AND ref = ?', (scope, str(ref))).fetchone()
+        if row:
+            conn.execute('DELETE FROM search_index WHERE rowid = ?', (row[0],))
+            conn.execute('DELETE FROM search_docs WHERE id = ?', (row[0],))
+
+    def _unindex_scope(self, conn, scope):
+        """Remove every search entry of a scope"""
+        conn.execute('DELETE FROM search_index WHERE rowid IN (SELECT id FROM search_docs WHERE scope = ?)', (scope,))
+        conn.execute('DELETE FROM search_docs WHERE scope = ?', (scope,))
+
+    def index_procedures(self, procedures):
+        """Replace the indexed procedure texts (the procedures dict lives in the UI)"""
+        def _index(conn):
+            self._unindex_scope(conn, 'procedure')
+            for name, content in procedures.items():
+                self._index_document(conn, 'procedure', name, name, _payload_search_text(content))
+        
+        return self._finish_write(self.submit_write(_index), None, "Error indexing procedures")
+
+    def rebuild_search_index(self, batch_size=200):
+        """Re-index all stored forms and uploaded files (procedures come from index_procedures)"""
+        def _index_forms(conn, forms):
+            for form in forms:
+                if conn.execute('SELECT 1 FROM form_rows WHERE form_name = ? LIMIT 1', (form['form_name'],)).fetchone():
+                    continue  # Row-stored forms are indexed row by row below
+                self._index_document(conn, 'form', form['id'], form['form_name'], _payload_search_text(form['data']))
+        
+        def _index_rows(conn):
+            self._unindex_scope(conn, 'form_row')
+            rows = conn.execute('SELECT row_id, form_name, row_values FROM form_rows').fetchall()
+            for row_id, form_name, row_values in rows:
+                self._index_document(conn, 'form_row', row_id, form_name, _payload_search_text(json.loads(row_values)))
+        
+        try:
+            self.submit_write(lambda conn: self._unindex_scope(conn, 'form')).result()
+            self.submit_write(_index_rows).result()
+            batch = []
+            for form in self.iter_forms(batch_size=batch_size):
+                batch.append(form)
+                if len(batch) >= batch_size:
+                    self.submit_write(_index_forms, batch).result()
+                    batch = []
+            if batch:
+                self.submit_write(_index_forms, batch).result()
+            
+            def _index_files(conn):
+                self._unindex_scope(conn, 'file')
+                rows = conn.execute('SELECT id, original_name, description FROM uploaded_files').fetchall()
+                for file_id, original_name, description in rows:
+                    self._index_document(conn, 'file', file_id, original_name, description or '')
+            
+            self.submit_write(_index_files).result()
+            return True
+        except Exception as e:
+            print(f"Error rebuilding search index: {e}")
+            return False
+
+    def _backfill_search_index(self):
+        """Build the form/file index once for databases created before search existed"""
+        try:
+            with self.read_connection() as conn:
+                indexed = conn.execute("SELECT 1 FROM search_docs WHERE scope IN ('form', 'form_row', 'file') LIMIT 1").fetchone()
+                stored = conn.execute('''
+                    SELECT EXISTS (SELECT 1 FROM form_data) OR EXISTS (SELECT 1 FROM uploaded_files)
+                ''').fetchone()[0]
+            if stored and not indexed:
+                self.rebuild_search_index()
+        except Exception as e:
+            print(f"Error backfilling search index: {e}")
+
+    def search(self, query, limit=20, scopes=None):
+        """Full-text search over procedures, stored forms, table rows and file descriptions
+        
+        Every word of the query must match as a prefix, with or without the
+        Arabic definite article. Results are ranked by bm25 with title hits
+        weighted above body hits and returned as dicts with scope, ref, title,
+        snippet and rank. Form refs are form_data ids, form_row refs are
+        form_rows ids (the title is the form name), file refs are
+        uploaded_files ids, procedure refs are procedure names.
+        """
+        terms = re.findall(r'\w+', normalize_arabic(query or ''))
+        if not terms:
+            return []
+        # An Arabic word also matches its form with the definite article
+        match = ' AND '.join(
+            f'("{term}"* OR "ال{term}"*)' if ARABIC_WORD_PATTERN.match(term) and not term.startswith('ال')
+            else f'"{term}"*'
+            for term in terms)
+        
+        sql = '''
+            SELECT d.scope, d.ref, d.title,
+                   snippet(search_index, 1, '[', ']', '…', 12),
+                   bm25(search_index, 5.0, 1.0) AS rank
+            FROM search_index
+            JOIN search_docs d ON d.id = search_index.rowid
+            WHERE search_index MATCH ?
+        '''
+        params = [match]
+        if scopes:
+            sql += f" AND d.scope IN ({','.join('?' * len(scopes))})"
+            params.extend(scopes)
+        sql += ' ORDER BY rank LIMIT ?'
+        params.append(limit)
+        
+        try:
+            with self.read_connection() as conn:
+                return [{'scope': scope, 'ref': ref, 'title': title, 'snippet': snippet, 'rank': rank}
+                        for scope, ref, title, snippet, rank in conn.execute(sql, params)]
+        except Exception as e:
+            print(f"Error searching: {e}")
+            return []
+
+    def _run_bulk(self, label, items, chunk_size, write_chunk, prepare=None, progress=None):
+        """Write items in chunks, one writer transaction per chunk, and report throughput
+        
+        prepare(chunk) runs on the calling thread (encoding, hashing, copying)
+        and may drop items, which are counted as skipped. A failed chunk is
+        rolled back and stops the run; earlier chunks stay committed.
+        progress(done, total) is called after each committed chunk (total is
+        None for iterators). Items are consumed one chunk at a time.
+        """
+        if not chunk_size:
+            items = list(items)
+        total = len(items) if hasattr(items, '__len__') else None
+        size = chunk_size or total or 1
+        iterator = iter(items)
+        report = {'items': 0, 'skipped': 0, 'failed': 0, 'chunks': 0, 'seconds': 0.0, 'per_second': 0.0}
+        started = time.perf_counter()
+        start = 0
+        
+        while True:
+            chunk = list(itertools.islice(iterator, size))
+            if not chunk:
+                break
+            try:
+                prepared = prepare(chunk) if prepare else chunk
+                report['skipped'] += len(chunk) - len(prepared)
+                if prepared:
+                    self.submit_write(write_chunk, prepared).result()
+                report['items'] += len(prepared)
+                report['chunks'] += 1
+            except Exception as e:
+                print(f"Error in {label} (items {start + 1}-{start + len(chunk)}): {e}")
+                report['failed'] = len(chunk) + sum(1 for _ in iterator)
+                break
+            start += len(chunk)
+            if progress:
+                progress(start, total)
+        
+        report['seconds'] = round(time.perf_counter() - started, 3)
+        report['per_second'] = round(report['items'] / report['seconds'], 1) if report['seconds'] else float(report['items'])
+        print(f"{label}: {report['items']} items in {report['seconds']}s ({report['per_second']}/s)")
+        return report
+
+    def _bulk_index(self, conn, scope, documents):
+        """Add search entries for new items: documents is a list of (ref, title, text)"""
+        conn.executemany('INSERT INTO search_docs (scope, ref, title) VALUES (?, ?, ?)',
+                         [(scope, str(ref), title) for ref, title, _ in documents])
+        conn.executemany('''
+            INSERT INTO search_index (rowid, title_terms, body_terms)
+            SELECT id, ?, ? FROM search_docs WHERE scope = ? AND ref = ?
+        ''', [(normalize_arabic(title), normalize_arabic(text), scope, str(ref)) for ref, title, text in documents])
+
+    def bulk_save_forms(self, forms, user_id=None, chunk_size=500, progress=None):
+        """Save many forms with executemany, one transaction per chunk
+        
+        forms is a dict {form_name: data} or an iterable of (form_name, data).
+        New forms are inserted in bulk; forms that already exist are updated
+        one by one so their revision history keeps a delta. Returns the
+        throughput report of _run_bulk.
+        """
+        items = list((forms if isinstance(forms, dict) else dict(forms)).items())
+        return self._run_bulk("Bulk save forms", items, chunk_size,
+                              lambda conn, chunk: self._save_forms_chunk(conn, chunk, user_id),
+                              self._prepare_form_items, progress)
+
+    def _prepare_form_items(self, chunk):
+        """Encode (form_name, data[, created_at, updated_at]) items; the last item per name wins"""
+        prepared = {}
+        for item in chunk:
+            name, data = item[0], item[1]
+            created_at, updated_at = item[2:4] if len(item) >= 4 else (None, None)
+            prepared[name] = (name, *self._encode_payload(data, name), _payload_search_text(data), created_at, updated_at)
+        return list(prepared.values())
+
+    def _save_forms_chunk(self, conn, chunk, user_id, skip_existing=False):
+        """Writer job of bulk_save_forms: insert new forms with executemany, update existing ones"""
+        names = json.dumps([item[0] for item in chunk], ensure_ascii=False)
+        existing = {name for (name,) in conn.execute(
+            'SELECT form_name FROM form_data WHERE form_name IN (SELECT value FROM json_each(?))', (names,))}
+        new = []
+        for name, stored, metadata, text, _, _ in chunk:
+            if name not in existing:
+                new.append((name, stored, metadata, text))
+            elif not skip_existing:
+                self._write_form_data(conn, name, stored, metadata, user_id, True, text)
+        
+        if new:
+            conn.executemany('''
+                INSERT INTO form_data (form_name, form_data, created_by, form_code, instance_key,
+                                       record_count, payload_bytes, payload_hash)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ''', [(name, stored, user_id, *self.split_form_name(name), *metadata)
+                  for name, stored, metadata, _ in new])
+            ids = dict(conn.execute(
+                'SELECT form_name, id FROM form_data WHERE form_name IN (SELECT value FROM json_each(?))',
+                (json.dumps([name for name, *_ in new], ensure_ascii=False),)))
+            self._bulk_index(conn, 'form', [(ids[name], name, text) for name, _, _, text in new])
+            conn.executemany('''
+                INSERT INTO form_revisions (form_name, revision, kind, payload, created_by)
+                VALUES (?, (SELECT COALESCE(MAX(revision), 0) + 1 FROM form_revisions WHERE form_name = ?),
+                        'snapshot', ?, ?)
+            ''', [(name, name, stored, user_id) for name, stored, _, _ in new])
+            self._invalidate_payloads(row_ids=list(ids.values()), form_names=list(ids))
+            self._log_activity_async(user_id, f"إضافة {len(new)} نموذج دفعة واحدة", "form_data", None)
+        
+        # Imported and restored forms keep their original dates
+        conn.executemany('UPDATE form_data SET created_at = ?, updated_at = ? WHERE form_name = ?',
+                         [(created_at, updated_at, name) for name, _, _, _, created_at, updated_at in chunk
+                          if created_at and updated_at and not (skip_existing and name in existing)])
+        return len(chunk)
+
+    def bulk_insert_rows(self, form_name, rows, user_id=None, chunk_size=1000, progress=None):
+        """Append many rows to a tabular form with executemany, one transaction per chunk"""
+        def _prepare(chunk):
+            return [(values, json.dumps(values, ensure_ascii=False, separators=(',', ':'))) for values in chunk]
+        
+        def _insert_chunk(conn, chunk):
+            form_id = self._row_storage_form(conn, form_name, user_id)
+            self._begin_revision(conn, form_name)
+            start_index, start_position = conn.execute(
+                'SELECT COUNT(*), COALESCE(MAX(position), -1) + 1 FROM form_rows WHERE form_name = ?',
+                (form_name,)).fetchone()
+            form_code = self.extract_form_code(form_name)
+            conn.executemany('''
+                INSERT INTO form_rows (form_name, form_code, position, row_values, updated_by)
+                VALUES (?, ?, ?, ?, ?)
+            ''', [(form_name, form_code, start_position + offset, row_values, user_id)
+                  for offset, (_, row_values) in enumerate(chunk)])
+            row_ids = [row_id for (row_id,) in conn.execute(
+                'SELECT row_id FROM form_rows WHERE form_name = ? AND position >= ? ORDER BY position',
+                (form_name, start_position))]
+            self._bulk_index(conn, 'form_row', [(row_id, form_name, _payload_search_text(values))
+                                                for row_id, (values, _) in zip(row_ids, chunk)])
+            self._touch_form_rows(conn, form_id, form_name,
+                                  [(row_id, start_position + offset, row_values)
+                                   for offset, (row_id, (_, row_values)) in enumerate(zip(row_ids, chunk))])
+            self._record_revision(conn, form_name, user_id,
+                                  [{'op': 'add', 'path': f"/{start_index + offset}", 'value': values}
+                                   for offset, (values, _) in enumerate(chunk)],
+                                  lambda: self._load_form_rows(conn, form_name))
+            self._log_activity_async(user_id, f"إضافة {len(chunk)} سجل إلى النموذج دفعة واحدة", "form_data", form_id)
+            return len(chunk)
+        
+        return self._run_bulk(f"Bulk insert rows into {form_name}", rows, chunk_size, _insert_chunk, _prepare, progress)
+
+    def bulk_log_activity(self, entries, chunk_size=1000, progress=None):
+        """Write many activity_log rows directly (bypassing the group-commit buffer)
+        
+        Each entry is a dict with the log_activity arguments (user_id, action,
+        table_name, record_id, old_values, new_values) and an optional
+        timestamp, so imported history keeps its original dates.
+        """
+        def _prepare(chunk):
+            now = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+            return [(entry.get('user_id'), entry['action'], entry.get('table_name'), entry.get('record_id'),
+                     json.dumps(entry['old_values'], ensure_ascii=False) if entry.get('old_values') else None,
+                     json.dumps(entry['new_values'], ensure_ascii=False) if entry.get('new_values') else None,
+                     entry.get('timestamp') or now)
+                    for entry in chunk]
+        
+        def _insert_chunk(conn, chunk):
+            self._insert_activity_rows(conn, chunk)
+            return len(chunk)
+        
+        return self._run_bulk("Bulk log activity", entries, chunk_size, _insert_chunk, _prepare, progress)
+
+    def bulk_register_files(self, files, user_id=None, chunk_size=200, progress=None):
+        """Copy and register many files with executemany, one transaction per chunk
+        
+        Each item is a file path or a dict with file_path and optional
+        category, related_table, related_id, description and original_name.
+        Contents already in the store are not copied again. Missing files are
+        skipped; contents copied for a chunk that fails, whether while copying
+        or while registering, are removed.
+        """
+        def _discard(prepared):
+            for row, _, created in prepared:
+                if created:
+                    self._discard_orphan_blob(row[-1], row[2])
+        
+        def _prepare(chunk):
+            prepared = []
+            try:
+                for item in chunk:
+                    item = {'file_path': item} if isinstance(item, (str, Path)) else item
+                    file_path = str(item['file_path'])
+                    if not os.path.exists(file_path):
+                        print(f"الملف غير موجود: {file_path}")
+                        continue
+                    original_name = item.get('original_name') or os.path.basename(file_path)
+                    final_path, created, content_hash, file_hash, file_size = self._ingest_file(file_path)
+                    row = (original_name, content_hash, final_path, os.path.splitext(original_name)[1].lower(),
+                           file_size, file_hash,
+                           item.get('category') or 'general', item.get('related_table'), item.get('related_id'),
+                           user_id, item.get('description'), content_hash)
+                    prepared.append((row, file_path, created))
+            except Exception:
+                # The chunk never reaches the writer: remove what was already copied for it
+                _discard(prepared)
+                raise
+            return prepared
+        
+        def _register_chunk(conn, chunk):
+            # A savepoint lets a failed chunk be undone before its new contents are discarded
+            conn.execute('SAVEPOINT register_files')
+            try:
+                for index, (row, file_path, created) in enumerate(chunk):
+                    if not os.path.exists(row[2]):
+                        # Released since _prepare: copy it again, checking it is still the same content
+                        blob_path, recreated, content_hash, _, _ = self._ingest_file(file_path)
+                        chunk[index] = (row, file_path, created or recreated)
+                        if content_hash != row[-1]:
+                            if recreated:
+                                self._discard_orphan_blob(content_hash, blob_path)
+                            raise ValueError(f"تغير الملف المصدر أثناء الرفع: {file_path}")
+                first_id = conn.execute('SELECT COALESCE(MAX(id), 0) FROM uploaded_files').fetchone()[0]
+                conn.executemany('''
+                    INSERT INTO uploaded_files
+                    (original_name, stored_name, file_path, file_type, file_size, file_hash,
+                     category, related_table, related_id, uploaded_by, description, content_hash)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ''', [row for row, _, _ in chunk])
+                self._bulk_index(conn, 'file', conn.execute(
+                    'SELECT id, original_name, COALESCE(description, \'\') FROM uploaded_files WHERE id > ?',
+                    (first_id,)).fetchall())
+            except Exception:
+                conn.execute('ROLLBACK TO register_files')
+                conn.execute('RELEASE register_files')
+                _discard(chunk)
+                raise
+            self._log_activity_async(user_id, f"رفع {len(chunk)} ملف دفعة واحدة", "uploaded_files", None)
+            return len(chunk)
+        
+        return self._run_bulk("Bulk register files", files, chunk_size, _register_chunk, _prepare, progress)
+
     def export_form_to_pdf(self, form_data, form_name, output_path=None):
         """Export form data to PDF using reportlab"""
         try:
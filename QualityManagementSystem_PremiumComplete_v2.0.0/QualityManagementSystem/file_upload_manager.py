@@ -8,8 +8,11 @@ Handles file upload UI and integration with database
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
 import os
-import sqlite3
+import queue
+import threading
+import time
 from datetime import datetime
+from database_manager import UploadCancelled
 
 class FileUploadManager:
     def __init__(self, parent, database_manager, current_user):
@@ -17,6 +20,17 @@ class FileUploadManager:
         self.db_manager = database_manager
         self.current_user = current_user
         
+        # قائمة الملفات تُحمّل صفحة صفحة أثناء التمرير
+        self.files_page_size = 200
+        self._file_pages = {}  # مسار الجدول -> {'category', 'cursor', 'loading', 'done'}
+        
+        # خيوط الرفع تضع التقدم والنتائج في طابور تفرّغه الحلقة الرئيسية
+        self.upload_poll_ms = 100
+        self.progress_interval = 0.1  # ثوانٍ بين تحديثين لشريط التقدم
+        self._upload_events = queue.Queue()
+        self._active_uploads = 0
+        self._polling_uploads = False
+        
     def create_file_upload_dialog(self, category='general', related_table=None, related_id=None):
         """إنشاء نافذة رفع الملفات"""
         upload_window = tk.Toplevel(self.parent)
@@ -113,7 +127,7 @@ class FileUploadManager:
         
         category_combo = ttk.Combobox(category_frame,
                                     textvariable=file_category,
-                                    values=['documents', 'procedures', 'forms', 'certificates', 'reports', 'general'],
+                                    values=['documents', 'procedures', 'forms', 'certificates', 'reports', 'recordings', 'archives', 'general'],
                                     state='readonly',
                                     font=("Arial", 10))
         category_combo.pack(anchor=tk.E, pady=5)
@@ -252,6 +266,7 @@ class FileUploadManager:
                 ("ملفات Excel", "*.xls;*.xlsx"),
                 ("ملفات نصية", "*.txt"),
                 ("ملفات الصور", "*.jpg;*.jpeg;*.png"),
+                ("التسجيلات والأرشيف", "*.mp4;*.mp3;*.wav;*.m4a;*.zip;*.rar;*.7z"),
                 ("جميع الملفات", "*.*")
             ]
         )
@@ -260,7 +275,7 @@ class FileUploadManager:
             file_var.set(file_path)
     
     def upload_file(self, file_path, category, description, related_table, related_id, window):
-        """رفع الملف وحفظه"""
+        """رفع الملف وحفظه (في الخلفية مع شريط تقدم وزر إلغاء)"""
         if not file_path:
             messagebox.showwarning("تحذير", "الرجاء اختيار ملف أولاً")
             return
@@ -270,45 +285,177 @@ class FileUploadManager:
             return
         
         try:
-            # التحقق من حجم الملف (أقصى حد 50 ميجا)
+            # التحقق من حجم الملف (الحد الأقصى حسب الفئة)
             file_size = os.path.getsize(file_path)
-            if file_size > 50 * 1024 * 1024:  # 50 MB
-                messagebox.showerror("خطأ", "حجم الملف كبير جداً. الحد الأقصى 50 ميجابايت")
+            size_limit = self.db_manager.get_upload_size_limit(category)
+            if file_size > size_limit:
+                messagebox.showerror("خطأ", f"حجم الملف كبير جداً. الحد الأقصى لهذه الفئة {self.format_file_size(size_limit)}")
                 return
-            
-            # رفع الملف
-            result = self.db_manager.save_file(
+        except Exception as e:
+            messagebox.showerror("خطأ", f"حدث خطأ أثناء رفع الملف:\n{str(e)}")
+            return
+        
+        user_id = self.current_user['id'] if self.current_user else None
+        
+        # الملفات الكبيرة تُنسخ على أجزاء ويمكن استئنافها بعد الإلغاء أو الانقطاع
+        self.start_background_upload(
+            os.path.basename(file_path),
+            category,
+            lambda progress, cancel_event, callback: self.db_manager.save_file_async(
                 file_path=file_path,
                 category=category,
                 related_table=related_table,
                 related_id=related_id,
-                user_id=self.current_user['id'] if self.current_user else None,
-                description=description
+                user_id=user_id,
+                description=description,
+                progress=progress,
+                cancel_event=cancel_event,
+                callback=callback
             )
+        )
+        
+        # إغلاق نافذة الاختيار حتى يمكن بدء رفع ملفات أخرى بالتوازي
+        window.destroy()
+    
+    def start_background_upload(self, file_name, category, submit):
+        """تشغيل رفع في الخلفية مع نافذة تقدم؛ submit(progress, cancel_event, callback) يعيد Future"""
+        user_id = self.current_user['id'] if self.current_user else None
+        cancel_event = threading.Event()
+        progress_window, progress_bar = self.create_upload_progress_window(file_name, cancel_event)
+        
+        def on_progress(percent):
+            if progress_window.winfo_exists():
+                progress_bar["value"] = percent
+        
+        last_report = {'percent': -1, 'time': 0.0}
+        
+        def report_progress(copied, total):
+            # يعمل في خيط الرفع: تحديث واحد لكل نسبة مئوية وبحد أقصى كل progress_interval
+            percent = int(copied * 100 / total) if total else 0
+            now = time.monotonic()
+            if percent == last_report['percent'] or (now - last_report['time'] < self.progress_interval and percent < 100):
+                return
+            last_report.update(percent=percent, time=now)
+            self._upload_events.put((on_progress, (percent,)))
+        
+        def on_finished(future):
+            self._active_uploads -= 1
+            if progress_window.winfo_exists():
+                progress_window.destroy()
+            try:
+                result = future.result()
+            except UploadCancelled as e:
+                messagebox.showinfo("تم الإلغاء", str(e))
+                return
+            except Exception as e:
+                messagebox.showerror("خطأ", f"حدث خطأ أثناء رفع الملف:\n{str(e)}")
+                return
             
-            if result:
-                # تسجيل النشاط
+            messagebox.showinfo("نجح الرفع", 
+                              f"تم رفع الملف بنجاح!\n"
+                              f"اسم الملف: {result['original_name']}\n"
+                              f"الحجم: {self.format_file_size(result['file_size'])}\n"
+                              f"الفئة: {category}")
+        
+        def on_done(future):
+            # يعمل في خيط الرفع: تسجيل النشاط هنا ثم تحديث الواجهة من الحلقة الرئيسية
+            if not future.cancelled() and future.exception() is None:
+                result = future.result()
                 self.db_manager.log_activity(
-                    user_id=self.current_user['id'] if self.current_user else None,
+                    user_id=user_id,
                     action=f"رفع ملف: {result['original_name']}",
                     table_name="uploaded_files",
                     record_id=result['file_id']
                 )
-                
-                messagebox.showinfo("نجح الرفع", 
-                                  f"تم رفع الملف بنجاح!\n"
-                                  f"اسم الملف: {result['original_name']}\n"
-                                  f"الحجم: {self.format_file_size(result['file_size'])}\n"
-                                  f"الفئة: {category}")
-                window.destroy()
-            else:
-                messagebox.showerror("خطأ", "فشل في رفع الملف")
-                
-        except Exception as e:
-            messagebox.showerror("خطأ", f"حدث خطأ أثناء رفع الملف:\n{str(e)}")
+            self._upload_events.put((on_finished, (future,)))
+        
+        # النسخ والتسجيل في الخلفية؛ لا تُلمس Tk إلا من الحلقة الرئيسية
+        try:
+            future = submit(report_progress, cancel_event, on_done)
+        except Exception:
+            progress_window.destroy()
+            raise
+        self._active_uploads += 1
+        if not self._polling_uploads:
+            self._polling_uploads = True
+            self.poll_upload_events()
+        return future
     
-    def create_file_manager_window(self):
-        """إنشاء نافذة إدارة الملفات"""
+    def poll_upload_events(self):
+        """تنفيذ أحداث الرفع المنتظرة في الحلقة الرئيسية، والاستمرار ما دام هناك رفع جارٍ"""
+        while True:
+            try:
+                handler, args = self._upload_events.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                handler(*args)
+            except Exception as e:
+                print(f"Error handling upload event: {e}")
+        
+        if self._active_uploads > 0:
+            self.parent.after(self.upload_poll_ms, self.poll_upload_events)
+        else:
+            self._polling_uploads = False
+    
+    def resume_interrupted_uploads(self):
+        """استئناف عمليات الرفع المتوقفة أو المنقطعة للمستخدم الحالي"""
+        user_id = self.current_user['id'] if self.current_user else None
+        sessions = self.db_manager.list_upload_sessions(user_id)
+        if not sessions:
+            messagebox.showinfo("استئناف الرفع", "لا توجد عمليات رفع متوقفة")
+            return
+        
+        for session in sessions:
+            answer = messagebox.askyesnocancel(
+                "استئناف الرفع",
+                f"الملف: {session['original_name']}\n"
+                f"تم رفع {self.format_file_size(session['bytes_done'])} من {self.format_file_size(session['file_size'])}\n\n"
+                f"نعم: استئناف الرفع\nلا: إلغاء الرفع نهائياً\nإلغاء: تخطي")
+            if answer:
+                self.start_background_upload(
+                    session['original_name'],
+                    session['category'],
+                    lambda progress, cancel_event, callback, session_id=session['id']:
+                        self.db_manager.resume_upload_async(session_id, progress, cancel_event, callback)
+                )
+            elif answer is False:
+                self.db_manager.cancel_upload_session(session['id'])
+    
+    def create_upload_progress_window(self, file_name, cancel_event):
+        """نافذة تقدم رفع ملف واحد مع زر إلغاء؛ تعيد (النافذة، شريط التقدم)"""
+        progress_window = tk.Toplevel(self.parent)
+        progress_window.title("رفع ملف")
+        progress_window.geometry("420x150")
+        progress_window.configure(bg="#2D0A4D")
+        progress_window.transient(self.parent)
+        
+        tk.Label(progress_window,
+                text=f"جاري رفع: {file_name}",
+                font=("Arial", 11),
+                fg="white",
+                bg="#2D0A4D").pack(pady=(20, 10))
+        
+        progress_bar = ttk.Progressbar(progress_window, length=360, mode="determinate")
+        progress_bar.pack(pady=5)
+        
+        def cancel_upload():
+            cancel_event.set()
+            cancel_btn.config(state=tk.DISABLED, text="جاري الإلغاء...")
+        
+        cancel_btn = tk.Button(progress_window,
+                             text="❌ إلغاء الرفع",
+                             font=("Arial", 10, "bold"),
+                             fg="white",
+                             bg="#DC3545",
+                             command=cancel_upload)
+        cancel_btn.pack(pady=10)
+        progress_window.protocol("WM_DELETE_WINDOW", cancel_upload)
+        
+        return progress_window, progress_bar
+    
+    def create_file_manager_window(self, select_file_id=None):
+        """إنشاء نافذة إدارة الملفات (مع تحديد ملف معين إن وُجد)"""
         manager_window = tk.Toplevel(self.parent)
         manager_window.title("إدارة الملفات")
         manager_window.geometry("900x700")
@@ -347,7 +494,7 @@ class FileUploadManager:
         category_var = tk.StringVar(value="الكل")
         category_filter = ttk.Combobox(filter_frame,
                                      textvariable=category_var,
-                                     values=['الكل', 'documents', 'procedures', 'forms', 'certificates', 'reports', 'general'],
+                                     values=['الكل', 'documents', 'procedures', 'forms', 'certificates', 'reports', 'recordings', 'archives', 'general'],
                                      state='readonly',
                                      width=15)
         category_filter.pack(side=tk.LEFT, padx=5)
@@ -384,9 +531,20 @@ class FileUploadManager:
         files_tree.column("تاريخ الرفع", width=120)
         files_tree.column("الوصف", width=200)
         
-        # شريط التمرير
+        # شريط التمرير: الاقتراب من نهاية المحمّل يجلب الصفحة التالية
         scrollbar = ttk.Scrollbar(files_frame, orient="vertical", command=files_tree.yview)
-        files_tree.configure(yscrollcommand=scrollbar.set)
+        
+        def on_tree_scroll(first, last):
+            scrollbar.set(first, last)
+            if float(last) > 0.9:
+                files_tree.after_idle(load_if_near_end)
+        
+        def load_if_near_end():
+            # عدة أحداث تمرير قد تصل قبل التحميل؛ يُعاد التحقق من الموضع عند التنفيذ
+            if files_tree.winfo_exists() and files_tree.yview()[1] > 0.9:
+                self.load_next_files_page(files_tree)
+        
+        files_tree.configure(yscrollcommand=on_tree_scroll)
         
         files_tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
         scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
@@ -419,6 +577,14 @@ class FileUploadManager:
                               command=lambda: self.refresh_files_list(files_tree, category_var.get()))
         refresh_btn.pack(side=tk.LEFT, padx=5)
         
+        resume_btn = tk.Button(actions_frame,
+                             text="استئناف الرفع المتوقف",
+                             font=("Arial", 10, "bold"),
+                             fg="white",
+                             bg="#5A2A9C",
+                             command=self.resume_interrupted_uploads)
+        resume_btn.pack(side=tk.LEFT, padx=5)
+        
         # ربط تغيير الفئة بتحديث القائمة
         category_filter.bind('<<ComboboxSelected>>', 
                            lambda e: self.refresh_files_list(files_tree, category_var.get()))
@@ -426,47 +592,61 @@ class FileUploadManager:
         # تحميل الملفات الأولي
         self.refresh_files_list(files_tree, "الكل")
         
+        # تحديد الملف المطلوب (من نتائج البحث)؛ إن لم يكن في الصفحة الأولى تُعرض القائمة ابتداءً منه
+        if select_file_id is not None:
+            if not files_tree.exists(str(select_file_id)):
+                file_info = self.db_manager.get_file_info(select_file_id)
+                if file_info:
+                    self.refresh_files_list(files_tree, "الكل",
+                                            start_after=(file_info['upload_date'], int(select_file_id) + 1))
+            if files_tree.exists(str(select_file_id)):
+                files_tree.selection_set(str(select_file_id))
+                files_tree.see(str(select_file_id))
+        
         return manager_window
     
-    def refresh_files_list(self, tree, category):
-        """تحديث قائمة الملفات"""
+    def refresh_files_list(self, tree, category, start_after=None):
+        """تحديث قائمة الملفات (الصفحة الأولى فقط؛ الباقي يُحمّل عند التمرير)"""
         # مسح الجدول
-        for item in tree.get_children():
-            tree.delete(item)
+        tree.delete(*tree.get_children())
+        self._file_pages[str(tree)] = {
+            'category': None if category == "الكل" else category,
+            'cursor': start_after,
+            'loading': False,
+            'done': False
+        }
+        self.load_next_files_page(tree)
+    
+    def load_next_files_page(self, tree):
+        """إضافة الصفحة التالية من الملفات إلى الجدول"""
+        state = self._file_pages.get(str(tree))
+        if not state or state['done'] or state['loading'] or not tree.winfo_exists():
+            return
         
+        state['loading'] = True
         try:
-            # جلب الملفات من قاعدة البيانات
-            if category == "الكل":
-                conn = sqlite3.connect(self.db_manager.db_path)
-                cursor = conn.cursor()
-                cursor.execute('''
-                    SELECT id, original_name, category, file_size, upload_date, description
-                    FROM uploaded_files
-                    ORDER BY upload_date DESC
-                ''')
-                files = cursor.fetchall()
-                conn.close()
-            else:
-                files_data = self.db_manager.get_files_by_category(category)
-                if files_data:
-                    files = [(f['id'], f['original_name'], f.get('category', category), f['file_size'], 
-                             f['upload_date'], f.get('description', '')) for f in files_data]
-                else:
-                    files = []
+            # جلب صفحة من الملفات من قاعدة البيانات (ترقيم بالمفتاح على فهرس الفئة/التاريخ)
+            files, state['cursor'] = self.db_manager.list_files(category=state['category'],
+                                                                after=state['cursor'],
+                                                                limit=self.files_page_size)
+            state['done'] = state['cursor'] is None
             
-            # إضافة الملفات للجدول
+            # إضافة الملفات للجدول (معرف العنصر هو رقم الملف)
             for file_info in files:
-                tree.insert("", tk.END, values=(
-                    file_info[0],  # ID
-                    file_info[1],  # اسم الملف
-                    file_info[2],  # الفئة
-                    self.format_file_size(file_info[3]),  # الحجم
-                    file_info[4][:19] if file_info[4] else "",  # التاريخ
-                    file_info[5] if file_info[5] else ""  # الوصف
+                tree.insert("", tk.END, iid=str(file_info['id']), values=(
+                    file_info['id'],
+                    file_info['original_name'],
+                    file_info['category'],
+                    self.format_file_size(file_info['file_size'] or 0),
+                    file_info['upload_date'][:19] if file_info['upload_date'] else "",
+                    file_info['description'] if file_info['description'] else ""
                 ))
                 
         except Exception as e:
+            state['done'] = True
             messagebox.showerror("خطأ", f"فشل في تحميل قائمة الملفات:\n{str(e)}")
+        finally:
+            state['loading'] = False
     
     def download_selected_file(self, tree):
         """تحميل الملف المحدد"""
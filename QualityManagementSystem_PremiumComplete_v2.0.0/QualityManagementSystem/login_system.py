@@ -282,8 +282,7 @@ class LoginSystem:
             tree.delete(item)
         
         try:
-            import sqlite3
-            with sqlite3.connect(self.db_manager.db_path) as conn:
+            with self.db_manager.read_connection() as conn:
                 cursor = conn.cursor()
                 cursor.execute('''
                     SELECT id, username, full_name, email, role, is_active, last_login
@@ -481,30 +480,34 @@ class LoginSystem:
             # تشفير كلمة المرور
             password_hash = hashlib.sha256(password.encode()).hexdigest()
             
-            # إدراج المستخدم في قاعدة البيانات
-            import sqlite3
-            with sqlite3.connect(self.db_manager.db_path) as conn:
+            # إدراج المستخدم في قاعدة البيانات (اسم المستخدم المكرر لا يُدرج)
+            # الرسائل تُعرض بعد إغلاق المعاملة حتى لا يبقى قفل الكتابة محجوزاً
+            with self.db_manager.write_connection() as conn:
                 cursor = conn.cursor()
                 cursor.execute('''
                     INSERT INTO users (username, password_hash, full_name, email, role)
                     VALUES (?, ?, ?, ?, ?)
+                    ON CONFLICT(username) DO NOTHING
                 ''', (username, password_hash, full_name, email, role))
                 
+                created = cursor.rowcount != 0
                 user_id = cursor.lastrowid
-                conn.commit()
                 
-                # تسجيل النشاط
-                self.db_manager.log_activity(
-                    user_id=self.current_user['id'],
-                    action=f"إنشاء مستخدم جديد: {username}",
-                    table_name="users",
-                    record_id=user_id
-                )
-                
-                messagebox.showinfo("تم الإنشاء", f"تم إنشاء المستخدم {username} بنجاح")
-                window.destroy()
+                if created:
+                    # تسجيل النشاط
+                    self.db_manager.log_activity(
+                        user_id=self.current_user['id'],
+                        action=f"إنشاء مستخدم جديد: {username}",
+                        table_name="users",
+                        record_id=user_id
+                    )
+            
+            if not created:
+                messagebox.showerror("خطأ", "اسم المستخدم موجود مسبقاً")
+                return
+            
+            messagebox.showinfo("تم الإنشاء", f"تم إنشاء المستخدم {username} بنجاح")
+            window.destroy()
                 
-        except sqlite3.IntegrityError:
-            messagebox.showerror("خطأ", "اسم المستخدم موجود مسبقاً")
         except Exception as e:
             messagebox.showerror("خطأ", f"فشل في إنشاء المستخدم:\n{str(e)}")
@@ -2,7 +2,6 @@ import tkinter as tk
 from tkinter import ttk, messagebox, filedialog, scrolledtext
 import os
 import json
-import sqlite3
 from datetime import datetime
 
 # Premium Arabic Text Rendering
@@ -29,6 +28,8 @@ class QBPerfectFormSystem:
         if not self.db_manager:
             from database_manager import DatabaseManager
             self.db_manager = DatabaseManager()
+            self.db_manager.queue_callbacks = True
+            self.poll_db_callbacks()
         
         # Exact QB Academy Premium Colors
         self.premium_colors = {
@@ -435,6 +436,11 @@ class QBPerfectFormSystem:
             return self.root.format_arabic_text(text)
         return text
 
+    def poll_db_callbacks(self):
+        """Run database callbacks queued by the writer thread (own database manager only)"""
+        self.db_manager.run_queued_callbacks()
+        self.root.after(50, self.poll_db_callbacks)
+
     def save_form(self, form_name):
         """Save form data to database"""
         try:
@@ -463,18 +469,20 @@ class QBPerfectFormSystem:
             # Get user ID
             user_id = self.current_user.get('id', 1) if self.current_user else 1
             
-            # Save to database using the new instance method
-            instance_id = self.db_manager.save_form_instance(
+            def on_saved(instance_id):
+                if instance_id:
+                    messagebox.showinfo("نجح الحفظ", f"تم حفظ {form_name} بنجاح\nمعرف السجل: {instance_id}")
+                else:
+                    messagebox.showerror("خطأ", "فشل في حفظ النموذج في قاعدة البيانات")
+            
+            # Save to database using the new instance method (on the writer thread)
+            self.db_manager.save_form_instance(
                 form_name=form_name,
                 data=data,
-                user_id=user_id
+                user_id=user_id,
+                callback=on_saved
             )
             
-            if instance_id:
-                messagebox.showinfo("نجح الحفظ", f"تم حفظ {form_name} بنجاح\nمعرف السجل: {instance_id}")
-            else:
-                messagebox.showerror("خطأ", "فشل في حفظ النموذج في قاعدة البيانات")
-            
         except Exception as e:
             messagebox.showerror("خطأ", f"فشل في حفظ النموذج: {str(e)}")
 
@@ -842,17 +850,20 @@ class QBPerfectFormSystem:
                     
                     # Update instance in database
                     user_id = self.current_user.get('id', 1) if self.current_user else 1
-                    success = self.db_manager.update_form_data(
+                    def on_saved(success):
+                        if success:
+                            messagebox.showinfo("تم التحديث", "تم تحديث النموذج بنجاح")
+                            data_window.destroy()
+                        else:
+                            messagebox.showerror("خطأ", "فشل في تحديث النموذج")
+                    
+                    # Saved on the writer thread; on_saved runs on the Tk thread
+                    self.db_manager.update_form_data(
                         form_name=instance['form_name'],
                         data=updated_data,
-                        user_id=user_id
+                        user_id=user_id,
+                        callback=on_saved
                     )
-                    
-                    if success:
-                        messagebox.showinfo("تم التحديث", "تم تحديث النموذج بنجاح")
-                        data_window.destroy()
-                    else:
-                        messagebox.showerror("خطأ", "فشل في تحديث النموذج")
                         
                 except Exception as e:
                     messagebox.showerror("خطأ", f"فشل في حفظ التغييرات: {str(e)}")
@@ -994,6 +1005,9 @@ class QBApp:
         
         # Initialize database and components
         self.db_manager = DatabaseManager()
+        # Save/backup callbacks are queued by the database threads and run here on the Tk thread
+        self.db_manager.queue_callbacks = True
+        self.poll_db_callbacks()
         
         # Ensure forms table is created before proceeding
         self.db_manager.create_forms_table()
@@ -1016,6 +1030,11 @@ class QBApp:
         formatted_text = self.replace_app_name(text)
         return self.arabic_renderer.reshape_arabic_text(formatted_text)
     
+    def poll_db_callbacks(self):
+        """Run database callbacks queued by the writer/backup threads"""
+        self.db_manager.run_queued_callbacks()
+        self.root.after(50, self.poll_db_callbacks)
+    
     def apply_premium_style(self, widget, text, style_type='body'):
         """Apply premium Arabic styling to a widget"""
         formatted_text = self.format_arabic_text(text)
@@ -1107,6 +1126,20 @@ class QBApp:
                                        command=self.show_self_assessment)
         self_assessment_btn.pack(side=tk.LEFT, padx=20)
         
+        # مربع البحث في الإجراءات والنماذج والملفات
+        search_var = tk.StringVar()
+        search_btn = tk.Button(title_container,
+                              text="🔍 بحث",
+                              font=self.fonts['button'],
+                              fg="white",
+                              bg=self.premium_colors['accent'],
+                              command=lambda: self.show_search_results(search_var.get()))
+        search_btn.pack(side=tk.LEFT, padx=(0, 5))
+        search_entry = tk.Entry(title_container, textvariable=search_var,
+                               font=self.fonts['body'], width=30, justify='right')
+        search_entry.pack(side=tk.LEFT, padx=5)
+        search_entry.bind('<Return>', lambda e: self.show_search_results(search_var.get()))
+        
         # Premium Main Content with optimized padding
         main_frame = tk.Frame(self.root, bg=self.premium_colors['background'])
         main_frame.pack(fill=tk.BOTH, expand=True, padx=15, pady=5)
@@ -1643,6 +1676,56 @@ class QBApp:
                               bg="#2D0A4D")
         footer_label.pack(pady=(40, 10))
     
+    def show_search_results(self, query):
+        """Search procedures, forms and files; jump straight to a single hit"""
+        if not query.strip():
+            return
+        results = self.db_manager.search(query, limit=50)
+        if not results:
+            messagebox.showinfo("البحث", f"لا توجد نتائج لـ: {query}")
+            return
+        if len(results) == 1:
+            self.open_search_result(results[0])
+            return
+        
+        results_window = tk.Toplevel(self.root)
+        results_window.title(f"نتائج البحث: {query}")
+        results_window.geometry("800x450")
+        results_window.configure(bg="#2D0A4D")
+        
+        scope_labels = {'procedure': 'إجراء', 'form': 'نموذج', 'form_row': 'سجل', 'file': 'ملف'}
+        results_list = tk.Listbox(results_window, font=self.fonts['body'], justify='right',
+                                  bg="#3C1361", fg="white", selectbackground="#5A2A9C")
+        for result in results:
+            results_list.insert(tk.END, f"[{scope_labels.get(result['scope'], result['scope'])}] "
+                                        f"{result['title']} — {result['snippet']}")
+        results_list.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+        results_list.selection_set(0)
+        results_list.focus_set()
+        
+        def _open_selected(event=None):
+            selection = results_list.curselection()
+            if selection:
+                results_window.destroy()
+                self.open_search_result(results[selection[0]])
+        
+        results_list.bind('<Double-Button-1>', _open_selected)
+        results_list.bind('<Return>', _open_selected)
+    
+    def open_search_result(self, result):
+        """Open the procedure, form or file a search result points to"""
+        if result['scope'] == 'procedure':
+            self.show_procedure(result['ref'])
+        elif result['scope'] == 'form_row':
+            self.open_form(result['title'])
+        elif result['scope'] == 'form':
+            if result['title'] in self.forms:
+                self.open_form(result['title'])
+            else:
+                self.qb_perfect_form_system.view_form_instance(int(result['ref']), result['title'])
+        elif result['scope'] == 'file' and self.file_upload_manager:
+            self.file_upload_manager.create_file_manager_window(select_file_id=int(result['ref']))
+    
     def load_data(self):
         """Load procedures and forms data from database"""
         # Create forms table if it doesn't exist
@@ -3085,6 +3168,9 @@ class QBApp:
         
         # Load forms structure and data from database
         self.forms = self.load_forms_from_database()
+        
+        # Procedures are static texts; keep their search entries in step
+        self.db_manager.index_procedures(self.procedures)
 
     def load_forms_from_database(self):
         """Load forms data from database with fallback to default structure"""
@@ -6371,8 +6457,10 @@ ________________________________________
         }
         }
         
-        # Load data from database
-        stored_forms_data = self.db_manager.get_all_forms_data()
+        # Load data from database (only the forms this screen knows about);
+        # take the watermark first so refresh_forms_data picks up anything newer
+        self._forms_watermark = self.db_manager.get_change_watermark()
+        stored_forms_data = self.db_manager.get_forms(list(default_forms))
         
         # Merge default structure with stored data
         for form_name, form_structure in default_forms.items():
@@ -6385,16 +6473,16 @@ ________________________________________
     def refresh_forms_data(self):
         """Refresh forms data from database"""
         try:
-            # Reload data from database
-            stored_forms_data = self.db_manager.get_all_forms_data()
+            # Pull only the forms changed since the last load/refresh
+            changed, deleted, watermark = self.db_manager.get_form_changes(
+                getattr(self, '_forms_watermark', 0), list(self.forms))
             
-            # Update forms data
-            for form_name in self.forms:
-                if form_name in stored_forms_data:
-                    self.forms[form_name]["البيانات"] = stored_forms_data[form_name]['data']
-                else:
-                    # Reset to empty if not found in database
-                    self.forms[form_name]["البيانات"] = []
+            # Reset deleted forms to empty, then apply the changed ones
+            for form_name in deleted:
+                self.forms[form_name]["البيانات"] = []
+            for form_name, stored in changed.items():
+                self.forms[form_name]["البيانات"] = stored['data']
+            self._forms_watermark = watermark
             
             self.status_var.set("تم تحديث البيانات من قاعدة البيانات")
             
@@ -6424,23 +6512,24 @@ ________________________________________
             messagebox.showerror("خطأ", f"حدث خطأ أثناء الحذف: {str(e)}")
     
     def update_form_record(self, form_name, new_data):
-        """Update form data in database and refresh UI"""
+        """Update form data in database and refresh UI (returns the pending save)"""
         try:
-            success = self.db_manager.update_form_data(
+            def on_saved(success):
+                if success:
+                    # Refresh UI data
+                    self.refresh_forms_data()
+                    messagebox.showinfo("تم التحديث", f"تم تحديث بيانات {form_name} بنجاح")
+                    self.status_var.set(f"تم تحديث {form_name} في قاعدة البيانات")
+                else:
+                    messagebox.showerror("خطأ", f"فشل في تحديث بيانات {form_name}")
+            
+            # Saved on the writer thread; on_saved runs on the Tk thread
+            return self.db_manager.update_form_data(
                 form_name=form_name,
                 data=new_data,
-                user_id=self.current_user['id']
+                user_id=self.current_user['id'],
+                callback=on_saved
             )
-            
-            if success:
-                # Refresh UI data
-                self.refresh_forms_data()
-                messagebox.showinfo("تم التحديث", f"تم تحديث بيانات {form_name} بنجاح")
-                self.status_var.set(f"تم تحديث {form_name} في قاعدة البيانات")
-                return True
-            else:
-                messagebox.showerror("خطأ", f"فشل في تحديث بيانات {form_name}")
-                return False
                 
         except Exception as e:
             print(f"Error updating form: {e}")
@@ -8296,20 +8385,22 @@ ________________________________________
             # تجميع جميع البيانات
             complete_data = employee_data + [threats_data] + review_data
             
-            # Save to database
-            success = self.db_manager.save_form_data(
+            def on_saved(success):
+                if success:
+                    # Refresh data from database
+                    self.refresh_forms_data()
+                    messagebox.showinfo("تم الحفظ", f"تم حفظ سجل التهديدات: {form_name}")
+                    self.status_var.set(f"تم حفظ {form_name} بنجاح في قاعدة البيانات")
+                else:
+                    messagebox.showerror("خطأ", "فشل في حفظ البيانات")
+            
+            # Save to database (on the writer thread; on_saved runs on the Tk thread)
+            self.db_manager.save_form_data(
                 form_name=form_name,
                 data=[complete_data],  # Wrap in list
-                user_id=self.current_user['id']
+                user_id=self.current_user['id'],
+                callback=on_saved
             )
-            
-            if success:
-                # Refresh data from database
-                self.refresh_forms_data()
-                messagebox.showinfo("تم الحفظ", f"تم حفظ سجل التهديدات: {form_name}")
-                self.status_var.set(f"تم حفظ {form_name} بنجاح في قاعدة البيانات")
-            else:
-                messagebox.showerror("خطأ", "فشل في حفظ البيانات")
                 
         except Exception as e:
             messagebox.showerror("خطأ", f"حدث خطأ أثناء حفظ البيانات:\n{str(e)}")
@@ -8603,20 +8694,22 @@ ________________________________________
                 else:
                     data.append("")
             
-            # Save to database
-            success = self.db_manager.save_form_data(
+            def on_saved(success):
+                if success:
+                    # Refresh data from database
+                    self.refresh_forms_data()
+                    messagebox.showinfo("تم الحفظ", f"تم حفظ التقرير: {form_name}")
+                    self.status_var.set(f"تم حفظ {form_name} بنجاح في قاعدة البيانات")
+                else:
+                    messagebox.showerror("خطأ", "فشل في حفظ البيانات")
+            
+            # Save to database (on the writer thread; on_saved runs on the Tk thread)
+            self.db_manager.save_form_data(
                 form_name=form_name,
                 data=[data],  # Wrap in list
-                user_id=self.current_user['id']
+                user_id=self.current_user['id'],
+                callback=on_saved
             )
-            
-            if success:
-                # Refresh data from database
-                self.refresh_forms_data()
-                messagebox.showinfo("تم الحفظ", f"تم حفظ التقرير: {form_name}")
-                self.status_var.set(f"تم حفظ {form_name} بنجاح في قاعدة البيانات")
-            else:
-                messagebox.showerror("خطأ", "فشل في حفظ البيانات")
                 
         except Exception as e:
             messagebox.showerror("خطأ", f"حدث خطأ أثناء حفظ البيانات:\n{str(e)}")
@@ -8637,20 +8730,22 @@ ________________________________________
                 else:
                     data.append("")
             
-            # Save to database
-            success = self.db_manager.save_form_data(
+            def on_saved(success):
+                if success:
+                    # Refresh data from database
+                    self.refresh_forms_data()
+                    messagebox.showinfo("تم الحفظ", f"تم حفظ التقرير: {form_name}")
+                    self.status_var.set(f"تم حفظ {form_name} بنجاح في قاعدة البيانات")
+                else:
+                    messagebox.showerror("خطأ", "فشل في حفظ البيانات")
+            
+            # Save to database (on the writer thread; on_saved runs on the Tk thread)
+            self.db_manager.save_form_data(
                 form_name=form_name,
                 data=[data],  # Wrap in list
-                user_id=self.current_user['id']
+                user_id=self.current_user['id'],
+                callback=on_saved
             )
-            
-            if success:
-                # Refresh data from database
-                self.refresh_forms_data()
-                messagebox.showinfo("تم الحفظ", f"تم حفظ التقرير: {form_name}")
-                self.status_var.set(f"تم حفظ {form_name} بنجاح في قاعدة البيانات")
-            else:
-                messagebox.showerror("خطأ", "فشل في حفظ البيانات")
                 
         except Exception as e:
             messagebox.showerror("خطأ", f"حدث خطأ أثناء حفظ البيانات:\n{str(e)}")
@@ -9004,9 +9099,17 @@ ________________________________________
             tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True, padx=(0, 5))
             scrollbar.pack(side=tk.RIGHT, fill=tk.Y, padx=(5, 0))
             
-            # إضافة بيانات
-            for doc in self.forms[actual_form_name]["البيانات"]:
-                tree.insert("", tk.END, values=doc)
+            # إضافة بيانات (معرّف كل صف في الجدول هو معرّفه في form_rows)
+            def on_rows(rows):
+                if not tree.winfo_exists():
+                    return
+                if rows is False:
+                    rows = [(None, doc) for doc in self.forms[actual_form_name]["البيانات"]]
+                for row_id, doc in rows:
+                    tree.insert("", tk.END, iid=row_id, values=doc)
+            
+            # Read (and convert on first open) on the writer thread; on_rows runs on the Tk thread
+            self.db_manager.get_form_rows(actual_form_name, self.current_user['id'], callback=on_rows)
             
             # أزرار التحكم
             btn_frame = tk.Frame(parent, bg="#3C1361")
@@ -9075,32 +9178,28 @@ ________________________________________
             
         if messagebox.askyesno("تأكيد الحذف", "هل أنت متأكد من رغبتك في حذف هذا السجل؟"):
             try:
-                # Delete from UI
-                for item in selected:
-                    tree.delete(item)
-                
-                # Get all remaining records from the tree
-                remaining_records = []
-                for item in tree.get_children(''):
-                    values = tree.item(item, 'values')
-                    remaining_records.append(values)
+                def on_deleted(success):
+                    if success:
+                        # Delete from UI
+                        if tree.winfo_exists():
+                            tree.delete(*[item for item in selected if tree.exists(item)])
+                            
+                            # Update local forms data
+                            if actual_form_name in self.forms:
+                                self.forms[actual_form_name]["البيانات"] = [tree.item(item, 'values') for item in tree.get_children('')]
+                        
+                        messagebox.showinfo("تم الحذف", "تم حذف السجل بنجاح وحفظه في قاعدة البيانات")
+                        self.status_var.set(f"تم حذف السجل من {actual_form_name} وحفظه في قاعدة البيانات")
+                    else:
+                        messagebox.showerror("خطأ", "فشل في حذف السجل من قاعدة البيانات")
                 
-                # Update database with remaining records
-                success = self.db_manager.save_form_data(
+                # Delete only the selected rows, on the writer thread; on_deleted runs on the Tk thread
+                self.db_manager.delete_form_rows(
                     form_name=actual_form_name,
-                    data=remaining_records,
-                    user_id=self.current_user['id']
+                    row_ids=selected,
+                    user_id=self.current_user['id'],
+                    callback=on_deleted
                 )
-
-                if success:
-                    # Update local forms data
-                    if actual_form_name in self.forms:
-                        self.forms[actual_form_name]["البيانات"] = remaining_records
-                    
-                    messagebox.showinfo("تم الحذف", "تم حذف السجل بنجاح وحفظه في قاعدة البيانات")
-                    self.status_var.set(f"تم حذف السجل من {actual_form_name} وحفظه في قاعدة البيانات")
-                else:
-                    messagebox.showerror("خطأ", "تم حذف السجل من الواجهة ولكن فشل في حفظه في قاعدة البيانات")
                     
             except Exception as e:
                 print(f"Error deleting record: {e}")
@@ -9181,36 +9280,36 @@ ________________________________________
             return
         
         try:
-            # إضافة أو تحديث السجل في الواجهة
-            if item_id:
-                tree.item(item_id, values=values)
-                action_msg = "تم تحديث السجل"
-            else:
-                tree.insert("", tk.END, values=values)
-                action_msg = "تم إضافة سجل جديد"
-            
-            # جمع جميع البيانات من الجدول
-            all_data = []
-            for item in tree.get_children():
-                item_values = tree.item(item, 'values')
-                all_data.append(item_values)
+            action_msg = "تم تحديث السجل" if item_id else "تم إضافة سجل جديد"
+            
+            def on_saved(row_id):
+                if row_id:
+                    # إضافة أو تحديث السجل في الواجهة
+                    if tree.winfo_exists():
+                        if item_id:
+                            if tree.exists(item_id):
+                                tree.item(item_id, values=values)
+                        else:
+                            tree.insert("", tk.END, iid=row_id, values=values)
+                        
+                        # Update local forms data
+                        if actual_form_name in self.forms:
+                            self.forms[actual_form_name]["البيانات"] = [tree.item(item, 'values') for item in tree.get_children()]
+                    
+                    self.status_var.set(f"{action_msg} في {actual_form_name} وتم حفظه في قاعدة البيانات")
+                    if editor.winfo_exists():
+                        editor.destroy()
+                else:
+                    messagebox.showerror("خطأ", "فشل في حفظ السجل في قاعدة البيانات")
             
-            # حفظ في قاعدة البيانات
-            success = self.db_manager.save_form_data(
+            # حفظ هذا السجل فقط في قاعدة البيانات (on the writer thread; on_saved runs on the Tk thread)
+            self.db_manager.upsert_form_row(
                 form_name=actual_form_name,
-                data=all_data,
-                user_id=self.current_user['id']
+                row_id=item_id,
+                values=values,
+                user_id=self.current_user['id'],
+                callback=on_saved
             )
-
-            if success:
-                # Update local forms data
-                if actual_form_name in self.forms:
-                    self.forms[actual_form_name]["البيانات"] = all_data
-                
-                self.status_var.set(f"{action_msg} في {actual_form_name} وتم حفظه في قاعدة البيانات")
-                editor.destroy()
-            else:
-                messagebox.showerror("خطأ", f"{action_msg} في الواجهة ولكن فشل في حفظه في قاعدة البيانات")
                 
         except Exception as e:
             print(f"Error saving record: {e}")
@@ -9219,28 +9318,29 @@ ________________________________________
     def save_form(self, actual_form_name, tree):
         """Save form data to database"""
         try:
-            # جمع البيانات من الجدول
-            data = []
-            for item in tree.get_children():
-                values = tree.item(item, 'values')
-                data.append(values)
+            # جمع البيانات من الجدول مع معرّف كل صف
+            rows = [(item, tree.item(item, 'values')) for item in tree.get_children()]
             
-            # Save to database
-            success = self.db_manager.save_form_data(
+            def on_saved(success):
+                if success:
+                    # Refresh data from database
+                    self.refresh_forms_data()
+                    
+                    messagebox.showinfo("تم الحفظ", f"تم حفظ بيانات النموذج: {actual_form_name}")
+                    self.status_var.set(f"تم حفظ {actual_form_name} بنجاح في قاعدة البيانات")
+                else:
+                    messagebox.showerror("خطأ", "فشل في حفظ البيانات في قاعدة البيانات")
+                    self.status_var.set("فشل في حفظ البيانات")
+            
+            # Save to database on the writer thread (unchanged rows are skipped);
+            # on_saved runs on the Tk thread
+            self.status_var.set(f"جاري حفظ {actual_form_name}...")
+            self.db_manager.replace_form_rows(
                 form_name=actual_form_name,
-                data=data,
-                user_id=self.current_user['id']
+                rows=rows,
+                user_id=self.current_user['id'],
+                callback=on_saved
             )
-            
-            if success:
-                # Refresh data from database
-                self.refresh_forms_data()
-                
-                messagebox.showinfo("تم الحفظ", f"تم حفظ بيانات النموذج: {actual_form_name}")
-                self.status_var.set(f"تم حفظ {actual_form_name} بنجاح في قاعدة البيانات")
-            else:
-                messagebox.showerror("خطأ", "فشل في حفظ البيانات في قاعدة البيانات")
-                self.status_var.set("فشل في حفظ البيانات")
                 
         except Exception as e:
             messagebox.showerror("خطأ", f"حدث خطأ أثناء حفظ البيانات:\n{str(e)}")
@@ -9257,21 +9357,23 @@ ________________________________________
                 else:
                     data.append(widget.get())
             
-            # Save to database
-            success = self.db_manager.save_form_data(
+            def on_saved(success):
+                if success:
+                    # Update memory
+                    self.forms[form_name]["البيانات"] = [data]
+                
+                    messagebox.showinfo("تم الحفظ", f"تم حفظ محضر الاجتماع: {form_name}")
+                    self.status_var.set(f"تم حفظ {form_name} بنجاح في قاعدة البيانات")
+                else:
+                    messagebox.showerror("خطأ", "فشل في حفظ البيانات")
+            
+            # Save to database (on the writer thread; on_saved runs on the Tk thread)
+            self.db_manager.save_form_data(
                 form_name=form_name,
                 data=[data],  # Wrap in list to match expected format
-                user_id=self.current_user['id']
+                user_id=self.current_user['id'],
+                callback=on_saved
             )
-            
-            if success:
-                # Update memory
-                self.forms[form_name]["البيانات"] = [data]
-                
-                messagebox.showinfo("تم الحفظ", f"تم حفظ محضر الاجتماع: {form_name}")
-                self.status_var.set(f"تم حفظ {form_name} بنجاح في قاعدة البيانات")
-            else:
-                messagebox.showerror("خطأ", "فشل في حفظ البيانات")
                 
         except Exception as e:
             messagebox.showerror("خطأ", f"حدث خطأ أثناء حفظ البيانات:\n{str(e)}")
@@ -9295,22 +9397,24 @@ ________________________________________
                 except:
                     continue
             
-            # Save to database
-            success = self.db_manager.save_form_data(
+            def on_saved(success):
+                if success:
+                    # Update memory
+                    if form_name in self.forms:
+                        self.forms[form_name]["البيانات"] = [data]
+                
+                    messagebox.showinfo("تم الحفظ", f"تم حفظ النموذج: {form_name}")
+                    self.status_var.set(f"تم حفظ {form_name} بنجاح في قاعدة البيانات")
+                else:
+                    messagebox.showerror("خطأ", "فشل في حفظ البيانات")
+            
+            # Save to database (on the writer thread; on_saved runs on the Tk thread)
+            self.db_manager.save_form_data(
                 form_name=form_name,
                 data=[data],  # Wrap in list to match expected format
-                user_id=self.current_user['id']
+                user_id=self.current_user['id'],
+                callback=on_saved
             )
-            
-            if success:
-                # Update memory
-                if form_name in self.forms:
-                    self.forms[form_name]["البيانات"] = [data]
-                
-                messagebox.showinfo("تم الحفظ", f"تم حفظ النموذج: {form_name}")
-                self.status_var.set(f"تم حفظ {form_name} بنجاح في قاعدة البيانات")
-            else:
-                messagebox.showerror("خطأ", "فشل في حفظ البيانات")
                 
         except Exception as e:
             messagebox.showerror("خطأ", f"حدث خطأ أثناء حفظ البيانات:\n{str(e)}")
@@ -9401,13 +9505,14 @@ ________________________________________
             form_data['created_date'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
             form_data['last_modified'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
             
-            # Save to database
-            success = self.db_manager.save_form_data(form_id, form_data)
+            def on_saved(success):
+                if success:
+                    messagebox.showinfo("نجح الحفظ", f"تم حفظ بيانات النموذج {form_id} بنجاح")
+                else:
+                    messagebox.showerror("خطأ", "فشل في حفظ البيانات")
             
-            if success:
-                messagebox.showinfo("نجح الحفظ", f"تم حفظ بيانات النموذج {form_id} بنجاح")
-            else:
-                messagebox.showerror("خطأ", "فشل في حفظ البيانات")
+            # Save to database (on the writer thread; on_saved runs on the Tk thread)
+            self.db_manager.save_form_data(form_id, form_data, callback=on_saved)
                 
         except Exception as e:
             messagebox.showerror("خطأ", f"حدث خطأ أثناء حفظ البيانات:\n{str(e)}")
@@ -9573,11 +9678,7 @@ ________________________________________
     
     def get_form_id_from_name(self, form_name):
         """Extract QF form ID from form name"""
-        import re
-        match = re.search(r'QF-\d+-\d+-\d+', form_name)
-        if match:
-            return match.group(0)
-        return form_name
+        return self.db_manager.extract_form_code(form_name)
 
     def generate_universal_form_pdf(self, form_id, form_name, entries, filename):
         """Generate PDF for any universal form"""
@@ -9712,14 +9813,15 @@ ________________________________________
             # Set form ID
             form_data['form_id'] = form_name
             
-            # Save to database using existing database manager
-            success = self.db_manager.save_form_data(form_name, form_data)
+            def on_saved(success):
+                if success:
+                    messagebox.showinfo("حفظ", f"تم حفظ {form_name} بنجاح")
+                    self.log_activity(f"Form {form_name} saved successfully")
+                else:
+                    messagebox.showerror("خطأ", f"فشل في حفظ {form_name}")
             
-            if success:
-                messagebox.showinfo("حفظ", f"تم حفظ {form_name} بنجاح")
-                self.log_activity(f"Form {form_name} saved successfully")
-            else:
-                messagebox.showerror("خطأ", f"فشل في حفظ {form_name}")
+            # Save to database using existing database manager (on the writer thread; on_saved runs on the Tk thread)
+            self.db_manager.save_form_data(form_name, form_data, callback=on_saved)
             
         except Exception as e:
             error_msg = f"حدث خطأ أثناء حفظ {form_name}:\n{str(e)}"
@@ -9929,13 +10031,14 @@ ________________________________________
             form_data['created_date'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
             form_data['last_modified'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
             
-            # Save to database
-            success = self.db_manager.save_form_data('QF-10-01-01', form_data)
+            def on_saved(success):
+                if success:
+                    messagebox.showinfo("نجح الحفظ", "تم حفظ بيانات النموذج بنجاح")
+                else:
+                    messagebox.showerror("خطأ", "فشل في حفظ البيانات")
             
-            if success:
-                messagebox.showinfo("نجح الحفظ", "تم حفظ بيانات النموذج بنجاح")
-            else:
-                messagebox.showerror("خطأ", "فشل في حفظ البيانات")
+            # Save to database (on the writer thread; on_saved runs on the Tk thread)
+            self.db_manager.save_form_data('QF-10-01-01', form_data, callback=on_saved)
                 
         except Exception as e:
             messagebox.showerror("خطأ", f"حدث خطأ أثناء حفظ البيانات:\n{str(e)}")
@@ -10321,18 +10424,20 @@ ________________________________________
                     else:
                         form_data[field_name] = str(widget)
             
-            # Save to database
-            success = self.db_manager.save_form_data(
+            def on_saved(success):
+                if success:
+                    messagebox.showinfo("نجح الحفظ", f"تم حفظ النموذج {form_name} بنجاح")
+                    self.status_var.set(f"تم حفظ {form_name} بنجاح")
+                else:
+                    messagebox.showerror("خطأ في الحفظ", "فشل في حفظ البيانات")
+            
+            # Save to database (on the writer thread; on_saved runs on the Tk thread)
+            self.db_manager.save_form_data(
                 form_name=form_name,
                 data=form_data,
-                user_id=self.current_user['id'] if hasattr(self, 'current_user') else 1
+                user_id=self.current_user['id'] if hasattr(self, 'current_user') else 1,
+                callback=on_saved
             )
-            
-            if success:
-                messagebox.showinfo("نجح الحفظ", f"تم حفظ النموذج {form_name} بنجاح")
-                self.status_var.set(f"تم حفظ {form_name} بنجاح")
-            else:
-                messagebox.showerror("خطأ في الحفظ", "فشل في حفظ البيانات")
                 
         except Exception as e:
             messagebox.showerror("خطأ", f"حدث خطأ أثناء حفظ البيانات:\n{str(e)}")
@@ -10441,21 +10546,23 @@ ________________________________________
                 else:
                     data.append("")
             
-            # Save to database
-            success = self.db_manager.save_form_data(
+            def on_saved(success):
+                if success:
+                    # Refresh data from database
+                    self.refresh_forms_data()
+                
+                    messagebox.showinfo("تم الحفظ", f"تم حفظ تقرير تضارب المصالح: {form_name}")
+                    self.status_var.set(f"تم حفظ {form_name} بنجاح في قاعدة البيانات")
+                else:
+                    messagebox.showerror("خطأ", "فشل في حفظ البيانات")
+            
+            # Save to database (on the writer thread; on_saved runs on the Tk thread)
+            self.db_manager.save_form_data(
                 form_name=form_name,
                 data=[data],  # Wrap in list
-                user_id=self.current_user['id']
+                user_id=self.current_user['id'],
+                callback=on_saved
             )
-            
-            if success:
-                # Refresh data from database
-                self.refresh_forms_data()
-                
-                messagebox.showinfo("تم الحفظ", f"تم حفظ تقرير تضارب المصالح: {form_name}")
-                self.status_var.set(f"تم حفظ {form_name} بنجاح في قاعدة البيانات")
-            else:
-                messagebox.showerror("خطأ", "فشل في حفظ البيانات")
                 
         except Exception as e:
             messagebox.showerror("خطأ", f"حدث خطأ أثناء حفظ البيانات:\n{str(e)}")
@@ -11242,13 +11349,36 @@ ________________________________________
             messagebox.showerror("خطأ", f"فشل في فتح إدارة المستخدمين:\n{str(e)}")
     
     def create_backup(self):
-        """إنشاء نسخة احتياطية من قاعدة البيانات والنماذج"""
-        try:
-            # Database backup
-            db_backup_path = self.db_manager.backup_database()
-            
-            # Forms data backup
-            forms_backup_file = self.db_manager.backup_forms_data()
+        """إنشاء نسخة احتياطية من قاعدة البيانات والنماذج (في الخلفية مع شريط تقدم)"""
+        progress_window = tk.Toplevel(self.root)
+        progress_window.title("النسخ الاحتياطي")
+        progress_window.geometry("400x120")
+        progress_window.configure(bg="#2D0A4D")
+        progress_window.transient(self.root)
+        
+        status_label = tk.Label(progress_window, text="جاري نسخ قاعدة البيانات...",
+                                font=("Arial", 11), bg="#2D0A4D", fg="white")
+        status_label.pack(pady=(20, 10))
+        progress_bar = ttk.Progressbar(progress_window, length=340, mode="determinate")
+        progress_bar.pack(pady=5)
+        
+        def on_progress(percent):
+            if progress_window.winfo_exists():
+                progress_bar["value"] = percent
+        
+        last_percent = [-1]
+        
+        def report_progress(done, total):
+            # Backup thread: queue one update per whole percent
+            percent = done * 100 // total if total else 0
+            if percent != last_percent[0]:
+                last_percent[0] = percent
+                self.db_manager.post_callback(on_progress, percent)
+        
+        def on_forms_finished(db_backup_path, future):
+            if progress_window.winfo_exists():
+                progress_window.destroy()
+            forms_backup_file = future.result()
             
             backup_message = f"تم إنشاء النسخ الاحتياطية بنجاح:\n\nقاعدة البيانات: {db_backup_path}"
             
@@ -11264,14 +11394,35 @@ ________________________________________
                 table_name="system",
                 record_id=None
             )
+        
+        def on_finished(future):
+            try:
+                db_backup_path = future.result()
+            except Exception as e:
+                if progress_window.winfo_exists():
+                    progress_window.destroy()
+                messagebox.showerror("خطأ", f"فشل في إنشاء النسخة الاحتياطية:\n{str(e)}")
+                return
             
-        except Exception as e:
-            messagebox.showerror("خطأ", f"فشل في إنشاء النسخة الاحتياطية:\n{str(e)}")
+            # Forms data backup, also in the background
+            if progress_window.winfo_exists():
+                status_label.config(text="جاري نسخ بيانات النماذج...")
+                progress_bar.config(mode="indeterminate")
+                progress_bar.start(10)
+            self.db_manager.backup_forms_data(
+                callback=lambda forms_future: on_forms_finished(db_backup_path, forms_future))
+        
+        # Database backup on a background thread; Tk is only touched from the main loop
+        self.db_manager.backup_database(progress=report_progress, callback=on_finished)
 
     def backup_all_forms_data(self):
-        """Create backup of all forms data"""
-        try:
-            backup_file = self.db_manager.backup_forms_data()
+        """Create backup of all forms data (in the background)"""
+        def on_finished(future):
+            try:
+                backup_file = future.result()
+            except Exception as e:
+                messagebox.showerror("خطأ", f"فشل في إنشاء النسخة الاحتياطية:\n{str(e)}")
+                return
             if backup_file:
                 messagebox.showinfo("نجح النسخ الاحتياطي", 
                                    f"تم إنشاء نسخة احتياطية من بيانات النماذج:\n{backup_file}")
@@ -11285,9 +11436,8 @@ ________________________________________
                 )
             else:
                 messagebox.showerror("خطأ", "فشل في إنشاء النسخة الاحتياطية")
-                
-        except Exception as e:
-            messagebox.showerror("خطأ", f"فشل في إنشاء النسخة الاحتياطية:\n{str(e)}")
+        
+        self.db_manager.backup_forms_data(callback=on_finished)
 
     def show_forms_data_management(self):
         """عرض نافذة إدارة بيانات النماذج"""
@@ -11343,14 +11493,13 @@ ________________________________________
         # Load forms data
         def refresh_forms_list():
             tree.delete(*tree.get_children())
-            stored_forms = self.db_manager.get_all_forms_data()
             
-            for form_name, form_info in stored_forms.items():
-                data = form_info['data']
-                record_count = len(data) if isinstance(data, list) else 1
-                updated_at = form_info.get('updated_at', 'غير محدد')
+            # Metadata columns only - payloads are not decoded for the list
+            for form_info in self.db_manager.list_forms_summary():
+                record_count = form_info['record_count'] if form_info['record_count'] is not None else 1
+                updated_at = form_info['updated_at'] or 'غير محدد'
                 
-                tree.insert("", tk.END, values=(form_name, record_count, updated_at))
+                tree.insert("", tk.END, values=(form_info['form_name'], record_count, updated_at))
         
         refresh_forms_list()
         
@@ -12159,7 +12308,7 @@ ________________________________________
             canvas.yview_scroll(int(-1*(event.delta/120)), "units")
         canvas.bind_all("<MouseWheel>", _on_mousewheel)
     
-    def save_contract_form(self, form_name, entries):
+    def save_contract_form(self, form_name, entries, updated=False):
         """Save contract form data"""
         try:
             # Collect data from all entries
@@ -12170,9 +12319,17 @@ ________________________________________
                 else:
                     contract_data[key] = widget.get().strip()
             
-            # Save to database or file
-            self.db_manager.save_form_data(form_name, contract_data)
-            messagebox.showinfo("تم الحفظ", "تم حفظ بيانات العقد بنجاح")
+            def on_saved(success):
+                if not success:
+                    messagebox.showerror("خطأ", "فشل في حفظ بيانات العقد")
+                elif updated:
+                    self.refresh_forms_data()
+                    messagebox.showinfo("تم التحديث", "تم تحديث بيانات العقد بنجاح")
+                else:
+                    messagebox.showinfo("تم الحفظ", "تم حفظ بيانات العقد بنجاح")
+            
+            # Save to database (on the writer thread; on_saved runs on the Tk thread)
+            self.db_manager.save_form_data(form_name, contract_data, callback=on_saved)
             
         except Exception as e:
             messagebox.showerror("خطأ", f"حدث خطأ أثناء حفظ البيانات: {str(e)}")
@@ -12180,9 +12337,7 @@ ________________________________________
     def update_contract_form(self, form_name, entries):
         """Update contract form data"""
         try:
-            self.save_contract_form(form_name, entries)
-            self.refresh_forms_data()
-            messagebox.showinfo("تم التحديث", "تم تحديث بيانات العقد بنجاح")
+            self.save_contract_form(form_name, entries, updated=True)
         except Exception as e:
             messagebox.showerror("خطأ", f"حدث خطأ أثناء تحديث البيانات: {str(e)}")
     
@@ -12914,18 +13069,20 @@ ________________________________________
                 elif hasattr(widget, 'get'):
                     data[key] = widget.get()
             
-            # Save to database
-            success = self.db_manager.save_form_data(
+            def on_saved(success):
+                if success:
+                    messagebox.showinfo("تم الحفظ", "تم حفظ نموذج تجهيز قاعات الامتحانات بنجاح")
+                    self.status_var.set(f"تم حفظ {form_name} بنجاح")
+                else:
+                    messagebox.showerror("خطأ", "فشل في حفظ البيانات")
+            
+            # Save to database (on the writer thread; on_saved runs on the Tk thread)
+            self.db_manager.save_form_data(
                 form_name=form_name,
                 data=[data],
-                user_id=self.current_user['id']
+                user_id=self.current_user['id'],
+                callback=on_saved
             )
-            
-            if success:
-                messagebox.showinfo("تم الحفظ", "تم حفظ نموذج تجهيز قاعات الامتحانات بنجاح")
-                self.status_var.set(f"تم حفظ {form_name} بنجاح")
-            else:
-                messagebox.showerror("خطأ", "فشل في حفظ البيانات")
                 
         except Exception as e:
             messagebox.showerror("خطأ", f"حدث خطأ أثناء حفظ البيانات: {str(e)}")
@@ -12968,18 +13125,20 @@ ________________________________________
                     else:
                         data[key] = widget.get()
             
-            # Save to database
-            success = self.db_manager.save_form_data(
+            def on_saved(success):
+                if success:
+                    messagebox.showinfo("تم الحفظ", "تم حفظ تقرير مراجعة بيئة الامتحانات بنجاح")
+                    self.status_var.set(f"تم حفظ {form_name} بنجاح")
+                else:
+                    messagebox.showerror("خطأ", "فشل في حفظ البيانات")
+            
+            # Save to database (on the writer thread; on_saved runs on the Tk thread)
+            self.db_manager.save_form_data(
                 form_name=form_name,
                 data=[data],
-                user_id=self.current_user['id']
+                user_id=self.current_user['id'],
+                callback=on_saved
             )
-            
-            if success:
-                messagebox.showinfo("تم الحفظ", "تم حفظ تقرير مراجعة بيئة الامتحانات بنجاح")
-                self.status_var.set(f"تم حفظ {form_name} بنجاح")
-            else:
-                messagebox.showerror("خطأ", "فشل في حفظ البيانات")
                 
         except Exception as e:
             messagebox.showerror("خطأ", f"حدث خطأ أثناء حفظ البيانات: {str(e)}")
@@ -13025,18 +13184,20 @@ ________________________________________
                     else:
                         data[key] = widget.get()
             
-            # Save to database
-            success = self.db_manager.save_form_data(
+            def on_saved(success):
+                if success:
+                    messagebox.showinfo("تم الحفظ", "تم حفظ تقرير تقييم الموارد التقنية بنجاح")
+                    self.status_var.set(f"تم حفظ {form_name} بنجاح")
+                else:
+                    messagebox.showerror("خطأ", "فشل في حفظ البيانات")
+            
+            # Save to database (on the writer thread; on_saved runs on the Tk thread)
+            self.db_manager.save_form_data(
                 form_name=form_name,
                 data=[data],
-                user_id=self.current_user['id']
+                user_id=self.current_user['id'],
+                callback=on_saved
             )
-            
-            if success:
-                messagebox.showinfo("تم الحفظ", "تم حفظ تقرير تقييم الموارد التقنية بنجاح")
-                self.status_var.set(f"تم حفظ {form_name} بنجاح")
-            else:
-                messagebox.showerror("خطأ", "فشل في حفظ البيانات")
                 
         except Exception as e:
             messagebox.showerror("خطأ", f"حدث خطأ أثناء حفظ البيانات: {str(e)}")
@@ -16635,39 +16796,6 @@ ________________________________________
     def save_evaluator_application(self, form_name, entries):
         """Save evaluator accreditation application form"""
         try:
-            # Initialize database if needed
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            # Create table if not exists
-            cursor.execute('''CREATE TABLE IF NOT EXISTS evaluator_applications (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                form_name TEXT,
-                full_name TEXT,
-                national_id TEXT,
-                birth_date TEXT,
-                nationality TEXT,
-                phone TEXT,
-                email TEXT,
-                address TEXT,
-                qualification TEXT,
-                specialization TEXT,
-                experience_years TEXT,
-                current_job TEXT,
-                employer TEXT,
-                previous_evaluation_experience TEXT,
-                professional_qualifications TEXT,
-                evaluation_type TEXT,
-                required_specializations TEXT,
-                accreditation_level TEXT,
-                justification TEXT,
-                attached_documents TEXT,
-                declarations TEXT,
-                applicant_signature TEXT,
-                signature_date TEXT,
-                created_date TEXT
-            )''')
-            
             # Prepare data
             data = {
                 'form_name': form_name,
@@ -16696,20 +16824,13 @@ ________________________________________
                 'created_date': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
             }
             
-            # Insert data
-            cursor.execute('''INSERT INTO evaluator_applications 
-                (form_name, full_name, national_id, birth_date, nationality, phone, email, 
-                address, qualification, specialization, experience_years, current_job, 
-                employer, previous_evaluation_experience, professional_qualifications, 
-                evaluation_type, required_specializations, accreditation_level, justification, 
-                attached_documents, declarations, applicant_signature, signature_date, created_date)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
-                tuple(data.values()))
-            
-            conn.commit()
-            conn.close()
+            def on_saved(record_id):
+                if record_id:
+                    messagebox.showinfo("نجح الحفظ", "تم حفظ نموذج طلب اعتماد المقيم بنجاح")
+                else:
+                    messagebox.showerror("خطأ", "حدث خطأ أثناء حفظ النموذج")
             
-            messagebox.showinfo("نجح الحفظ", "تم حفظ نموذج طلب اعتماد المقيم بنجاح")
+            self.db_manager.insert_record('evaluator_applications', data, callback=on_saved)
             
         except Exception as e:
             messagebox.showerror("خطأ", f"حدث خطأ أثناء حفظ النموذج: {str(e)}")
@@ -16730,31 +16851,6 @@ ________________________________________
     def save_evaluator_assessment(self, form_name, entries):
         """Save evaluator assessment record form"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute('''CREATE TABLE IF NOT EXISTS evaluator_assessments (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                form_name TEXT,
-                evaluator_name TEXT,
-                application_number TEXT,
-                specialization TEXT,
-                assessment_date TEXT,
-                theoretical_score TEXT,
-                practical_score TEXT,
-                personality_score TEXT,
-                total_score TEXT,
-                recommendation TEXT,
-                proposed_scope TEXT,
-                notes TEXT,
-                chief_evaluator_name TEXT,
-                chief_evaluator_signature TEXT,
-                reviewer_name TEXT,
-                reviewer_signature TEXT,
-                assessment_date_final TEXT,
-                created_date TEXT
-            )''')
-            
             # Collect assessment data (simplified)
             data = {
                 'form_name': form_name,
@@ -16774,17 +16870,13 @@ ________________________________________
                 'created_date': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
             }
             
-            cursor.execute('''INSERT INTO evaluator_assessments 
-                (form_name, evaluator_name, application_number, specialization, assessment_date,
-                total_score, recommendation, proposed_scope, notes, chief_evaluator_name,
-                chief_evaluator_signature, reviewer_name, reviewer_signature, assessment_date_final, created_date)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
-                tuple(data.values()))
-            
-            conn.commit()
-            conn.close()
+            def on_saved(record_id):
+                if record_id:
+                    messagebox.showinfo("نجح الحفظ", "تم حفظ سجل تقييم اعتماد المقيم بنجاح")
+                else:
+                    messagebox.showerror("خطأ", "حدث خطأ أثناء حفظ النموذج")
             
-            messagebox.showinfo("نجح الحفظ", "تم حفظ سجل تقييم اعتماد المقيم بنجاح")
+            self.db_manager.insert_record('evaluator_assessments', data, callback=on_saved)
             
         except Exception as e:
             messagebox.showerror("خطأ", f"حدث خطأ أثناء حفظ النموذج: {str(e)}")
@@ -16805,39 +16897,6 @@ ________________________________________
     def save_evaluator_status(self, form_name, entries):
         """Save evaluator accreditation status form"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute('''CREATE TABLE IF NOT EXISTS evaluator_status (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                form_name TEXT,
-                accreditation_number TEXT,
-                evaluator_name TEXT,
-                specialization TEXT,
-                accreditation_scope TEXT,
-                initial_accreditation_date TEXT,
-                expiry_date TEXT,
-                current_status TEXT,
-                assessments_completed TEXT,
-                last_assessment TEXT,
-                performance_rating TEXT,
-                complaints TEXT,
-                corrective_actions TEXT,
-                last_training TEXT,
-                training_date TEXT,
-                required_training TEXT,
-                development_plan TEXT,
-                last_update_date TEXT,
-                update_reason TEXT,
-                new_status TEXT,
-                update_notes TEXT,
-                responsible_officer TEXT,
-                officer_position TEXT,
-                officer_signature TEXT,
-                officer_date TEXT,
-                created_date TEXT
-            )''')
-            
             data = {
                 'form_name': form_name,
                 'accreditation_number': self.get_entry_value(entries.get('رقم اعتماد المقيم')),
@@ -16867,20 +16926,13 @@ ________________________________________
                 'created_date': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
             }
             
-            cursor.execute('''INSERT INTO evaluator_status 
-                (form_name, accreditation_number, evaluator_name, specialization, accreditation_scope,
-                initial_accreditation_date, expiry_date, current_status, assessments_completed,
-                last_assessment, performance_rating, complaints, corrective_actions, last_training,
-                training_date, required_training, development_plan, last_update_date, update_reason,
-                new_status, update_notes, responsible_officer, officer_position, officer_signature,
-                officer_date, created_date)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
-                tuple(data.values()))
-            
-            conn.commit()
-            conn.close()
+            def on_saved(record_id):
+                if record_id:
+                    messagebox.showinfo("نجح الحفظ", "تم حفظ حالة اعتماد المقيم بنجاح")
+                else:
+                    messagebox.showerror("خطأ", "حدث خطأ أثناء حفظ النموذج")
             
-            messagebox.showinfo("نجح الحفظ", "تم حفظ حالة اعتماد المقيم بنجاح")
+            self.db_manager.insert_record('evaluator_status', data, callback=on_saved)
             
         except Exception as e:
             messagebox.showerror("خطأ", f"حدث خطأ أثناء حفظ النموذج: {str(e)}")
@@ -16902,55 +16954,6 @@ ________________________________________
     def save_center_application(self, form_name, entries):
         """Save center accreditation application form"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute('''CREATE TABLE IF NOT EXISTS center_applications (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                form_name TEXT,
-                center_name TEXT,
-                institution_type TEXT,
-                commercial_register TEXT,
-                tax_number TEXT,
-                full_address TEXT,
-                phone_number TEXT,
-                email TEXT,
-                website TEXT,
-                manager_name TEXT,
-                manager_position TEXT,
-                establishment_year TEXT,
-                services_offered TEXT,
-                required_specializations TEXT,
-                assessment_levels TEXT,
-                target_groups TEXT,
-                capacity TEXT,
-                total_area TEXT,
-                halls_count TEXT,
-                halls_specifications TEXT,
-                technical_equipment TEXT,
-                library_resources TEXT,
-                assessment_tools TEXT,
-                safety_equipment TEXT,
-                admin_staff_count TEXT,
-                certified_evaluators_count TEXT,
-                trainee_evaluators_count TEXT,
-                evaluators_qualifications TEXT,
-                training_programs TEXT,
-                hr_management_system TEXT,
-                quality_certificate TEXT,
-                quality_manual TEXT,
-                assessment_procedures TEXT,
-                documentation_system TEXT,
-                internal_audit_program TEXT,
-                complaints_procedures TEXT,
-                continuous_improvement_system TEXT,
-                supporting_documents TEXT,
-                declarations TEXT,
-                manager_signature TEXT,
-                signature_date TEXT,
-                created_date TEXT
-            )''')
-            
             data = {
                 'form_name': form_name,
                 'center_name': self.get_entry_value(entries.get('اسم المركز')),
@@ -17009,21 +17012,16 @@ ________________________________________
                     'complaints_procedures': 'إجراءات الشكاوى',
                     'continuous_improvement_system': 'نظام التحسين المستمر'
                 }.get(field, field)
-                
-                data[field] = self.get_entry_value(entries.get(arabic_field, ''))
-            
-            # Create the complete INSERT statement
-            columns = list(data.keys())
-            placeholders = ', '.join(['?' for _ in columns])
-            columns_str = ', '.join(columns)
             
-            cursor.execute(f'''INSERT INTO center_applications ({columns_str}) VALUES ({placeholders})''',
-                         tuple(data.values()))
+                data[field] = self.get_entry_value(entries.get(arabic_field, ''))
             
-            conn.commit()
-            conn.close()
+            def on_saved(record_id):
+                if record_id:
+                    messagebox.showinfo("نجح الحفظ", "تم حفظ نموذج طلب اعتماد المركز بنجاح")
+                else:
+                    messagebox.showerror("خطأ", "حدث خطأ أثناء حفظ النموذج")
             
-            messagebox.showinfo("نجح الحفظ", "تم حفظ نموذج طلب اعتماد المركز بنجاح")
+            self.db_manager.insert_record('center_applications', data, callback=on_saved)
             
         except Exception as e:
             messagebox.showerror("خطأ", f"حدث خطأ أثناء حفظ النموذج: {str(e)}")
@@ -17044,41 +17042,6 @@ ________________________________________
     def save_center_assessment(self, form_name, entries):
         """Save center assessment report form"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute('''CREATE TABLE IF NOT EXISTS center_assessments (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                form_name TEXT,
-                center_name TEXT,
-                application_number TEXT,
-                assessment_date TEXT,
-                assessment_team TEXT,
-                assessment_duration TEXT,
-                assessment_type TEXT,
-                assessment_scope TEXT,
-                total_points TEXT,
-                percentage TEXT,
-                overall_rating TEXT,
-                recommendation TEXT,
-                strengths TEXT,
-                weaknesses TEXT,
-                opportunities TEXT,
-                challenges TEXT,
-                corrective_actions TEXT,
-                implementation_timeline TEXT,
-                responsibilities TEXT,
-                follow_up_indicators TEXT,
-                team_leader_name TEXT,
-                team_leader_signature TEXT,
-                team_member_name TEXT,
-                team_member_signature TEXT,
-                reviewer_name TEXT,
-                reviewer_signature TEXT,
-                report_date TEXT,
-                created_date TEXT
-            )''')
-            
             data = {
                 'form_name': form_name,
                 'center_name': self.get_entry_value(entries.get('اسم المركز')),
@@ -17110,17 +17073,13 @@ ________________________________________
                 'created_date': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
             }
             
-            columns = list(data.keys())
-            placeholders = ', '.join(['?' for _ in columns])
-            columns_str = ', '.join(columns)
-            
-            cursor.execute(f'''INSERT INTO center_assessments ({columns_str}) VALUES ({placeholders})''',
-                         tuple(data.values()))
-            
-            conn.commit()
-            conn.close()
+            def on_saved(record_id):
+                if record_id:
+                    messagebox.showinfo("نجح الحفظ", "تم حفظ تقرير تقييم المركز بنجاح")
+                else:
+                    messagebox.showerror("خطأ", "حدث خطأ أثناء حفظ النموذج")
             
-            messagebox.showinfo("نجح الحفظ", "تم حفظ تقرير تقييم المركز بنجاح")
+            self.db_manager.insert_record('center_assessments', data, callback=on_saved)
             
         except Exception as e:
             messagebox.showerror("خطأ", f"حدث خطأ أثناء حفظ النموذج: {str(e)}")
@@ -17142,36 +17101,6 @@ ________________________________________
     def save_competency_determination(self, form_name, entries):
         """Save competency determination form"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute('''CREATE TABLE IF NOT EXISTS competency_determinations (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                form_name TEXT,
-                full_name TEXT,
-                national_id TEXT,
-                position TEXT,
-                employer TEXT,
-                specialization TEXT,
-                experience_years TEXT,
-                qualification TEXT,
-                assessment_date TEXT,
-                overall_competency_level TEXT,
-                recommendation TEXT,
-                development_areas TEXT,
-                proposed_training TEXT,
-                development_timeline TEXT,
-                progress_indicators TEXT,
-                general_notes TEXT,
-                evaluator_name TEXT,
-                evaluator_signature TEXT,
-                evaluator_date TEXT,
-                reviewer_name TEXT,
-                reviewer_signature TEXT,
-                reviewer_date TEXT,
-                created_date TEXT
-            )''')
-            
             data = {
                 'form_name': form_name,
                 'full_name': self.get_entry_value(entries.get('الاسم الكامل')),
@@ -17198,17 +17127,13 @@ ________________________________________
                 'created_date': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
             }
             
-            columns = list(data.keys())
-            placeholders = ', '.join(['?' for _ in columns])
-            columns_str = ', '.join(columns)
-            
-            cursor.execute(f'''INSERT INTO competency_determinations ({columns_str}) VALUES ({placeholders})''',
-                         tuple(data.values()))
-            
-            conn.commit()
-            conn.close()
+            def on_saved(record_id):
+                if record_id:
+                    messagebox.showinfo("نجح الحفظ", "تم حفظ نموذج تحديد الكفاءة بنجاح")
+                else:
+                    messagebox.showerror("خطأ", "حدث خطأ أثناء حفظ النموذج")
             
-            messagebox.showinfo("نجح الحفظ", "تم حفظ نموذج تحديد الكفاءة بنجاح")
+            self.db_manager.insert_record('competency_determinations', data, callback=on_saved)
             
         except Exception as e:
             messagebox.showerror("خطأ", f"حدث خطأ أثناء حفظ النموذج: {str(e)}")
@@ -17230,53 +17155,6 @@ ________________________________________
     def save_additional_requirements(self, form_name, entries):
         """Save additional requirements integration form"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute('''CREATE TABLE IF NOT EXISTS additional_requirements (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                form_name TEXT,
-                program_name TEXT,
-                program_code TEXT,
-                issuing_entity TEXT,
-                form_date TEXT,
-                responsible_person TEXT,
-                req_type_legal BOOLEAN,
-                req_type_sector BOOLEAN,
-                req_type_national BOOLEAN,
-                req_type_beneficiary BOOLEAN,
-                req_type_other TEXT,
-                req1_description TEXT,
-                req1_source TEXT,
-                req1_mandatory TEXT,
-                req1_notes TEXT,
-                req2_description TEXT,
-                req2_source TEXT,
-                req2_mandatory TEXT,
-                req2_notes TEXT,
-                req3_description TEXT,
-                req3_source TEXT,
-                req3_mandatory TEXT,
-                req3_notes TEXT,
-                integration_scientific_content TEXT,
-                integration_evaluation_methods TEXT,
-                integration_learning_outcomes TEXT,
-                integration_accreditation_procedures TEXT,
-                verification_program_reviewed BOOLEAN,
-                verification_committee_approval BOOLEAN,
-                verification_documents_updated BOOLEAN,
-                verification_parties_notified BOOLEAN,
-                approval1_name TEXT,
-                approval1_position TEXT,
-                approval1_signature TEXT,
-                approval1_date TEXT,
-                approval2_name TEXT,
-                approval2_position TEXT,
-                approval2_signature TEXT,
-                approval2_date TEXT,
-                created_date TEXT
-            )''')
-            
             data = {
                 'form_name': form_name,
                 'program_name': self.get_entry_value(entries.get('اسم البرنامج / الشهادة المهنية')),
@@ -17320,17 +17198,13 @@ ________________________________________
                 'created_date': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
             }
             
-            columns = list(data.keys())
-            placeholders = ', '.join(['?' for _ in columns])
-            columns_str = ', '.join(columns)
-            
-            cursor.execute(f'''INSERT INTO additional_requirements ({columns_str}) VALUES ({placeholders})''',
-                         tuple(data.values()))
-            
-            conn.commit()
-            conn.close()
+            def on_saved(record_id):
+                if record_id:
+                    messagebox.showinfo("نجح الحفظ", "تم حفظ نموذج دمج المتطلبات الإضافية بنجاح")
+                else:
+                    messagebox.showerror("خطأ", "حدث خطأ أثناء حفظ النموذج")
             
-            messagebox.showinfo("نجح الحفظ", "تم حفظ نموذج دمج المتطلبات الإضافية بنجاح")
+            self.db_manager.insert_record('additional_requirements', data, callback=on_saved)
             
         except Exception as e:
             messagebox.showerror("خطأ", f"حدث خطأ أثناء حفظ النموذج: {str(e)}")
@@ -17353,42 +17227,6 @@ ________________________________________
     def save_evaluator_renewal(self, form_name, entries):
         """Save evaluator renewal/suspension/withdrawal form"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute('''CREATE TABLE IF NOT EXISTS evaluator_renewals (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                form_name TEXT,
-                accreditation_number TEXT,
-                evaluator_name TEXT,
-                specialization TEXT,
-                current_scope TEXT,
-                original_accreditation_date TEXT,
-                current_expiry_date TEXT,
-                current_status TEXT,
-                action_type TEXT,
-                request_date TEXT,
-                justification TEXT,
-                supporting_documents TEXT,
-                updated_performance_assessment TEXT,
-                decision_made TEXT,
-                effective_date TEXT,
-                action_expiry_date TEXT,
-                new_conditions TEXT,
-                follow_up_procedures TEXT,
-                accreditation_manager_name TEXT,
-                accreditation_manager_signature TEXT,
-                accreditation_manager_date TEXT,
-                executive_manager_name TEXT,
-                executive_manager_signature TEXT,
-                executive_manager_date TEXT,
-                board_name TEXT,
-                board_signature TEXT,
-                board_date TEXT,
-                additional_notes TEXT,
-                created_date TEXT
-            )''')
-            
             data = {
                 'form_name': form_name,
                 'accreditation_number': self.get_entry_value(entries.get('رقم اعتماد المقيم')),
@@ -17420,17 +17258,13 @@ ________________________________________
                 data[field_key + 'signature'] = self.get_entry_value(entries.get(f'{field}_توقيع'))
                 data[field_key + 'date'] = self.get_entry_value(entries.get(f'{field}_تاريخ'))
             
-            columns = list(data.keys())
-            placeholders = ', '.join(['?' for _ in columns])
-            columns_str = ', '.join(columns)
-            
-            cursor.execute(f'''INSERT INTO evaluator_renewals ({columns_str}) VALUES ({placeholders})''',
-                         tuple(data.values()))
-            
-            conn.commit()
-            conn.close()
+            def on_saved(record_id):
+                if record_id:
+                    messagebox.showinfo("نجح الحفظ", "تم حفظ سجل تجديد/تعليق/سحب اعتماد المقيم بنجاح")
+                else:
+                    messagebox.showerror("خطأ", "حدث خطأ أثناء حفظ النموذج")
             
-            messagebox.showinfo("نجح الحفظ", "تم حفظ سجل تجديد/تعليق/سحب اعتماد المقيم بنجاح")
+            self.db_manager.insert_record('evaluator_renewals', data, callback=on_saved)
             
         except Exception as e:
             messagebox.showerror("خطأ", f"حدث خطأ أثناء حفظ النموذج: {str(e)}")
@@ -17451,41 +17285,6 @@ ________________________________________
     def save_center_renewal(self, form_name, entries):
         """Save center renewal/withdrawal form"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute('''CREATE TABLE IF NOT EXISTS center_renewals (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                form_name TEXT,
-                accreditation_number TEXT,
-                center_name TEXT,
-                institution_type TEXT,
-                current_scope TEXT,
-                original_accreditation_date TEXT,
-                expiry_date TEXT,
-                current_status TEXT,
-                requested_action TEXT,
-                request_date TEXT,
-                request_justification TEXT,
-                scope_changes TEXT,
-                updated_documents TEXT,
-                performance_assessment TEXT,
-                assessment_start_date TEXT,
-                assessment_team TEXT,
-                assessment_results TEXT,
-                recommendations TEXT,
-                additional_requirements TEXT,
-                corrective_actions TEXT,
-                final_decision TEXT,
-                decision_effective_date TEXT,
-                new_accreditation_period TEXT,
-                new_scope TEXT,
-                conditions_limitations TEXT,
-                follow_up_requirements TEXT,
-                additional_notes TEXT,
-                created_date TEXT
-            )''')
-            
             data = {
                 'form_name': form_name,
                 'accreditation_number': self.get_entry_value(entries.get('رقم اعتماد المركز')),
@@ -17517,17 +17316,13 @@ ________________________________________
                 'created_date': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
             }
             
-            columns = list(data.keys())
-            placeholders = ', '.join(['?' for _ in columns])
-            columns_str = ', '.join(columns)
-            
-            cursor.execute(f'''INSERT INTO center_renewals ({columns_str}) VALUES ({placeholders})''',
-                         tuple(data.values()))
-            
-            conn.commit()
-            conn.close()
+            def on_saved(record_id):
+                if record_id:
+                    messagebox.showinfo("نجح الحفظ", "تم حفظ سجل تجديد/سحب اعتماد المركز بنجاح")
+                else:
+                    messagebox.showerror("خطأ", "حدث خطأ أثناء حفظ النموذج")
             
-            messagebox.showinfo("نجح الحفظ", "تم حفظ سجل تجديد/سحب اعتماد المركز بنجاح")
+            self.db_manager.insert_record('center_renewals', data, callback=on_saved)
             
         except Exception as e:
             messagebox.showerror("خطأ", f"حدث خطأ أثناء حفظ النموذج: {str(e)}")
@@ -17548,42 +17343,6 @@ ________________________________________
     def save_competency_assessment_record(self, form_name, entries):
         """Save competency assessment record form"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute('''CREATE TABLE IF NOT EXISTS competency_assessment_records (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                form_name TEXT,
-                record_number TEXT,
-                assessment_date TEXT,
-                assessed_person_name TEXT,
-                position TEXT,
-                employer TEXT,
-                assessment_purpose TEXT,
-                responsible_assessor TEXT,
-                total_points TEXT,
-                percentage TEXT,
-                overall_competency_level TEXT,
-                strengths TEXT,
-                weaknesses TEXT,
-                required_development_areas TEXT,
-                proposed_training_programs TEXT,
-                development_timeline TEXT,
-                progress_indicators TEXT,
-                required_resources TEXT,
-                follow_up_responsible TEXT,
-                chief_assessor_name TEXT,
-                chief_assessor_signature TEXT,
-                chief_assessor_date TEXT,
-                assessment_reviewer_name TEXT,
-                assessment_reviewer_signature TEXT,
-                assessment_reviewer_date TEXT,
-                hr_manager_name TEXT,
-                hr_manager_signature TEXT,
-                hr_manager_date TEXT,
-                created_date TEXT
-            )''')
-            
             data = {
                 'form_name': form_name,
                 'record_number': self.get_entry_value(entries.get('رقم سجل التقييم')),
@@ -17616,17 +17375,13 @@ ________________________________________
                 'created_date': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
             }
             
-            columns = list(data.keys())
-            placeholders = ', '.join(['?' for _ in columns])
-            columns_str = ', '.join(columns)
-            
-            cursor.execute(f'''INSERT INTO competency_assessment_records ({columns_str}) VALUES ({placeholders})''',
-                         tuple(data.values()))
-            
-            conn.commit()
-            conn.close()
+            def on_saved(record_id):
+                if record_id:
+                    messagebox.showinfo("نجح الحفظ", "تم حفظ سجل تقييم الكفاءات بنجاح")
+                else:
+                    messagebox.showerror("خطأ", "حدث خطأ أثناء حفظ النموذج")
             
-            messagebox.showinfo("نجح الحفظ", "تم حفظ سجل تقييم الكفاءات بنجاح")
+            self.db_manager.insert_record('competency_assessment_records', data, callback=on_saved)
             
         except Exception as e:
             messagebox.showerror("خطأ", f"حدث خطأ أثناء حفظ النموذج: {str(e)}")
@@ -17647,47 +17402,6 @@ ________________________________________
     def save_additional_requirements_review(self, form_name, entries):
         """Save additional requirements review form"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute('''CREATE TABLE IF NOT EXISTS additional_requirements_reviews (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                form_name TEXT,
-                review_record_number TEXT,
-                review_date TEXT,
-                review_type TEXT,
-                responsible_reviewer TEXT,
-                review_scope TEXT,
-                review_reason TEXT,
-                reference_standards TEXT,
-                proposed_new_requirements TEXT,
-                deleted_requirements TEXT,
-                modified_requirements TEXT,
-                change_justifications TEXT,
-                system_impact TEXT,
-                implementation_priorities TEXT,
-                timeline TEXT,
-                required_resources TEXT,
-                responsibilities TEXT,
-                expected_risks TEXT,
-                success_indicators TEXT,
-                next_review_date TEXT,
-                review_frequency TEXT,
-                follow_up_mechanisms TEXT,
-                required_progress_reports TEXT,
-                management_system_manager_name TEXT,
-                management_system_manager_signature TEXT,
-                management_system_manager_date TEXT,
-                internal_auditor_name TEXT,
-                internal_auditor_signature TEXT,
-                internal_auditor_date TEXT,
-                executive_manager_name TEXT,
-                executive_manager_signature TEXT,
-                executive_manager_date TEXT,
-                final_notes TEXT,
-                created_date TEXT
-            )''')
-            
             data = {
                 'form_name': form_name,
                 'review_record_number': self.get_entry_value(entries.get('رقم سجل المراجعة')),
@@ -17725,17 +17439,13 @@ ________________________________________
                 'created_date': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
             }
             
-            columns = list(data.keys())
-            placeholders = ', '.join(['?' for _ in columns])
-            columns_str = ', '.join(columns)
-            
-            cursor.execute(f'''INSERT INTO additional_requirements_reviews ({columns_str}) VALUES ({placeholders})''',
-                         tuple(data.values()))
-            
-            conn.commit()
-            conn.close()
+            def on_saved(record_id):
+                if record_id:
+                    messagebox.showinfo("نجح الحفظ", "تم حفظ سجل المراجعة والتحديث للمتطلبات الإضافية بنجاح")
+                else:
+                    messagebox.showerror("خطأ", "حدث خطأ أثناء حفظ النموذج")
             
-            messagebox.showinfo("نجح الحفظ", "تم حفظ سجل المراجعة والتحديث للمتطلبات الإضافية بنجاح")
+            self.db_manager.insert_record('additional_requirements_reviews', data, callback=on_saved)
             
         except Exception as e:
             messagebox.showerror("خطأ", f"حدث خطأ أثناء حفظ النموذج: {str(e)}")
@@ -19755,17 +19465,20 @@ ________________________________________
                 if hasattr(widget, 'get'):
                     data[key] = widget.get()
             
-            success = self.db_manager.save_form_data(
+            def on_saved(success):
+                if success:
+                    messagebox.showinfo("تم الحفظ", "تم حفظ طلب التقديم للامتحان بنجاح")
+                    self.status_var.set(f"تم حفظ {form_name} بنجاح")
+                else:
+                    messagebox.showerror("خطأ", "فشل في حفظ البيانات")
+            
+            # Saved on the writer thread; on_saved runs on the Tk thread
+            self.db_manager.save_form_data(
                 form_name=form_name,
                 data=[data],
-                user_id=self.current_user['id']
+                user_id=self.current_user['id'],
+                callback=on_saved
             )
-            
-            if success:
-                messagebox.showinfo("تم الحفظ", "تم حفظ طلب التقديم للامتحان بنجاح")
-                self.status_var.set(f"تم حفظ {form_name} بنجاح")
-            else:
-                messagebox.showerror("خطأ", "فشل في حفظ البيانات")
                 
         except Exception as e:
             messagebox.showerror("خطأ", f"حدث خطأ أثناء حفظ البيانات: {str(e)}")
@@ -21072,15 +20785,15 @@ ________________________________________
                 return
             
             # حفظ البيانات في قاعدة البيانات
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                cursor.execute('''INSERT INTO form_data 
-                                 (form_name, data, created_date) 
-                                 VALUES (?, ?, ?)''',
-                              (form_name, str(data), datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
-                conn.commit()
+            user_id = self.current_user['id'] if self.current_user else None
             
-            messagebox.showinfo("نجح", "تم حفظ اتفاقية الالتزام بنجاح")
+            def on_saved(record_id):
+                if record_id:
+                    messagebox.showinfo("نجح", "تم حفظ اتفاقية الالتزام بنجاح")
+                else:
+                    messagebox.showerror("خطأ", "فشل في حفظ النموذج في قاعدة البيانات")
+            
+            self.db_manager.save_form_instance(form_name, data, user_id, callback=on_saved)
             
         except Exception as e:
             messagebox.showerror("خطأ", f"حدث خطأ أثناء الحفظ: {str(e)}")
@@ -21474,15 +21187,15 @@ ________________________________________
             data['criteria'] = criteria_results
             
             # حفظ في قاعدة البيانات
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                cursor.execute('''INSERT INTO form_data 
-                                 (form_name, data, created_date) 
-                                 VALUES (?, ?, ?)''',
-                              (form_name, str(data), datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
-                conn.commit()
+            user_id = self.current_user['id'] if self.current_user else None
+            
+            def on_saved(record_id):
+                if record_id:
+                    messagebox.showinfo("نجح", "تم حفظ تقييم المؤهلات بنجاح")
+                else:
+                    messagebox.showerror("خطأ", "فشل في حفظ النموذج في قاعدة البيانات")
             
-            messagebox.showinfo("نجح", "تم حفظ تقييم المؤهلات بنجاح")
+            self.db_manager.save_form_instance(form_name, data, user_id, callback=on_saved)
             
         except Exception as e:
             messagebox.showerror("خطأ", f"حدث خطأ أثناء الحفظ: {str(e)}")
@@ -21879,15 +21592,15 @@ ________________________________________
             data['criteria'] = criteria_results
             
             # حفظ في قاعدة البيانات
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                cursor.execute('''INSERT INTO form_data 
-                                 (form_name, data, created_date) 
-                                 VALUES (?, ?, ?)''',
-                              (form_name, str(data), datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
-                conn.commit()
+            user_id = self.current_user['id'] if self.current_user else None
             
-            messagebox.showinfo("نجح", "تم حفظ تقييم الخبرة العملية بنجاح")
+            def on_saved(record_id):
+                if record_id:
+                    messagebox.showinfo("نجح", "تم حفظ تقييم الخبرة العملية بنجاح")
+                else:
+                    messagebox.showerror("خطأ", "فشل في حفظ النموذج في قاعدة البيانات")
+            
+            self.db_manager.save_form_instance(form_name, data, user_id, callback=on_saved)
             
         except Exception as e:
             messagebox.showerror("خطأ", f"حدث خطأ أثناء الحفظ: {str(e)}")
@@ -22268,15 +21981,15 @@ ________________________________________
             data['assessment'] = assessment_data
             
             # حفظ في قاعدة البيانات
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                cursor.execute('''INSERT INTO form_data 
-                                 (form_name, data, created_date) 
-                                 VALUES (?, ?, ?)''',
-                              (form_name, str(data), datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
-                conn.commit()
+            user_id = self.current_user['id'] if self.current_user else None
+            
+            def on_saved(record_id):
+                if record_id:
+                    messagebox.showinfo("نجح", "تم حفظ التقييم العملي بنجاح")
+                else:
+                    messagebox.showerror("خطأ", "فشل في حفظ النموذج في قاعدة البيانات")
             
-            messagebox.showinfo("نجح", "تم حفظ التقييم العملي بنجاح")
+            self.db_manager.save_form_instance(form_name, data, user_id, callback=on_saved)
             
         except Exception as e:
             messagebox.showerror("خطأ", f"حدث خطأ أثناء الحفظ: {str(e)}")
@@ -22634,15 +22347,15 @@ ________________________________________
             data['recommendations'] = recommendations
             
             # حفظ في قاعدة البيانات
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                cursor.execute('''INSERT INTO form_data 
-                                 (form_name, data, created_date) 
-                                 VALUES (?, ?, ?)''',
-                              (form_name, str(data), datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
-                conn.commit()
+            user_id = self.current_user['id'] if self.current_user else None
+            
+            def on_saved(record_id):
+                if record_id:
+                    messagebox.showinfo("نجح", "تم حفظ سجل نتائج التقييم بنجاح")
+                else:
+                    messagebox.showerror("خطأ", "فشل في حفظ النموذج في قاعدة البيانات")
             
-            messagebox.showinfo("نجح", "تم حفظ سجل نتائج التقييم بنجاح")
+            self.db_manager.save_form_instance(form_name, data, user_id, callback=on_saved)
             
         except Exception as e:
             messagebox.showerror("خطأ", f"حدث خطأ أثناء الحفظ: {str(e)}")
@@ -22849,9 +22562,14 @@ ________________________________________
                 else:
                     data["program_data"][field] = entry.get()
             
-            # حفظ في قاعدة البيانات
-            self.db_manager.save_form_data(form_name, data)
-            messagebox.showinfo("نجح", "تم حفظ طلب التقديم بنجاح")
+            def on_saved(success):
+                if success:
+                    messagebox.showinfo("نجح", "تم حفظ طلب التقديم بنجاح")
+                else:
+                    messagebox.showerror("خطأ", "فشل في حفظ البيانات")
+            
+            # حفظ في قاعدة البيانات (في خيط الكتابة؛ on_saved يعمل في خيط الواجهة)
+            self.db_manager.save_form_data(form_name, data, callback=on_saved)
             
         except Exception as e:
             messagebox.showerror("خطأ", f"حدث خطأ أثناء الحفظ: {str(e)}")
@@ -22896,8 +22614,14 @@ ________________________________________
             for field, entry in sign_entries.items():
                 data["signature_data"][field] = entry.get()
             
-            self.db_manager.save_form_data(form_name, data)
-            messagebox.showinfo("نجح", "تم حفظ الاتفاقية بنجاح")
+            def on_saved(success):
+                if success:
+                    messagebox.showinfo("نجح", "تم حفظ الاتفاقية بنجاح")
+                else:
+                    messagebox.showerror("خطأ", "فشل في حفظ البيانات")
+            
+            # حفظ في قاعدة البيانات (في خيط الكتابة؛ on_saved يعمل في خيط الواجهة)
+            self.db_manager.save_form_data(form_name, data, callback=on_saved)
             
         except Exception as e:
             messagebox.showerror("خطأ", f"حدث خطأ أثناء الحفظ: {str(e)}")
@@ -22995,8 +22719,14 @@ ________________________________________
             for field, entry in stats_entries.items():
                 data["statistics"][field] = entry.get()
             
-            self.db_manager.save_form_data(form_name, data)
-            messagebox.showinfo("نجح", "تم حفظ سجل المراجعة بنجاح")
+            def on_saved(success):
+                if success:
+                    messagebox.showinfo("نجح", "تم حفظ سجل المراجعة بنجاح")
+                else:
+                    messagebox.showerror("خطأ", "فشل في حفظ البيانات")
+            
+            # حفظ في قاعدة البيانات (في خيط الكتابة؛ on_saved يعمل في خيط الواجهة)
+            self.db_manager.save_form_data(form_name, data, callback=on_saved)
             
         except Exception as e:
             messagebox.showerror("خطأ", f"حدث خطأ أثناء الحفظ: {str(e)}")
@@ -34012,7 +33742,7 @@ ________________________________________
         
         # Load and display form data
         try:
-            stored_forms = self.db_manager.get_all_forms_data()
+            stored_forms = self.db_manager.get_forms([form_name])
             if form_name in stored_forms:
                 form_data = stored_forms[form_name]['data']
                 
@@ -34079,10 +33809,16 @@ ________________________________________
                             else:
                                 updated_data[key] = widget.get()
                         
-                        # Update in database
-                        self.db_manager.update_form_data(form_name, updated_data, self.current_user['id'])
-                        messagebox.showinfo("نجح", "تم حفظ التغييرات بنجاح")
-                        edit_window.destroy()
+                        def on_saved(success):
+                            if success:
+                                messagebox.showinfo("نجح", "تم حفظ التغييرات بنجاح")
+                                edit_window.destroy()
+                            else:
+                                messagebox.showerror("خطأ", "فشل في حفظ التغييرات")
+                        
+                        # Update in database (on the writer thread; on_saved runs on the Tk thread)
+                        self.db_manager.update_form_data(form_name, updated_data, self.current_user['id'],
+                                                         callback=on_saved)
                     except Exception as e:
                         messagebox.showerror("خطأ", f"فشل في حفظ التغييرات: {str(e)}")
                 
@@ -34142,7 +33878,7 @@ ________________________________________
         
         try:
             # Get form data
-            stored_forms = self.db_manager.get_all_forms_data()
+            stored_forms = self.db_manager.get_forms([form_name])
             if form_name in stored_forms:
                 form_data = stored_forms[form_name]['data']
                 
@@ -0,0 +1,23 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database_manager import DatabaseManager
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    """A DatabaseManager on a new database (and uploaded_files directory) under tmp_path"""
+    monkeypatch.chdir(tmp_path)
+    manager = DatabaseManager(str(tmp_path / "qb_academy.db"))
+    yield manager
+    manager.close()
+
+
+def reopen(db):
+    """Close db and open a new DatabaseManager on the same file"""
+    db.close()
+    return DatabaseManager(db.db_path)
@@ -0,0 +1,71 @@
+import glob
+import json
+
+from conftest import reopen
+from database_manager import DatabaseManager
+
+
+def logged(db, pattern):
+    with db.read_connection() as conn:
+        return [action for (action,) in conn.execute(
+            "SELECT action FROM activity_log WHERE action LIKE ? ORDER BY action", (pattern,))]
+
+
+def test_activity_log_is_written_in_batches(db):
+    db.flush_activity_log(wait=True)
+    db.log_activity(1, "first")
+    db.log_activity(1, "second")
+
+    assert logged(db, "first") == []
+    db.flush_activity_log(wait=True)
+    assert logged(db, "first") == ["first"] and logged(db, "second") == ["second"]
+
+
+def test_activity_of_a_rolled_back_job_is_not_recorded(db):
+    db.flush_activity_log(wait=True)
+    db.audit_flush_size = 2
+
+    def job(conn):
+        db.log_activity(1, "lost-1")
+        db.log_activity(1, "lost-2")
+        raise RuntimeError("rollback")
+
+    assert isinstance(db.submit_write(job).exception(), RuntimeError)
+    db.submit_write(lambda conn: db.log_activity(1, "kept")).result()
+    db.flush_activity_log(wait=True)
+
+    assert logged(db, "lost-%") == []
+    assert logged(db, "kept") == ["kept"]
+    db = reopen(db)
+    try:
+        assert logged(db, "lost-%") == []
+    finally:
+        db.close()
+
+
+def test_spill_of_an_exited_client_is_replayed_once(db):
+    entry = [1, "crashed", None, None, None, None, "2025-01-01 00:00:00"]
+    with open(f"{db.audit_spill_path}.deadclient.1", 'w', encoding='utf-8') as f:
+        f.write(json.dumps(entry) + "\n")
+    open(f"{db.audit_spill_path}.deadclient.lock", 'w').close()
+
+    db = reopen(db)
+    try:
+        assert logged(db, "crashed") == ["crashed"]
+        assert glob.glob(db.audit_spill_path + ".deadclient*") == []
+    finally:
+        db.close()
+
+
+def test_running_clients_keep_their_own_spill(db):
+    db.log_activity(1, "pending")
+    other = DatabaseManager(db.db_path)
+    try:
+        assert logged(other, "pending") == []
+        assert glob.glob(f"{db.audit_spill_path}.{db._audit_token}.*")
+        db.flush_activity_log(wait=True)
+        assert logged(other, "pending") == ["pending"]
+    finally:
+        other.close()
+    db.close()
+    assert glob.glob(db.audit_spill_path + "*") == []
@@ -0,0 +1,92 @@
+import sqlite3
+import threading
+
+
+def test_backup_database_writes_a_checked_copy(db, tmp_path):
+    db.save_form_data('QF-01-02', {'a': 1}, 1)
+    steps = []
+
+    path = db.backup_database(str(tmp_path / "copy.db"), progress=lambda done, total: steps.append((done, total)),
+                              pages_per_step=1)
+
+    assert steps and steps[-1][0] == steps[-1][1]
+    with sqlite3.connect(path) as conn:
+        assert conn.execute("SELECT COUNT(*) FROM form_data WHERE form_name = 'QF-01-02'").fetchone()[0] == 1
+    assert not (tmp_path / "copy.db.partial").exists()
+
+
+def test_backup_database_with_callback_runs_in_background(db, tmp_path):
+    done = threading.Event()
+    results = []
+
+    def on_done(future):
+        results.append(future.result())
+        done.set()
+
+    db.backup_database(str(tmp_path / "copy.db"), compact=True, callback=on_done)
+
+    assert done.wait(10)
+    assert results == [str(tmp_path / "copy.db")]
+
+
+def test_differential_forms_backup_restores_the_latest_state(db, tmp_path):
+    backup_dir = str(tmp_path / "forms")
+    db.save_form_data('QF-01-02', {'a': 1}, 1)
+    db.save_form_data('QF-01-03', {'b': 1}, 1)
+    db.backup_forms_data(backup_dir=backup_dir)
+    db.save_form_data('QF-01-02', {'a': 2}, 1)
+    db.delete_form_data('QF-01-03', 1)
+    db.backup_forms_data(backup_dir=backup_dir)
+
+    segments = db._read_backup_manifest(backup_dir)['segments']
+    assert [segment['kind'] for segment in segments] == ['base', 'delta']
+
+    db.save_form_data('QF-01-02', {'a': 3}, 1)
+    db.save_form_data('QF-01-04', {'c': 1}, 1)
+    report = db.restore_forms_backup(backup_dir, prune=True)
+
+    assert report['segments'] == 2
+    assert db.load_form_data('QF-01-02') == {'a': 2}
+    assert db.load_form_data('QF-01-03') is None
+    assert db.load_form_data('QF-01-04') is None
+
+
+def test_forms_jsonl_export_import_round_trip(db, tmp_path):
+    forms = {f'QF-01-02_{i}': {'i': i, 'text': 'نص'} for i in range(7)}
+    db.bulk_save_forms(forms, 1)
+
+    exported = db.export_forms_jsonl(tmp_path / "forms.jsonl.gz")
+    assert exported['forms'] == 7
+    for name in forms:
+        db.delete_form_data(name, 1)
+
+    report = db.import_forms_jsonl(tmp_path / "forms.jsonl.gz", 1, chunk_size=3)
+    assert (report['items'], report['invalid']) == (7, 0)
+    assert {name: db.load_form_data(name) for name in forms} == forms
+
+
+def test_import_reports_invalid_lines(db, tmp_path):
+    path = tmp_path / "forms.jsonl"
+    path.write_text('{"form_name": "QF-01-02", "data": {"a": 1}}\nnot json\n{"data": 1}\n', encoding='utf-8')
+
+    report = db.import_forms_jsonl(path, 1)
+
+    assert (report['items'], report['invalid']) == (1, 2)
+    assert db.load_form_data('QF-01-02') == {'a': 1}
+
+
+def test_forms_backup_with_callback_runs_in_background(db, tmp_path):
+    db.save_form_data('QF-01-02', {'a': 1}, 1)
+    done = threading.Event()
+    results = []
+
+    def on_done(future):
+        results.append((future.result(), threading.current_thread().name))
+        done.set()
+
+    db.backup_forms_data(backup_dir=str(tmp_path / "forms"), callback=on_done)
+
+    assert done.wait(10)
+    path, thread_name = results[0]
+    assert thread_name == "qb-backup"
+    assert path.startswith(str(tmp_path / "forms")) and path.endswith(".jsonl.gz")
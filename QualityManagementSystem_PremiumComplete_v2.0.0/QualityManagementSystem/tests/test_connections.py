@@ -0,0 +1,108 @@
+import threading
+import time
+
+from conftest import reopen
+
+
+def test_reader_connections_are_returned_to_the_pool(db):
+    def read():
+        with db.read_connection() as conn:
+            conn.execute("SELECT COUNT(*) FROM form_data").fetchone()
+
+    for _ in range(20):
+        thread = threading.Thread(target=read)
+        thread.start()
+        thread.join()
+
+    assert len(db._readers) <= 2
+    assert len(db._idle_readers) == len(db._readers)
+
+
+def test_nested_reads_share_one_connection(db):
+    with db.read_connection() as outer:
+        with db.read_connection() as inner:
+            assert inner is outer
+
+
+def test_close_with_a_reader_checked_out(db):
+    started, release = threading.Event(), threading.Event()
+
+    def hold_reader():
+        with db.read_connection() as conn:
+            started.set()
+            release.wait()
+            conn.execute("SELECT 1").fetchone()
+
+    thread = threading.Thread(target=hold_reader)
+    thread.start()
+    started.wait()
+    db.close()
+    release.set()
+    thread.join()
+
+    assert db._readers == [] and db._idle_readers == []
+
+
+def test_data_survives_reopen(db):
+    assert db.save_form_data('QF-01-02', {'a': 1}, 1)
+    db = reopen(db)
+    try:
+        assert db.load_form_data('QF-01-02') == {'a': 1}
+    finally:
+        db.close()
+
+
+def test_writes_run_in_submission_order_on_the_writer_thread(db):
+    threads, order = set(), []
+
+    def job(conn, i):
+        threads.add(threading.current_thread().name)
+        order.append(i)
+
+    futures = [db.submit_write(job, i) for i in range(20)]
+    for future in futures:
+        future.result()
+
+    assert order == list(range(20))
+    assert threads == {"qb-db-writer"}
+
+
+def test_write_submitted_from_a_write_job_runs_inline(db):
+    def outer(conn):
+        return db.submit_write(lambda conn: 'inner').result(timeout=5)
+
+    assert db.submit_write(outer).result(timeout=5) == 'inner'
+
+
+def test_queued_callbacks_run_on_the_draining_thread(db):
+    db.queue_callbacks = True
+    results = []
+
+    db.save_form_data('QF-01-02', {'a': 1}, 1,
+                      callback=lambda ok: results.append((ok, threading.current_thread().name)))
+    db.submit_write(lambda conn: None).result()
+    time.sleep(0.05)
+    assert results == []
+
+    db.run_queued_callbacks()
+    assert results == [(True, threading.current_thread().name)]
+
+
+def test_failed_write_reports_false_to_callback(db):
+    results = []
+    db.save_form_data('QF-01-02', {'bad': object()}, 1, callback=results.append)
+    db.submit_write(lambda conn: None).result()
+
+    assert results == [False]
+
+
+def test_insert_record_runs_on_the_writer_queue(db):
+    results = []
+    db.insert_record('evaluator_applications', {'form_name': 'QP-08.1', 'full_name': 'Sara'},
+                     callback=lambda record_id: results.append((record_id, threading.current_thread().name)))
+    db.submit_write(lambda conn: None).result()
+
+    assert results and results[0][0] and results[0][1] == "qb-db-writer"
+    assert db.insert_record('evaluator_applications', {'no_such_column': 1}) is False
+    with db.read_connection() as conn:
+        assert conn.execute("SELECT full_name FROM evaluator_applications").fetchall() == [('Sara',)]
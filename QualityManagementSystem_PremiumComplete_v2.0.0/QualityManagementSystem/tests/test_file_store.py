@@ -0,0 +1,193 @@
+import hashlib
+import os
+import threading
+
+import pytest
+
+from database_manager import UploadCancelled
+
+
+@pytest.fixture
+def source(tmp_path):
+    path = tmp_path / "report.pdf"
+    path.write_bytes(os.urandom(300 * 1024))
+    return path
+
+
+def test_identical_files_share_one_blob(db, source):
+    first = db.save_file(str(source), user_id=1)
+    second = db.save_file(str(source), user_id=1)
+
+    assert first['file_path'] == second['file_path']
+    assert second['deduplicated'] and not first['deduplicated']
+
+    assert db.delete_file(first['file_id'])
+    assert os.path.exists(second['file_path'])
+    assert db.delete_file(second['file_id'])
+    assert not os.path.exists(second['file_path'])
+
+
+def test_blob_is_kept_when_the_delete_rolls_back(db, source):
+    saved = db.save_file(str(source), user_id=1)
+
+    def job(conn):
+        conn.execute("DELETE FROM uploaded_files WHERE id = ?", (saved['file_id'],))
+        db._release_blob(conn, saved['content_hash'])
+        raise RuntimeError("rollback")
+
+    assert isinstance(db.submit_write(job).exception(), RuntimeError)
+    assert os.path.exists(saved['file_path'])
+    assert db.get_file_info(saved['file_id'])
+
+
+def test_hashes_are_computed_while_copying(db, source):
+    saved = db.save_file(str(source), user_id=1)
+
+    content = source.read_bytes()
+    assert saved['content_hash'] == hashlib.sha256(content).hexdigest()
+    with db.read_connection() as conn:
+        file_hash = conn.execute("SELECT file_hash FROM uploaded_files WHERE id = ?", (saved['file_id'],)).fetchone()[0]
+    assert file_hash == hashlib.md5(content).hexdigest()
+    with open(saved['file_path'], 'rb') as f:
+        assert f.read() == content
+
+
+def test_save_file_async_reports_progress(db, source):
+    progress = []
+    future = db.save_file_async(str(source), user_id=1, progress=lambda done, total: progress.append((done, total)))
+
+    result = future.result(timeout=10)
+    assert progress[-1] == (result['file_size'], result['file_size'])
+    assert db.get_file_info(result['file_id'])
+
+
+def test_cancelled_upload_leaves_nothing_behind(db, source):
+    cancel = threading.Event()
+    cancel.set()
+
+    with pytest.raises(UploadCancelled):
+        db.save_file(str(source), user_id=1, cancel_event=cancel)
+
+    assert db.list_files()[0] == []
+    blobs = [name for _, _, names in os.walk(os.path.join(db.files_dir, "blobs")) for name in names]
+    assert blobs == []
+
+
+def test_chunked_upload_pauses_and_resumes(db, source):
+    db.upload_chunk_size = 64 * 1024
+    session_id = db.start_upload_session(str(source), user_id=1)
+    cancel = threading.Event()
+
+    def stop_after_first_segment(done, total):
+        if done >= 64 * 1024:
+            cancel.set()
+
+    with pytest.raises(UploadCancelled):
+        db.resume_upload_session(session_id, progress=stop_after_first_segment, cancel_event=cancel)
+    session = next(s for s in db.list_upload_sessions() if s['id'] == session_id)
+    assert session['status'] == 'paused' and session['bytes_done'] == 64 * 1024
+
+    result = db.resume_upload_session(session_id)
+    assert result['content_hash'] == hashlib.sha256(source.read_bytes()).hexdigest()
+    assert db.list_upload_sessions() == []
+
+
+def test_upload_size_limit_per_category(db, source):
+    db.set_upload_size_limit('images', 1024)
+
+    with pytest.raises(ValueError):
+        db.save_file(str(source), category='images')
+    assert db.save_file(str(source), category='general')
+
+
+def test_list_files_pages_with_a_cursor(db, tmp_path):
+    for i in range(7):
+        path = tmp_path / f"file{i}.txt"
+        path.write_text(f"content {i}")
+        db.save_file(str(path), category='docs', user_id=1)
+
+    seen, cursor = [], None
+    while True:
+        files, cursor = db.list_files(category='docs', after=cursor, limit=3)
+        seen.extend(file['original_name'] for file in files)
+        if cursor is None:
+            break
+
+    assert sorted(seen) == [f"file{i}.txt" for i in range(7)]
+    assert len(set(seen)) == 7
+
+
+def stored_blobs(db):
+    return [name for _, _, names in os.walk(os.path.join(db.files_dir, "blobs")) for name in names]
+
+
+def remove_blob_after_first_ingest(db, monkeypatch, then=None):
+    """Simulate the content being released by a delete between ingest and registration"""
+    ingest = db._ingest_file
+    calls = []
+
+    def ingest_once(path, *args):
+        result = ingest(path, *args)
+        if not calls:
+            calls.append(path)
+            os.remove(result[0])
+            if then:
+                then()
+        return result
+
+    monkeypatch.setattr(db, "_ingest_file", ingest_once)
+
+
+def test_source_changed_before_registration_is_rejected(db, source, monkeypatch):
+    remove_blob_after_first_ingest(db, monkeypatch, then=lambda: source.write_bytes(b"changed"))
+
+    with pytest.raises(ValueError):
+        db.save_file(str(source), user_id=1)
+
+    assert db.list_files()[0] == []
+    assert stored_blobs(db) == []
+
+
+def test_reingested_blob_is_removed_when_registration_fails(db, source, monkeypatch):
+    first = db.save_file(str(source), user_id=1)
+    ingest = db._ingest_file
+
+    def ingest_then_delete(path, *args):
+        # The content already exists: this upload is a duplicate until the last reference goes
+        result = ingest(path, *args)
+        if args:
+            db.delete_file(first['file_id'])
+        return result
+
+    def fail(*args):
+        raise RuntimeError("insert failed")
+
+    monkeypatch.setattr(db, "_ingest_file", ingest_then_delete)
+    monkeypatch.setattr(db, "_insert_uploaded_file", fail)
+
+    with pytest.raises(RuntimeError):
+        db.save_file(str(source), user_id=1)
+
+    assert stored_blobs(db) == []
+
+
+def test_blobs_of_a_chunk_that_fails_to_copy_are_removed(db, tmp_path, monkeypatch):
+    paths = []
+    for i in range(3):
+        path = tmp_path / f"file{i}.txt"
+        path.write_text(f"content {i}")
+        paths.append(str(path))
+    ingest = db._ingest_file
+
+    def fail_on_last(path, *args):
+        if path == paths[-1]:
+            raise OSError("unreadable")
+        return ingest(path, *args)
+
+    monkeypatch.setattr(db, "_ingest_file", fail_on_last)
+
+    report = db.bulk_register_files(paths, user_id=1)
+
+    assert (report['items'], report['failed']) == (0, 3)
+    assert db.list_files()[0] == []
+    assert stored_blobs(db) == []
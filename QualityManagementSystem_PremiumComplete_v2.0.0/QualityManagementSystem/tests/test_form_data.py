@@ -0,0 +1,227 @@
+import hashlib
+import json
+
+from database_manager import _row_metadata
+
+
+def summary(db, form_name):
+    return next(form for form in db.list_forms_summary() if form['form_name'] == form_name)
+
+
+def test_form_code_and_instance_key_columns(db):
+    assert db.save_form_data('QF-01-02_20250101_101010', {'a': 1}, 1)
+    db.bulk_save_forms({'QF-01-03_draft_20250102_101010': {'b': 1}}, 1)
+    db.save_form_instance('QF-01-04: نموذج', {'c': 1}, 1, instance_name='v2')
+
+    assert summary(db, 'QF-01-02_20250101_101010')['instance_key'] == '20250101_101010'
+    assert summary(db, 'QF-01-03_draft_20250102_101010')['instance_key'] == 'draft_20250102_101010'
+    instance = next(form for form in db.list_forms_summary() if form['form_code'] == 'QF-01-04')
+    assert instance['instance_key'].startswith('v2_')
+    assert db.split_form_name('QF-01-02_20250101_101010') == ('QF-01-02', '20250101_101010')
+
+
+def test_payload_metadata_matches_content(db):
+    data = [['a', 'b'], ['c', 'd'], ['e', 'f']]
+    assert db.save_form_data('QF-01-02', data, 1)
+
+    form = summary(db, 'QF-01-02')
+    text = json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    assert form['record_count'] == 3
+    assert form['payload_bytes'] == len(text)
+    assert form['payload_hash'] == hashlib.sha256(text).hexdigest()
+
+
+def test_large_payloads_are_compressed_and_round_trip(db):
+    data = {'notes': 'ملاحظة ' * 2000}
+    assert db.save_form_data('QF-01-02', data, 1)
+
+    with db.read_connection() as conn:
+        assert conn.execute("SELECT typeof(form_data) FROM form_data WHERE form_name = 'QF-01-02'").fetchone()[0] == 'blob'
+    assert db.load_form_data('QF-01-02') == data
+
+
+def test_reencoding_legacy_payloads_keeps_the_change_watermark(db):
+    assert db.save_form_data('QF-01-02', {'notes': 'x' * 10000}, 1)
+    with db.write_connection() as conn:
+        conn.execute("UPDATE form_data SET form_data = ? WHERE form_name = 'QF-01-02'",
+                     (json.dumps({'notes': 'x' * 10000}, indent=2),))
+    db._upgrade_thread.join()
+    watermark = db.get_change_watermark()
+
+    db.migrate_payload_encoding()
+
+    with db.read_connection() as conn:
+        assert conn.execute("SELECT typeof(form_data) FROM form_data WHERE form_name = 'QF-01-02'").fetchone()[0] == 'blob'
+    assert db.get_change_watermark() == watermark
+    assert db.get_form_changes(watermark)[0] == {}
+
+
+def test_iter_forms_pages_by_id(db):
+    db.bulk_save_forms({f'QF-0{i % 2}-01-01: f{i}': [[i]] for i in range(9)}, 1)
+
+    forms = list(db.iter_forms(batch_size=4))
+    assert [form['data'] for form in forms] == [[[i]] for i in range(9)]
+    assert len(list(db.iter_forms(batch_size=4, codes=['QF-01-01-01']))) == 4
+    assert [form['id'] for form in db.iter_forms(after_id=forms[6]['id'])] == [forms[7]['id'], forms[8]['id']]
+
+
+def test_form_changes_since_a_watermark(db):
+    db.save_form_data('QF-01-02', {'a': 1}, 1)
+    db.save_form_data('QF-01-03', {'b': 1}, 1)
+    watermark = db.get_change_watermark()
+
+    db.save_form_data('QF-01-02', {'a': 2}, 1)
+    db.delete_form_data('QF-01-03', 1)
+    changed, deleted, new_watermark = db.get_form_changes(watermark)
+
+    assert list(changed) == ['QF-01-02']
+    assert changed['QF-01-02']['data'] == {'a': 2}
+    assert deleted == ['QF-01-03']
+    assert db.get_form_changes(new_watermark)[:2] == ({}, [])
+
+
+def test_payload_cache_is_invalidated_by_writes(db):
+    db.save_form_data('QF-01-02', {'a': 1}, 1)
+    assert db.load_form_data('QF-01-02') == {'a': 1}
+    hits = db.payload_cache.stats()['hits']
+    assert db.load_form_data('QF-01-02') == {'a': 1}
+    assert db.payload_cache.stats()['hits'] == hits + 1
+
+    db.save_form_data('QF-01-02', {'a': 2}, 1)
+    assert db.load_form_data('QF-01-02') == {'a': 2}
+
+
+def test_cached_payloads_are_copies(db):
+    db.save_form_data('QF-01-02', {'rows': [1]}, 1)
+    db.load_form_data('QF-01-02')['rows'].append(2)
+
+    assert db.load_form_data('QF-01-02') == {'rows': [1]}
+
+
+def assert_row_metadata(db, form_name, expected):
+    """The incrementally kept metadata of a row-stored form equals a full recompute"""
+    with db.read_connection() as conn:
+        rows = conn.execute('SELECT row_id, position, row_values FROM form_rows WHERE form_name = ?',
+                            (form_name,)).fetchall()
+    form = summary(db, form_name)
+    assert (form['record_count'], form['payload_bytes'], form['payload_hash']) == _row_metadata(rows)
+    assert form['record_count'] == len(expected)
+    assert form['payload_bytes'] == len(json.dumps(expected, ensure_ascii=False, separators=(',', ':')).encode('utf-8'))
+
+
+def test_row_edits_write_single_rows(db):
+    assert db.save_form_data('QF-01-02', [['a', '1'], ['b', '2']], 1)
+    rows = db.get_form_rows('QF-01-02', 1)
+    assert [values for _, values in rows] == [['a', '1'], ['b', '2']]
+
+    db.upsert_form_row('QF-01-02', rows[0][0], ['a', '9'], 1)
+    new_id = db.upsert_form_row('QF-01-02', None, ['c', '3'], 1)
+    db.delete_form_rows('QF-01-02', [rows[1][0]], 1)
+
+    expected = [['a', '9'], ['c', '3']]
+    assert [row_id for row_id, _ in db.get_form_rows('QF-01-02')] == [rows[0][0], new_id]
+    assert db.load_form_data('QF-01-02') == expected
+    assert_row_metadata(db, 'QF-01-02', expected)
+
+
+def test_replace_form_rows_keeps_unchanged_rows(db):
+    db.save_form_data('QF-01-02', [['a'], ['b'], ['c']], 1)
+    rows = db.get_form_rows('QF-01-02')
+
+    assert db.replace_form_rows('QF-01-02', [rows[0], (rows[2][0], ['c2']), (None, ['d'])], 1)
+
+    after = db.get_form_rows('QF-01-02')
+    assert [values for _, values in after] == [['a'], ['c2'], ['d']]
+    assert after[0][0] == rows[0][0]
+    assert_row_metadata(db, 'QF-01-02', [['a'], ['c2'], ['d']])
+
+
+def test_whole_form_save_keeps_row_storage(db):
+    db.save_form_data('QF-01-02', [['a'], ['b'], ['c']], 1)
+    rows = db.get_form_rows('QF-01-02')
+    with db.write_connection() as conn:
+        conn.execute("UPDATE form_rows SET updated_at = 'old'")
+
+    assert db.save_form_data('QF-01-02', [['a'], ['B'], ['c'], ['d']], 1)
+
+    after = db.get_form_rows('QF-01-02')
+    assert [row_id for row_id, _ in after[:3]] == [row_id for row_id, _ in rows]
+    with db.read_connection() as conn:
+        untouched = {str(row_id) for (row_id,) in conn.execute("SELECT row_id FROM form_rows WHERE updated_at = 'old'")}
+    assert untouched == {rows[0][0], rows[2][0]}
+    assert db.load_form_data('QF-01-02') == [['a'], ['B'], ['c'], ['d']]
+    assert_row_metadata(db, 'QF-01-02', [['a'], ['B'], ['c'], ['d']])
+
+
+def test_non_table_save_leaves_row_storage(db):
+    db.upsert_form_row('QF-01-02', None, ['a'], 1)
+
+    assert db.save_form_data('QF-01-02', {'notes': 'x'}, 1)
+
+    assert db.load_form_data('QF-01-02') == {'notes': 'x'}
+    with db.read_connection() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM form_rows").fetchone()[0] == 0
+
+
+def test_row_callbacks_are_delivered(db):
+    db.save_form_data('QF-01-02', [['a']], 1)
+    results = []
+    db.get_form_rows('QF-01-02', 1, callback=results.append)
+    db.upsert_form_row('QF-01-02', None, ['b'], 1, callback=results.append)
+    db.submit_write(lambda conn: None).result()
+
+    assert results[0] == [(results[0][0][0], ['a'])]
+    assert results[1].isdigit()
+
+
+def test_revisions_and_diffs(db):
+    db.save_form_data('QF-01-02', {'a': 1, 'b': 1}, 1)
+    db.save_form_data('QF-01-02', {'a': 2, 'b': 1}, 1)
+    db.save_form_data('QF-01-02', {'a': 2}, 1)
+
+    revisions = db.list_form_revisions('QF-01-02')
+    assert [r['revision'] for r in revisions] == [3, 2, 1]
+    assert db.get_form_revision('QF-01-02', 1) == {'a': 1, 'b': 1}
+    assert db.get_form_revision('QF-01-02', 2) == {'a': 2, 'b': 1}
+    assert db.diff_form_revisions('QF-01-02', 2, 3) == [{'op': 'remove', 'path': '/b'}]
+
+
+def test_type_changes_are_kept_in_revisions(db):
+    db.save_form_data('QF-01-02', {'a': 1, 'rows': [1, 2]}, 1)
+    db.save_form_data('QF-01-02', {'a': True, 'rows': [1.0, 2]}, 1)
+
+    assert db.diff_form_revisions('QF-01-02', 1, 2) == [{'op': 'replace', 'path': '/a', 'value': True},
+                                                        {'op': 'replace', 'path': '/rows/0', 'value': 1.0}]
+    revision = db.get_form_revision('QF-01-02', 2)
+    assert type(revision['a']) is bool and type(revision['rows'][0]) is float
+
+
+def test_performance_profile_is_applied(db):
+    db.set_setting('performance_profile', 'durable')
+    db.set_setting('pragma.cache_size', '-2000')
+    db.load_performance_profile()
+
+    profile = db.get_database_stats()['performance_profile']
+    assert profile['name'] == 'durable'
+    assert profile['pragmas']['cache_size'] == -2000
+
+
+def test_bulk_writes_report_throughput(db):
+    report = db.bulk_save_forms(((f'QF-01-02_{i}', {'i': i}) for i in range(25)), 1, chunk_size=10)
+    assert (report['items'], report['chunks'], report['failed']) == (25, 3, 0)
+
+    report = db.bulk_insert_rows('QF-01-03', [[i] for i in range(15)], 1, chunk_size=10)
+    assert report['items'] == 15
+    assert db.load_form_data('QF-01-03') == [[i] for i in range(15)]
+
+
+def test_trigger_maintained_statistics(db):
+    before = db.get_database_stats()['form_data']
+    db.save_form_data('QF-01-02', {'a': 1}, 1)
+    db.save_form_data('QF-01-03', {'a': 1}, 1)
+    db.delete_form_data('QF-01-02', 1)
+
+    stats = db.get_database_stats()
+    assert stats['form_data'] == before + 1
+    recomputed = db.recompute_stats()
+    assert {key: stats[key] for key in recomputed} == recomputed
@@ -0,0 +1,54 @@
+import sqlite3
+
+from conftest import reopen
+
+
+def corrective_action(number, status, target_date):
+    """A QF-10-02-06-03 payload as save_universal_form stores it"""
+    return {
+        'institution_name': 'QB', 'action_date': '01 / 02 / 2025', 'action_number': number,
+        'responsible_person': 'Sara', 'target_date': target_date, 'current_status': status,
+        'follow_up_date': '', 'problem_description': 'x' * 5000,
+        'form_id': 'QF-10-02-06-03', 'form_name': 'QF-10-02-06-03: إجراء تصحيحي',
+    }
+
+
+def test_query_forms_reads_saved_corrective_actions(db):
+    assert db.save_form_data('QF-10-02-06-03', corrective_action('CA-2', 'قيد التنفيذ', '2025-03-01'), 1)
+    assert db.save_form_data('QF-10-02-06-03_a', corrective_action('CA-1', 'قيد التنفيذ', '2025-02-01'), 1)
+    assert db.save_form_data('QF-10-02-06-03_b', corrective_action('CA-3', 'مغلق', '2025-01-01'), 1)
+    unset = corrective_action('CA-4', None, '2025-04-01')
+    del unset['current_status']
+    assert db.save_form_data('QF-10-02-06-03_c', unset, 1)
+    
+    actions = db.query_forms('QF-10-02-06-03', where={'current_status': ('is not', 'مغلق')}, order_by='target_date')
+    
+    assert [a['fields']['action_number'] for a in actions] == ['CA-1', 'CA-2', 'CA-4']
+    assert actions[0]['fields']['responsible_person'] == 'Sara'
+    assert len(db.query_forms('QF-10-02-06-03', where={'current_status': ('!=', 'مغلق')})) == 2
+
+
+def test_query_forms_reads_form_instances(db):
+    data = {'institution_name': 'QB', 'record_manager': 'Omar', 'save_timestamp': '2025-01-01T10:00:00'}
+    assert db.save_form_instance('QF-09-09-01: نموذج تقديم الشكوى', data, 1)
+    
+    forms = db.query_forms('QF-09-09-01', where={'record_manager': 'Omar'}, include_data=True)
+    
+    assert len(forms) == 1
+    assert forms[0]['data']['institution_name'] == 'QB'
+
+
+def test_migration_replaces_label_path_indexes(db):
+    with db.write_connection() as conn:
+        db._create_field_index(conn, 'QF-10-02-06-03', 'owner', '$."المسؤول عن التنفيذ"')
+        conn.execute('PRAGMA user_version = 12')
+    db = reopen(db)
+    try:
+        assert 'owner' not in db.form_field_indexes['QF-10-02-06-03']
+        assert db.form_field_indexes['QF-10-02-06-03']['responsible_person'] == '$.responsible_person'
+        with sqlite3.connect(db.db_path) as conn:
+            names = {name for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+        assert 'idx_form_field_QF_10_02_06_03_owner' not in names
+        assert 'idx_form_field_QF_10_02_06_03_responsible_person' in names
+    finally:
+        db.close()
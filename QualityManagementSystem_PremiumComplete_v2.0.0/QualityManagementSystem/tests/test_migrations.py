@@ -0,0 +1,23 @@
+import os
+import shutil
+import sqlite3
+
+from database_manager import DatabaseManager
+
+
+def test_legacy_database_is_migrated_in_place(tmp_path, monkeypatch):
+    legacy = tmp_path / "legacy.db"
+    shutil.copy(os.path.join(os.path.dirname(os.path.dirname(__file__)), "qb_academy.db"), legacy)
+    with sqlite3.connect(legacy) as conn:
+        form_count = conn.execute("SELECT COUNT(*) FROM form_data").fetchone()[0]
+    monkeypatch.chdir(tmp_path)
+
+    db = DatabaseManager(str(legacy))
+    try:
+        version = db._schema_migrations()[-1][0]
+        with db.read_connection() as conn:
+            assert conn.execute("PRAGMA user_version").fetchone()[0] == version
+            assert conn.execute("SELECT COUNT(*) FROM form_data").fetchone()[0] == form_count
+        assert db.migrate_schema() == version
+    finally:
+        db.close()
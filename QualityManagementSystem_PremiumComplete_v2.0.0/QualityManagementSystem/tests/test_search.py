@@ -0,0 +1,11 @@
+
+
+
+def test_search_finds_forms_rows_and_procedures(db):
+    db.save_form_data('QF-01-02', {'notes': 'معايرة الأجهزة'}, 1)
+    db.upsert_form_row('QF-01-03', None, ['تدقيق داخلي', 'سنوي'], 1)
+    db.index_procedures({'QP-01': 'إجراء ضبط الوثائق'})
+
+    assert {(r['scope'], r['title']) for r in db.search('معايرة')} == {('form', 'QF-01-02')}
+    assert {(r['scope'], r['title']) for r in db.search('تدقيق')} == {('form_row', 'QF-01-03')}
+    assert [r['ref'] for r in db.search('الوثائق', scopes=['procedure'])] == ['QP-01']